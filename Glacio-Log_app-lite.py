@@ -57,7 +57,6 @@ if st.session_state.get("__force_reset__", False):
     st.session_state["__force_reset__"] = False
 
 init_session_state()
-init_profile_session_state()
 
 st.title("Glacio-Log Lite ❄")
 st.caption("Snow pit acquisition, edition and visualization")
@@ -106,7 +105,7 @@ if st.session_state.action == OPTIONS_LITE[2]:
     uploaded_file = st.file_uploader(
         "Open Glacio-Log file (.json)",
         key="pit_to_edit",
-        type=["json"],
+        type=["json", "gz", "xz"],
         disabled=st.session_state.mode_locked
     )
     
@@ -116,7 +115,7 @@ if st.session_state.action == OPTIONS_LITE[3]:
     uploaded_file = st.file_uploader(
         "Open Glacio-Log file (.json)",
         key="pit_to_plot",
-        type=["json"]
+        type=["json", "gz", "xz"]
     )
 # --- Seasonal stratigraphy plot ---
 
@@ -164,177 +163,193 @@ if st.session_state.action == OPTIONS_LITE[1]:
             snowpit_id = st.session_state.snowpit_id
         st.code(f"Snow pit ID: {snowpit_id}", language="text")
         
+        # Each section is a fragment: editing it only reruns that section
+        sections = section_values("create_sections")
+        
+        def assemble_sections():
+            # Snow pit from the latest value of every section
+            df_temp_K, temp_unit_set = sections["temperature"]
+            return assemble_snowpit(
+                snowpit_id, date, *sections["general"], sections["layers"], df_temp_K, sections["lwc"],
+                check_temperature=temp_unit_set
+            )
+        
+        def sync_validity():
+            # The download button is only shown for a valid snow pit
+            if len(sections) == 4:
+                sync_page("create_valid", not assemble_sections()[1])
+        
         # %%% --- General data ---
-        with st.expander("General data"):
-            col1, col2 = st.columns(2)
-            with col1:
-                SD = st.number_input(
-                    "Snow depth (cm)", 
-                    min_value=0.0,
-                    key="SD"
-                )
-            with col2:
-                AT = st.number_input(
-                    "Air temperature (°C)",
-                    min_value=(-273.15),
-                    key="AT"
+        @st.fragment
+        def general_data():
+            with st.expander("General data"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    SD = st.number_input(
+                        "Snow depth (cm)", 
+                        min_value=0.0,
+                        key="SD"
                     )
+                with col2:
+                    AT = st.number_input(
+                        "Air temperature (°C)",
+                        min_value=(-273.15),
+                        key="AT"
+                        )
+            sections["general"] = SD, AT
+            # The profile tables and the download button follow the snow depth
+            sync_page("SD_rendered", SD)
+            sync_validity()
+            return SD, AT
+        
+        general_data()
              
         # %%% --- Layers ---
-        with st.expander("Layers"):
-            st.warning("\u26A0\ufe0f Ground level still at 0 cm")
-        
-            if st.button("Reset table"):
-                st.session_state.reset_counter_layers += 1 
-                
-            key = f"layers_editor_{st.session_state.reset_counter_layers}"
+        @st.fragment
+        def layers_data():
+            with st.expander("Layers"):
+                st.warning("\u26A0\ufe0f Ground level still at 0 cm")
             
-            df_layers = st.data_editor(
-                st.session_state.layers_df,
-                key=key,
-                num_rows="dynamic",
-                column_config={
-                    "grain (IACS)": st.column_config.SelectboxColumn(
-                        "grain (IACS)",
-                        options=IACS_GRAINS
-                    ),
-                    "snow hardness": st.column_config.SelectboxColumn(
-                        "snow hardness",
-                        options=SNOW_HARDNESS
-                    )
-                }
-            ) 
-            with st.expander("Reference – Grain types (IACS) & Snow hardness"): 
-                st.markdown("[IACS Classification]" 
-    "(https://cryosphericsciences.org/wp-content/uploads/2019/02/snowclass_2009-11-23-tagged-highres.pdf)")
-                st.markdown("[Snow hardness Classification]"
-    "(https://avalanche.org/avalanche-encyclopedia/snowpack/snowpack-observations/snow-pit/snow-hardness/)")
+                if st.button("Reset table"):
+                    st.session_state.reset_counter_layers += 1 
+                    
+                key = f"layers_editor_{st.session_state.reset_counter_layers}"
                 
-        # %%% --- Temperature profile ---
-        with st.expander("Temperature profile"):
-            # Scale selection
-            st.number_input(
-                "Vertical temperature range",
-                min_value=0.5,
-                step=0.5,
-                value=st.session_state.temp_custom_step,
-                key="temp_custom_step",
-                on_change=regenerate_profile(
-                    st.session_state.temp_custom_step, 
-                    f"temperature ({st.session_state.temp_unit})"
-                )
-            )
-            if st.session_state.temp_custom_step is None or st.session_state.SD==0: 
-                locked_df_temp = True
-                st.caption("Complete snow depth and vertical temperature range")
-            else: locked_df_temp = False
-            
-            if st.session_state.temp_unit is not None :
-                df_temp = st.data_editor(
-                    st.session_state.temp_df,
-                    key="temp_editor",
-                    num_rows="dynamic",
-                    disabled=locked_df_temp
-                )
-            else:
-                locked_df_temp = True
-                df_temp = st.data_editor(
-                    st.session_state.temp_df,
-                    key="temp_editor",
+                df_layers = st.data_editor(
+                    st.session_state.layers_df,
+                    key=key,
                     num_rows="dynamic",
-                    disabled=locked_df_temp
+                    column_config={
+                        "grain (IACS)": st.column_config.SelectboxColumn(
+                            "grain (IACS)",
+                            options=IACS_GRAINS
+                        ),
+                        "snow hardness": st.column_config.SelectboxColumn(
+                            "snow hardness",
+                            options=SNOW_HARDNESS
+                        )
+                    }
+                ) 
+                with st.expander("Reference – Grain types (IACS) & Snow hardness"): 
+                    st.markdown("[IACS Classification]" 
+        "(https://cryosphericsciences.org/wp-content/uploads/2019/02/snowclass_2009-11-23-tagged-highres.pdf)")
+                    st.markdown("[Snow hardness Classification]"
+        "(https://avalanche.org/avalanche-encyclopedia/snowpack/snowpack-observations/snow-pit/snow-hardness/)")
+            sections["layers"] = df_layers
+            sync_validity()
+            return df_layers
+        
+        layers_data()
+                
+        # %%% --- Temperature profile ---
+        @st.fragment
+        def temperature_data():
+            with st.expander("Temperature profile"):
+                # Scale selection
+                st.number_input(
+                    "Vertical temperature range",
+                    min_value=0.5,
+                    step=0.5,
+                    value=st.session_state.temp_custom_step,
+                    key="temp_custom_step"
                 )
-                st.warning('Please choose a temperature unit.')
+                if st.button("Reset table", key="reset_temp_profile"):
+                    reset_profile("temp")
+                if st.session_state.temp_custom_step is None or st.session_state.SD==0: 
+                    locked_df_temp = True
+                    st.caption("Complete snow depth and vertical temperature range")
+                else: locked_df_temp = False
                 
-            temp_locked = is_temperature_locked(df_temp)
+                # Rebuilt only when the snow depth, range or unit change, keeping the values entered
+                temp_column = f"temperature ({st.session_state.temp_unit})"
+                if st.session_state.temp_unit is not None :
+                    df_temp = profile_editor(
+                        "temp", st.session_state.temp_custom_step, temp_column, disabled=locked_df_temp
+                    )
+                else:
+                    locked_df_temp = True
+                    df_temp = profile_editor(
+                        "temp", st.session_state.temp_custom_step, temp_column, disabled=locked_df_temp
+                    )
+                    st.warning('Please choose a temperature unit.')
+                    
+                temp_locked = is_temperature_locked(df_temp)
+                
+                # Unite selection
+                st.selectbox(
+                    "Temperature unit",
+                    TEMP_UNITS,
+                    key="temp_unit",
+                    disabled=temp_locked
+                )
+                if st.session_state.temp_unit != "K":
+                    st.caption(f"Temperature displayed in {st.session_state.temp_unit}, stored internally in K")
+                st.caption("Values entered are kept when the snow depth or the vertical range change")
+            # Temperature conversion
+            df_temp_copy = df_temp.copy()
+            unit = f"temperature ({st.session_state.temp_unit})"
+            df_temp_copy[unit] = unit_to_K_array(df_temp_copy[unit], st.session_state.temp_unit)
+            df_temp_K = df_temp_copy.rename(columns={unit: "temperature (K)"})
             
-            # Unite selection
-            st.selectbox(
-                "Temperature unit",
-                TEMP_UNITS,
-                key="temp_unit",
-                disabled=temp_locked
-            )
-            if st.session_state.temp_unit != "K":
-                st.caption(f"Temperature displayed in {st.session_state.temp_unit}, stored internally in K")
-            st.caption("To reset the table, change the vertical temperature range or the snow depth")
+            sections["temperature"] = df_temp_K, st.session_state.temp_unit is not None
+            sync_validity()
+            return df_temp_K
+        
+        temperature_data()
             
         # %%% --- LWC profile ---
-        with st.expander("Liquid water content profile"):
-            st.number_input(
-                "Vertical LWC range",
-                min_value=0.5,
-                step=0.5,
-                value=st.session_state.lwc_custom_step,
-                key="lwc_custom_step",
-                on_change=regenerate_profile(
-                    st.session_state.lwc_custom_step,
-                    "LWC (%)"
+        @st.fragment
+        def lwc_data():
+            with st.expander("Liquid water content profile"):
+                st.number_input(
+                    "Vertical LWC range",
+                    min_value=0.5,
+                    step=0.5,
+                    value=st.session_state.lwc_custom_step,
+                    key="lwc_custom_step"
                 )
-            )
-            
-            if st.session_state.lwc_custom_step is None or st.session_state.SD==0: 
-                locked_df_lwc = True
-                st.caption("Complete snow depth and vertical LWC range")
-            else : locked_df_lwc = False
-            
-            df_lwc = st.data_editor(
-                st.session_state.lwc_df,
-                key="lwc_editor",
-                num_rows="dynamic",
-                disabled=locked_df_lwc
-            )
+                if st.button("Reset table", key="reset_lwc_profile"):
+                    reset_profile("lwc")
+                
+                if st.session_state.lwc_custom_step is None or st.session_state.SD==0: 
+                    locked_df_lwc = True
+                    st.caption("Complete snow depth and vertical LWC range")
+                else : locked_df_lwc = False
+                
+                df_lwc = profile_editor(
+                    "lwc", st.session_state.lwc_custom_step, "LWC (%)", disabled=locked_df_lwc
+                )
+            sections["lwc"] = df_lwc
+            sync_validity()
+            return df_lwc
+        
+        lwc_data()
         
         # %%% --- Save/Refresh ---
         ivisible_divider()
         if st.session_state.SD != 0:
-                
-            df_temp_copy = df_temp.copy()
-            
-            # Temperature conversion
-            AT_K = unit_to_K(AT, "°C")
             
-            unit = f"temperature ({st.session_state.temp_unit})"
-            df_temp_copy[unit] = df_temp_copy[unit].apply(
-                lambda v: unit_to_K(v, st.session_state.temp_unit)
-            )
-            df_temp_K = df_temp_copy.rename(columns={unit: "temperature (K)"})
-                
             # Snow pit validation    
-            error = validate_snowpit(SD, df_layers, df_temp_K, df_lwc)
+            _, error = assemble_sections()
             if error :
                 st.session_state.save_button = False
                 for e in error:
                     st.error(e)
                 st.stop()
             
-            if st.session_state.temp_unit is not None:
-                if df_temp_K["temperature (K)"].min() < 0:
-                    st.error('One or more values in temperature profile < 0 K')
-                    st.session_state.save_button = False
-                    st.stop()
-                
-            snowpit = {
-                "id": snowpit_id,
-                "Date": str(date),
-                "SD (cm)": SD,
-                "Air_T (K)": AT_K,
-                "layers": df_layers.dropna().to_dict("records"),
-                "temperature_profile (K)": df_temp_K.dropna().to_dict("records"),
-                "lwc_profile (%)": df_lwc.dropna().to_dict("records")
-            }
-            
-            json_str = json.dumps(
-                snowpit,
-                indent=2,
-                ensure_ascii=False
-            )   
+            def snowpit_json():
+                # Built on click, from sections possibly edited since this run
+                return json.dumps(
+                    assemble_sections()[0],
+                    indent=2,
+                    ensure_ascii=False
+                )
 
             col_left, col_center, col_right = st.columns([1, 0.6, 1])
             with col_center :
                 if st.download_button(
                     label="Download snowpit",
-                    data=json_str,
+                    data=snowpit_json,
                     file_name=f"Snowpit_{date}.JSON",
                     type='primary'
                 ):
@@ -381,220 +396,241 @@ if st.session_state.action == OPTIONS_LITE[2]:
             badge_text="READY",
             badge_type="success"
         )
-        pit = json.load(uploaded_file)
+        pit = load_json(uploaded_file)
         st.success("File loaded successfully")
         selected_id = pit["id"]
         st.code(f"Snow pit ID: {selected_id}", language="text")
         
+        # Each section is a fragment: editing it only reruns that section
+        sections = section_values("edit_sections")
+        date_edit=pit['Date']
+        
+        def assemble_sections():
+            # Snow pit from the latest value of every section
+            df_temp_K, temp_unit_set = sections["temperature"]
+            return assemble_snowpit(
+                selected_id, date_edit, *sections["general"], sections["layers"], df_temp_K, sections["lwc"],
+                check_temperature=temp_unit_set
+            )
+        
+        def sync_validity():
+            # Errors are only shown, and the download enabled, on a full run
+            if len(sections) == 4:
+                sync_page("edit_valid", not assemble_sections()[1])
+        
         # %%% --- General data edit ---
-        with st.expander("General data edition"):
+        @st.fragment
+        def general_data_edit(pit):
+            AT_stored = K_to_unit(pit["Air_T (K)"],"°C")
+            with st.expander("General data edition"):
             
-            if st.button("Reset modifications on general data"):
-                st.session_state.SD_edit=pit["SD (cm)"]
-                st.session_state.AT_edit=K_to_unit(pit["Air_T (K)"],"°C")
+                if st.button("Reset modifications on general data"):
+                    st.session_state.SD_edit=pit["SD (cm)"]
+                    st.session_state.AT_edit=AT_stored
             
-            col1, col2 = st.columns(2)
-            with col1:
-                SD_edit=st.number_input(
-                    "Snow depth (cm)", 
-                    min_value=(0.0),
-                    value=pit["SD (cm)"],
-                    key="SD_edit"
-                )
-            with col2:
-                AT_edit=st.number_input(
-                    "Air temperature (°C)",
-                    min_value=(-273.15),
-                    value=K_to_unit(pit["Air_T (K)"],"°C"),
-                    key="AT_edit"
-                    ) 
+                col1, col2 = st.columns(2)
+                with col1:
+                    SD_edit=st.number_input(
+                        "Snow depth (cm)", 
+                        min_value=(0.0),
+                        value=pit["SD (cm)"],
+                        key="SD_edit"
+                    )
+                with col2:
+                    AT_edit=st.number_input(
+                        "Air temperature (°C)",
+                        min_value=(-273.15),
+                        value=AT_stored,
+                        key="AT_edit"
+                        )
+            sections["general"] = SD_edit, AT_edit
+            # The download button follows the pending changes and the validity
+            sync_page("general_data_edit_changed", SD_edit != pit["SD (cm)"] or AT_edit != AT_stored)
+            sync_validity()
+        
+        general_data_edit(pit)
                 
         # %%% --- Layers edit ---
-        with st.expander("Layers edition"):
-            st.warning("\u26A0\ufe0f Ground level still at 0 cm")
+        @st.fragment
+        def layers_data_edit(pit):
+            with st.expander("Layers edition"):
+                st.warning("\u26A0\ufe0f Ground level still at 0 cm")
             
-            if st.button("Reset modifications on layers"):
-                st.session_state.reset_counter_layers_edit += 1 
+                if st.button("Reset modifications on layers"):
+                    st.session_state.reset_counter_layers_edit += 1 
                 
-            key = f"layers_edit_editor_{st.session_state.reset_counter_layers_edit}"
+                key = f"layers_edit_editor_{st.session_state.reset_counter_layers_edit}"
             
-            pit_layers_edit_work = pit["layers"]
+                pit_layers_edit_work = pit["layers"]
             
-            if to_df(pit_layers_edit_work).empty: 
-                pit_layers_edit_work = st.session_state.layers_df
+                if to_df(pit_layers_edit_work).empty: 
+                    pit_layers_edit_work = st.session_state.layers_df
                 
-            df_layers_edit = st.data_editor(
-                pit_layers_edit_work,
-                key=key,
-                num_rows="dynamic",
-                column_config={
-                    "grain (IACS)": st.column_config.SelectboxColumn(
-                        "grain (IACS)",
-                        options=IACS_GRAINS
-                    ),
-                    "snow hardness": st.column_config.SelectboxColumn(
-                        "snow hardness",
-                        options=SNOW_HARDNESS
-                    )
-                }
-            )
-            with st.expander("Reference – Grain types (IACS) & Snow hardness"): 
-                st.markdown("[IACS Classification]" 
-    "(https://cryosphericsciences.org/wp-content/uploads/2019/02/snowclass_2009-11-23-tagged-highres.pdf)")
-                st.markdown("[Snow hardness Classification]"
-    "(https://avalanche.org/avalanche-encyclopedia/snowpack/snowpack-observations/snow-pit/snow-hardness/)")
+                df_layers_edit = st.data_editor(
+                    pit_layers_edit_work,
+                    key=key,
+                    num_rows="dynamic",
+                    column_config={
+                        "grain (IACS)": st.column_config.SelectboxColumn(
+                            "grain (IACS)",
+                            options=IACS_GRAINS
+                        ),
+                        "snow hardness": st.column_config.SelectboxColumn(
+                            "snow hardness",
+                            options=SNOW_HARDNESS
+                        )
+                    }
+                )
+                with st.expander("Reference – Grain types (IACS) & Snow hardness"): 
+                    st.markdown("[IACS Classification]" 
+        "(https://cryosphericsciences.org/wp-content/uploads/2019/02/snowclass_2009-11-23-tagged-highres.pdf)")
+                    st.markdown("[Snow hardness Classification]"
+        "(https://avalanche.org/avalanche-encyclopedia/snowpack/snowpack-observations/snow-pit/snow-hardness/)")
+            sections["layers"] = df_layers_edit
+            # The download button follows the pending changes and the validity
+            sync_page("layers_data_edit_changed", editor_changed(key, pit["layers"]))
+            sync_validity()
+        
+        layers_data_edit(pit)
                 
         # %%% --- Temperature profile edit ---
-        with st.expander("Temperature profile edition"):
-            # Reset modification
-            if st.button("Reset modifications on temperature profile"):
-                st.session_state.reset_counter_temp_profile_edit += 1
-                st.session_state.temp_locked_edit = False
-                st.session_state.temp_unit_edit = None
+        @st.fragment
+        def temperature_data_edit(pit):
+            with st.expander("Temperature profile edition"):
+                # Reset modification
+                if st.button("Reset modifications on temperature profile"):
+                    st.session_state.reset_counter_temp_profile_edit += 1
+                    st.session_state.temp_locked_edit = False
+                    st.session_state.temp_unit_edit = None
             
-            key = f"temp_profile_edit_editor_{st.session_state.reset_counter_temp_profile_edit}"
+                key = f"temp_profile_edit_editor_{st.session_state.reset_counter_temp_profile_edit}"
             
-            df_temp_edit_display=to_df(pit["temperature_profile (K)"])
+                df_temp_edit_display=to_df(pit["temperature_profile (K)"])
             
-            if df_temp_edit_display.empty:
-                df_temp_edit_display = st.session_state.empty_temp_df
+                if df_temp_edit_display.empty:
+                    df_temp_edit_display = st.session_state.empty_temp_df
             
-            df_temp_edit_display['temperature (K)']=df_temp_edit_display['temperature (K)'].apply(
-                lambda v: K_to_unit(v, st.session_state.temp_unit_edit)
-            )
-            df_temp_edit_display=df_temp_edit_display.rename(
-                columns={
-                    f"temperature (K)": f"temperature ({st.session_state.temp_unit_edit})"
-                }
-            )
-            if st.session_state.temp_unit_edit is not None:
+                df_temp_edit_display['temperature (K)']=K_to_unit_array(
+                    df_temp_edit_display['temperature (K)'], st.session_state.temp_unit_edit
+                )
+                df_temp_edit_display=df_temp_edit_display.rename(
+                    columns={
+                        f"temperature (K)": f"temperature ({st.session_state.temp_unit_edit})"
+                    }
+                )
+                if st.session_state.temp_unit_edit is not None:
                 
-                st.session_state.temp_locked_edit = True
+                    st.session_state.temp_locked_edit = True
                 
-                df_temp_edit = st.data_editor(
-                    df_temp_edit_display,
-                    key=key,
-                    num_rows="dynamic"
-                )
-                st.info('Reset changes to switch units. All changes will be lost.')
+                    df_temp_edit = st.data_editor(
+                        df_temp_edit_display,
+                        key=key,
+                        num_rows="dynamic"
+                    )
+                    st.info('Reset changes to switch units. All changes will be lost.')
                 
-                df_temp_edit = normalize_numeric_df(df_temp_edit)
+                    df_temp_edit = normalize_numeric_df(df_temp_edit)
                 
-            else :
-                df_temp_edit_display = df_temp_edit_display.rename(
-                    columns={
-                        f"temperature (None)": f"temperature (K)"
-                    }
+                else :
+                    df_temp_edit_display = df_temp_edit_display.rename(
+                        columns={
+                            f"temperature (None)": f"temperature (K)"
+                        }
+                    )
+                    df_temp_edit = st.data_editor(
+                        df_temp_edit_display,
+                        key=key,
+                        num_rows="dynamic",
+                        disabled=True
+                    )
+                    df_temp_edit = df_temp_edit.rename(
+                        columns={
+                            f"temperature (K)": f"temperature (None)"
+                        }
+                    )
+                    st.info('Choose temperature unit to edit the profile.')
+            
+                st.selectbox(
+                    "Temperature unit",
+                    TEMP_UNITS,
+                    key="temp_unit_edit",
+                    disabled=st.session_state.temp_locked_edit
                 )
-                df_temp_edit = st.data_editor(
-                    df_temp_edit_display,
-                    key=key,
-                    num_rows="dynamic",
-                    disabled=True
+            
+                df_temp_edit_final = df_temp_edit.copy()
+                unit = f"temperature ({st.session_state.temp_unit_edit})"
+                df_temp_edit_final[unit]=unit_to_K_array(
+                    df_temp_edit_final[unit], st.session_state.temp_unit_edit
                 )
-                df_temp_edit = df_temp_edit.rename(
+                df_temp_edit_final=df_temp_edit_final.rename(
                     columns={
-                        f"temperature (K)": f"temperature (None)"
+                        f"temperature ({st.session_state.temp_unit_edit})" : f"temperature (K)"
                     }
                 )
-                st.info('Choose temperature unit to edit the profile.')
-            
-            st.selectbox(
-                "Temperature unit",
-                TEMP_UNITS,
-                key="temp_unit_edit",
-                disabled=st.session_state.temp_locked_edit
-            )
-            
-            df_temp_edit_final = df_temp_edit.copy()
-            unit = f"temperature ({st.session_state.temp_unit_edit})"
-            df_temp_edit_final[unit]=df_temp_edit_final[unit].apply(
-                lambda v: unit_to_K(v, st.session_state.temp_unit_edit)
-            )
-            df_temp_edit_final=df_temp_edit_final.rename(
-                columns={
-                    f"temperature ({st.session_state.temp_unit_edit})" : f"temperature (K)"
-                }
-            )
+            sections["temperature"] = df_temp_edit_final, st.session_state.temp_unit_edit is not None
+            # The download button follows the pending changes and the validity
+            sync_page("temperature_data_edit_changed", editor_changed(key, pit["temperature_profile (K)"], stored_temperature))
+            sync_validity()
+        
+        temperature_data_edit(pit)
 
         # %%% --- LWC profile edit ---
-        with st.expander("LWC profile edition"):
+        @st.fragment
+        def lwc_data_edit(pit):
+            with st.expander("LWC profile edition"):
             
-            if st.button("Reset modifications on LWC profile"):
-                st.session_state.reset_counter_lwc_profile_edit += 1
+                if st.button("Reset modifications on LWC profile"):
+                    st.session_state.reset_counter_lwc_profile_edit += 1
                 
-            pit_lwc_edit_work = pit["lwc_profile (%)"]
+                pit_lwc_edit_work = pit["lwc_profile (%)"]
             
-            if to_df(pit_lwc_edit_work).empty: 
-                pit_lwc_edit_work = st.session_state.empty_lwc_df
+                if to_df(pit_lwc_edit_work).empty: 
+                    pit_lwc_edit_work = st.session_state.empty_lwc_df
             
-            key = f"lwc_profile_edit_editor_{st.session_state.reset_counter_lwc_profile_edit}"
+                key = f"lwc_profile_edit_editor_{st.session_state.reset_counter_lwc_profile_edit}"
             
-            df_lwc_edit = st.data_editor(
-                pit_lwc_edit_work,
-                key=key,
-                num_rows="dynamic"
-            )
+                df_lwc_edit = st.data_editor(
+                    pit_lwc_edit_work,
+                    key=key,
+                    num_rows="dynamic"
+                )
+            sections["lwc"] = df_lwc_edit
+            # The download button follows the pending changes and the validity
+            sync_page("lwc_data_edit_changed", editor_changed(key, pit["lwc_profile (%)"]))
+            sync_validity()
         
-        # %%% --- Save/Refresh ---
-        date_edit=pit['Date']
+        lwc_data_edit(pit)
         
+        # %%% --- Save/Refresh ---
         ivisible_divider()
-        has_changes = (
-            SD_edit != pit["SD (cm)"]
-            or AT_edit != K_to_unit(pit["Air_T (K)"],"°C")
-            or not to_df(df_layers_edit).equals(to_df(pit["layers"]))
-            or not to_df(df_temp_edit_final).equals(to_df(pit["temperature_profile (K)"]))
-            or not to_df(df_lwc_edit).equals(to_df(pit["lwc_profile (%)"]))
-        )
+        # Already compared by each section
+        has_changes = edit_has_changes()
           
         #locked_save=True
         if has_changes: locked_save=False
         else: locked_save=True
-    
-        # Temperature conversion
-        AT_K_edit = unit_to_K(AT_edit, "°C")
             
         # Snow pit validation    
-        error = validate_snowpit(
-            SD_edit, 
-            to_df(df_layers_edit), 
-            to_df(df_temp_edit_final), 
-            to_df(df_lwc_edit)
-            )
+        _, error = assemble_sections()
         if error :
             st.session_state.save_button_edit = False
             for e in error:
                 st.error(e)
             st.stop()
         
-        if st.session_state.temp_unit_edit is not None:
-            if to_df(df_temp_edit_final)["temperature (K)"].min() < 0:
-                st.error('One or more values in temperature profile < 0 K')
-                st.session_state.save_button_edit = False
-                st.stop()
-                
-        snowpit = {
-            "id": selected_id,
-            "Date": str(date_edit),
-            "SD (cm)": SD_edit,
-            "Air_T (K)": AT_K_edit,
-            "layers": to_df(df_layers_edit).dropna().to_dict("records"),
-            "temperature_profile (K)": to_df(df_temp_edit_final).dropna().to_dict("records"),
-            "lwc_profile (%)": to_df(df_lwc_edit).dropna().to_dict("records")
-        }
-        
-        json_str = json.dumps(
-            snowpit,
-            indent=2,
-            ensure_ascii=False
-        )   
+        def snowpit_json():
+            # Built on click, from sections possibly edited since this run
+            return json.dumps(
+                assemble_sections()[0],
+                indent=2,
+                ensure_ascii=False
+            )
 
         col_left, col_center, col_right = st.columns([1, 0.6, 1])
         with col_center :
             if st.download_button(
                 label="Download snowpit",
-                data=json_str,
+                data=snowpit_json,
                 file_name=f"Edited_snowpit_{date_edit}.JSON",
                 type='primary', 
                 disabled=locked_save
@@ -617,13 +653,16 @@ if st.session_state.action == OPTIONS_LITE[2]:
 # %% Single snow pit plot 
 # ============================================================                            
 if st.session_state.action == OPTIONS_LITE[3]:
+    # Only the plot pages import matplotlib
+    from utilities.plotting import render_snowpit_image
+    
     if st.session_state.pit_to_plot is  not None:
         section_title_box(
             "Single snow pit stratigraphy plot",
             badge_text="READY",
             badge_type="success"
         )
-        pit = json.load(uploaded_file)
+        pit = load_json(uploaded_file)
         st.success("File loaded successfully")
         selected_id = pit["id"]
         st.code(f"Snow pit ID: {selected_id}", language="text")
@@ -638,30 +677,120 @@ if st.session_state.action == OPTIONS_LITE[3]:
             weather = st.text_input("Weather")
             plot_lwc = st.toggle("Plot LWC")
         
-        fig = plot_snowpit_grid_mapped(
-            pit,
-            plot_temp,
-            plot_lwc,
+        plot_options = dict(
             title=title,
             location=location,
             date=pit["Date"],
             weather=weather,
             air_temperature=K_to_unit(pit["Air_T (K)"], "°C"),
         )
-        st.pyplot(fig, use_container_width=True)
+        preview = render_snowpit_image(pit, plot_temp, plot_lwc, preview=True, **plot_options)
+        st.image(preview, use_container_width=True)
         col_left, col_center, col_right = st.columns([1, 1.5, 0.52])
         
         with col_center :
-            buf = io.BytesIO()
-            fig.savefig(buf, format="pdf", dpi=300, bbox_inches="tight")
-            buf.seek(0) 
-            
+            # The full resolution PDF is only rendered when the button is pressed
             if st.download_button(
                 label="Download snowpit stratigraphy",
-                data=buf,
+                data=lambda: render_snowpit_image(pit, plot_temp, plot_lwc, fmt="pdf", **plot_options),
                 file_name=f"Stratigraphic_plot_{date_plot}.pdf",
                 type='primary'
             ):
                 st.session_state.save_strati = True
         if st.session_state.save_strati == True: st.write("Saving to:", f"Stratigraphic_plot_{date_plot}.pdf")
- 
\ No newline at end of file
+
+# ============================================================
+# %% Bulk import/export
+# ============================================================
+if st.session_state.action == OPTIONS_LITE[4]:
+    from utilities.bulk import build_export_zip, read_upload
+    
+    uploaded_files = st.file_uploader(
+        "Open Glacio-Log files (.json, or a .zip of them)",
+        key="bulk_files",
+        type=["json", "gz", "xz", "zip"],
+        accept_multiple_files=True
+    )
+    
+    if uploaded_files:
+        section_title_box(
+            "Bulk import",
+            badge_text="READY",
+            badge_type="success"
+        )
+        # Parsed once per file content, reruns read the cache
+        entries = []
+        for uploaded in uploaded_files:
+            status = st.empty()
+            entries.extend(read_upload(
+                uploaded, progress=lambda n: status.caption(f"{uploaded.name}: {n} snow pits read")
+            ))
+            status.empty()
+        
+        # An id uploaded twice keeps its first pit, the others are reported
+        valid, duplicates = {}, []
+        for source, pit, errors in entries:
+            if pit is not None and not errors:
+                if pit["id"] in valid:
+                    duplicates.append((source, pit))
+                else:
+                    valid[pit["id"]] = pit
+        invalid = [(source, pit, errors) for source, pit, errors in entries if pit is None or errors]
+        st.success(f"{len(valid)} valid snow pits in {len(uploaded_files)} files")
+        if duplicates:
+            st.warning(f"{len(duplicates)} snow pits skipped: their id was already uploaded")
+            with st.expander("Duplicate snow pits"):
+                for source, pit in duplicates:
+                    st.write(f"{source}: {pit['id']} ({pit['Date']})")
+        if invalid:
+            with st.expander(f"{len(invalid)} snow pits skipped"):
+                for source, pit, errors in invalid:
+                    label = source if pit is None else f"{source} ({pit['id']})"
+                    st.error(f"{label}: " + "; ".join(errors))
+        
+        st.dataframe(
+            [
+                {"date": pit["Date"], "id": pit_id, "SD (cm)": pit.get("SD (cm)"), "layers": len(pit.get("layers") or [])}
+                for pit_id, pit in sorted(valid.items(), key=lambda item: item[1]["Date"])
+            ]
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            plot_temp = st.toggle("Plot temperature", key="bulk_plot_temp")
+        with col2:
+            plot_lwc = st.toggle("Plot LWC", key="bulk_plot_lwc")
+        
+        # The zip is built in the background, the page keeps responding
+        export_key = ("export", tuple(sorted(valid)), plot_temp, plot_lwc)
+        job = st.session_state.jobs.get("bulk_export")
+        if job is None or job.key != export_key:
+            col_left, col_center, col_right = st.columns([1, 0.8, 1])
+            with col_center:
+                if st.button("Prepare download (JSON + PNG)", type='primary', disabled=not valid):
+                    pits = list(valid.values())
+                    start_job(
+                        "bulk_export", export_key,
+                        build_export_zip, pits, plot_temp=plot_temp, plot_lwc=plot_lwc,
+                        total=len(pits), label="Rendering snow pits",
+                    )
+                    st.rerun()
+        else:
+            job = show_job("bulk_export")
+            if job_succeeded(job):
+                col_left, col_center, col_right = st.columns([1, 0.8, 1])
+                with col_center:
+                    st.download_button(
+                        label="Download all",
+                        data=job.result(),
+                        file_name=f"Snowpits_{len(valid)}.zip",
+                        mime="application/zip",
+                        type='primary'
+                    )
+
+# ============================================================
+# %% Warm-up 
+# ============================================================
+# Once the first page is painted, matplotlib loads in the background so the
+# plot pages do not pay for it
+start_warm_up()
@@ -19,7 +19,7 @@ import os
 
 from utilities.styles import style
 from utilities.functions import *
-from utilities.constants import OPTIONS, IACS_GRAINS, SNOW_HARDNESS, TEMP_UNITS
+from utilities.constants import OPTIONS, IACS_GRAINS, SNOW_HARDNESS, TEMP_UNITS, STORAGE_FORMATS, COMPRESSION_FORMATS, FIGURE_FORMATS
 from version import __version__
 
 # ============================================================
@@ -56,7 +56,6 @@ if st.session_state.get("__force_reset__", False):
     st.session_state["__force_reset__"] = False
 
 init_session_state()
-init_profile_session_state()
 
 st.title("Glacio-Log ❄")
 st.caption("Snow pit acquisition, edition and visualization")
@@ -67,12 +66,13 @@ config_path = "utilities/user_config.json"
 config_exists = os.path.exists(config_path)
 
 if config_exists:
-    with open(config_path, "r") as f:
-        user_config = json.load(f)
+    user_config = load_user_config(config_path)
 
     SITES = user_config["sites"]
     SEASONS = user_config["seasons"]
     init_site_season_state(user_config)
+    set_storage_backend(user_config.get("storage", STORAGE_FORMATS[0]))
+    ensure_catalog(BASE_DIR)
 
     st.session_state.config_validated = True
 
@@ -91,6 +91,28 @@ if not st.session_state.config_validated:
         key="season_input"
     )
 
+    storage = st.selectbox(
+        "Storage format",
+        STORAGE_FORMATS,
+        key="storage_input"
+    )
+    st.caption("""
+    "json" keeps one file per day; "sqlite" keeps an indexed database per site and season, 
+    faster to update when many snow pits are logged; "jsonl" appends every change to a 
+    log per day, compacted in the background. A season already stored in a database or in 
+    logs keeps its storage.
+    """)
+
+    compression = st.selectbox(
+        "Day file compression",
+        COMPRESSION_FORMATS,
+        key="compression_input"
+    )
+    st.caption("""
+    For the "json" storage: "compact" drops the indentation, "gzip" and "lzma" also compress 
+    the day files, several times smaller to sync from the field. Can be changed per site later.
+    """)
+
     export_data_folder = "{site}/{season}/clean_data/"
     export_plot_folder = "{site}/{season}/plot/"
 
@@ -114,10 +136,10 @@ if not st.session_state.config_validated:
             user_config = {
                 "sites": parse_list(site),
                 "seasons": parse_list(season),
+                "storage": storage,
             }
 
-            with open(config_path, "w") as f:
-                json.dump(user_config, f, indent=2)
+            save_user_config(config_path, user_config)
 
             create_file_tree(
                 base_dir=BASE_DIR,
@@ -126,6 +148,9 @@ if not st.session_state.config_validated:
                 data_template=export_data_folder,
                 plot_template=export_plot_folder,
             )
+            if compression != COMPRESSION_FORMATS[0]:
+                for new_site in user_config["sites"]:
+                    set_site_compression(BASE_DIR / new_site, compression)
 
             st.session_state.config_saved = True
             st.session_state.config_validated = True
@@ -173,8 +198,7 @@ if st.session_state.modify_config:
         if site_input and site_input not in SITES:
             SITES.append(site_input)
             user_config["sites"] = SITES
-            with open(config_path, "w") as f:
-                json.dump(user_config, f, indent=4)
+            save_user_config(config_path, user_config)
             st.session_state.reset_add_site = True
             st.rerun()
      
@@ -190,8 +214,7 @@ if st.session_state.modify_config:
             if site_remove in SITES:
                 SITES.remove(site_remove)
                 user_config["sites"] = SITES
-                with open(config_path, "w") as f:
-                    json.dump(user_config, f, indent=4)
+                save_user_config(config_path, user_config)
                 st.session_state.reset_remove_site = True
                 st.rerun()
     
@@ -208,8 +231,7 @@ if st.session_state.modify_config:
         if season_input and season_input not in SEASONS:
             SEASONS.append(season_input)
             user_config["seasons"] = SEASONS
-            with open(config_path, "w") as f:
-                json.dump(user_config, f, indent=4)
+            save_user_config(config_path, user_config)
             st.session_state.reset_add_season = True
             st.rerun()
     # Remove season
@@ -224,11 +246,48 @@ if st.session_state.modify_config:
             if season_remove in SEASONS:
                 SEASONS.remove(season_remove)
                 user_config["seasons"] = SEASONS
-                with open(config_path, "w") as f:
-                    json.dump(user_config, f, indent=4)
+                save_user_config(config_path, user_config)
                 st.rerun()
     
     st.caption(f"List of your seasons: {SEASONS}")
+
+    # Compression of a site
+    col1, col2 = st.columns(2)
+    with col1:
+        site_compressed = st.selectbox("Site", SITES, key="compression_site")
+    with col2:
+        current = site_compression(BASE_DIR / site_compressed)
+        new_compression = st.selectbox(
+            "Day file compression",
+            COMPRESSION_FORMATS,
+            index=COMPRESSION_FORMATS.index(current),
+            key="site_compression"
+        )
+    if st.button("Apply compression") and new_compression != current:
+        set_site_compression(BASE_DIR / site_compressed, new_compression)
+        n = recompress_site(BASE_DIR / site_compressed)
+        st.success(f"{n} day files of {site_compressed} rewritten ({new_compression})")
+
+    # Seal a closed season
+    closed_seasons = [s for s in SEASONS if s != current_season(date.today())]
+    if closed_seasons:
+        col1, col2 = st.columns(2)
+        with col1:
+            seal_site = st.selectbox("Site", SITES, key="seal_site")
+        with col2:
+            seal_season_name = st.selectbox("Closed season", closed_seasons, key="seal_season")
+        seal_dir = BASE_DIR / seal_site / seal_season_name / "clean_data"
+        if open_archive(seal_dir) is None:
+            if st.button("Seal season"):
+                try:
+                    n = seal_season(seal_dir)
+                    st.success(f"{n} days of {seal_site} {seal_season_name} packed into one read-only archive")
+                except MixedStorageError as e:
+                    st.error(str(e))
+        elif st.button("Unseal season"):
+            n = unseal_season(seal_dir)
+            st.success(f"{n} days of {seal_site} {seal_season_name} can be edited again")
+    st.caption("A sealed season is packed into one compressed file: faster to back up and sync, read-only.")
     
     col_left, col_center, col_right = st.columns([1, 0.76, 1])
 
@@ -316,16 +375,14 @@ if st.session_state.action == OPTIONS[2] or st.session_state.action == OPTIONS[3
         / "clean_data"
         / f"snowpits_{date_edit}.json"
     )
-    if not data_path.exists():
+    day_pits = list_day_pits(BASE_DIR, site_edit, date_edit, season_edit)
+    if not day_pits:
         st.warning("No existing snow pit for this day, please select an other date!")
         st.stop()
-        
-    with open(data_path) as f:
-        database = json.load(f)
     
     pit_labels = {
         f"Snow Pit {i+1}: Snow depth = {p['SD (cm)']} cm | Air Temperature = {p['Air_T (K)']} K": p["id"]
-        for i, p in enumerate(database)
+        for i, p in enumerate(day_pits)
     }
 
     label = st.selectbox(
@@ -358,16 +415,14 @@ if st.session_state.action == OPTIONS[4]:
         / "clean_data"
         / f"snowpits_{date_plot}.json"
     )
-    if not data_path.exists():
+    day_pits = list_day_pits(BASE_DIR, site_plot, date_plot, season_plot)
+    if not day_pits:
         st.warning("No existing snow pit for this day, please select an other date!")
         st.stop()
-        
-    with open(data_path) as f:
-        database = json.load(f)
     
     pit_labels = {
         f"Snow Pit {i+1}: Snow depth = {p['SD (cm)']} cm | Air Temperature = {p['Air_T (K)']} K": p["id"]
-        for i, p in enumerate(database)
+        for i, p in enumerate(day_pits)
     }
 
     label = st.selectbox(
@@ -379,14 +434,26 @@ if st.session_state.action == OPTIONS[4]:
       
 # --- Seasonal stratigraphy plot ---
 
-#if st.session_state.action == OPTIONS[5]:
+if st.session_state.action == OPTIONS[5]:
+    
+    season_seasonal = st.sidebar.selectbox(
+        "Season",
+        SEASONS,
+        key="season_seasonal",
+        disabled=st.session_state.mode_locked
+    )
     
-    #st.sidebar.selectbox(
-    #    "Season",
-    #    SEASONS,
-    #    key='seasons'
-    #)
-    #st.caption('Under construction')
+    site_seasonal = st.sidebar.selectbox(
+        "Snow pit site",
+        SITES,
+        key="site_seasonal",
+        disabled=st.session_state.mode_locked
+    )
+    # Built once per season, then only the days written since are re-rasterized
+    grid = season_grid(BASE_DIR, site_seasonal, season_seasonal)
+    if grid.daily() is None:
+        st.warning("No existing snow pit for this season, please select an other season!")
+        st.stop()
     
 # --- User setup ---
 if st.session_state.config_validated:
@@ -441,126 +508,139 @@ if st.session_state.action == OPTIONS[1]:
             snowpit_id = st.session_state.snowpit_id
         st.code(f"Snow pit ID: {snowpit_id}", language="text")
         
+        # Each section is a fragment: editing it only reruns that section
+        
         # %%% --- General data ---
-        with st.expander("General data"):
-            col1, col2 = st.columns(2)
-            with col1:
-                SD = st.number_input(
-                    "Snow depth (cm)", 
-                    min_value=0.0,
-                    key="SD"
-                )
-            with col2:
-                AT = st.number_input(
-                    "Air temperature (°C)",
-                    min_value=(-273.15),
-                    key="AT"
+        @st.fragment
+        def general_data():
+            with st.expander("General data"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    SD = st.number_input(
+                        "Snow depth (cm)", 
+                        min_value=0.0,
+                        key="SD"
                     )
+                with col2:
+                    AT = st.number_input(
+                        "Air temperature (°C)",
+                        min_value=(-273.15),
+                        key="AT"
+                        )
+            # The profile tables and the save button follow the snow depth
+            sync_page("SD_rendered", SD)
+            return SD, AT
+        
+        SD, AT = general_data()
              
         # %%% --- Layers ---
-        with st.expander("Layers"):
-            st.warning("\u26A0\ufe0f Ground level still at 0 cm")
+        @st.fragment
+        def layers_data():
+            with st.expander("Layers"):
+                st.warning("\u26A0\ufe0f Ground level still at 0 cm")
+            
+                if st.button("Reset table"):
+                    st.session_state.reset_counter_layers += 1 
+                    
+                key = f"layers_editor_{st.session_state.reset_counter_layers}"
+                
+                df_layers = st.data_editor(
+                    st.session_state.layers_df,
+                    key=key,
+                    num_rows="dynamic",
+                    column_config={
+                        "grain (IACS)": st.column_config.SelectboxColumn(
+                            "grain (IACS)",
+                            options=IACS_GRAINS
+                        ),
+                        "snow hardness": st.column_config.SelectboxColumn(
+                            "snow hardness",
+                            options=SNOW_HARDNESS
+                        )
+                    }
+                ) 
+                with st.expander("Reference – Grain types (IACS) & Snow hardness"): 
+                    st.markdown("[IACS Classification]" 
+        "(https://cryosphericsciences.org/wp-content/uploads/2019/02/snowclass_2009-11-23-tagged-highres.pdf)")
+                    st.markdown("[Snow hardness Classification]"
+        "(https://avalanche.org/avalanche-encyclopedia/snowpack/snowpack-observations/snow-pit/snow-hardness/)")
+            return df_layers
         
-            if st.button("Reset table"):
-                st.session_state.reset_counter_layers += 1 
+        df_layers = layers_data()
                 
-            key = f"layers_editor_{st.session_state.reset_counter_layers}"
-            
-            df_layers = st.data_editor(
-                st.session_state.layers_df,
-                key=key,
-                num_rows="dynamic",
-                column_config={
-                    "grain (IACS)": st.column_config.SelectboxColumn(
-                        "grain (IACS)",
-                        options=IACS_GRAINS
-                    ),
-                    "snow hardness": st.column_config.SelectboxColumn(
-                        "snow hardness",
-                        options=SNOW_HARDNESS
+        # %%% --- Temperature profile ---
+        @st.fragment
+        def temperature_data():
+            with st.expander("Temperature profile"):
+                # Scale selection
+                st.number_input(
+                    "Vertical temperature range",
+                    min_value=0.5,
+                    step=0.5,
+                    value=st.session_state.temp_custom_step,
+                    key="temp_custom_step"
+                )
+                if st.button("Reset table", key="reset_temp_profile"):
+                    reset_profile("temp")
+                if st.session_state.temp_custom_step is None or st.session_state.SD==0: 
+                    locked_df_temp = True
+                    st.caption("Complete snow depth and vertical temperature range")
+                else: locked_df_temp = False
+                
+                # Rebuilt only when the snow depth, range or unit change, keeping the values entered
+                temp_column = f"temperature ({st.session_state.temp_unit})"
+                if st.session_state.temp_unit is not None :
+                    df_temp = profile_editor(
+                        "temp", st.session_state.temp_custom_step, temp_column, disabled=locked_df_temp
                     )
-                }
-            ) 
-            with st.expander("Reference – Grain types (IACS) & Snow hardness"): 
-                st.markdown("[IACS Classification]" 
-    "(https://cryosphericsciences.org/wp-content/uploads/2019/02/snowclass_2009-11-23-tagged-highres.pdf)")
-                st.markdown("[Snow hardness Classification]"
-    "(https://avalanche.org/avalanche-encyclopedia/snowpack/snowpack-observations/snow-pit/snow-hardness/)")
+                else:
+                    locked_df_temp = True
+                    df_temp = profile_editor(
+                        "temp", st.session_state.temp_custom_step, temp_column, disabled=locked_df_temp
+                    )
+                    st.warning('Please choose a temperature unit.')
+                    
+                temp_locked = is_temperature_locked(df_temp)
                 
-        # %%% --- Temperature profile ---
-        with st.expander("Temperature profile"):
-            # Scale selection
-            st.number_input(
-                "Vertical temperature range",
-                min_value=0.5,
-                step=0.5,
-                value=st.session_state.temp_custom_step,
-                key="temp_custom_step",
-                on_change=regenerate_profile(
-                    st.session_state.temp_custom_step, 
-                    f"temperature ({st.session_state.temp_unit})"
+                # Unite selection
+                st.selectbox(
+                    "Temperature unit",
+                    TEMP_UNITS,
+                    key="temp_unit",
+                    disabled=temp_locked
                 )
-            )
-            if st.session_state.temp_custom_step is None or st.session_state.SD==0: 
-                locked_df_temp = True
-                st.caption("Complete snow depth and vertical temperature range")
-            else: locked_df_temp = False
+                if st.session_state.temp_unit != "K":
+                    st.caption(f"Temperature displayed in {st.session_state.temp_unit}, stored internally in K")
+                st.caption("Values entered are kept when the snow depth or the vertical range change")
+            return df_temp
+        
+        df_temp = temperature_data()
             
-            if st.session_state.temp_unit is not None :
-                df_temp = st.data_editor(
-                    st.session_state.temp_df,
-                    key="temp_editor",
-                    num_rows="dynamic",
-                    disabled=locked_df_temp
-                )
-            else:
-                locked_df_temp = True
-                df_temp = st.data_editor(
-                    st.session_state.temp_df,
-                    key="temp_editor",
-                    num_rows="dynamic",
-                    disabled=locked_df_temp
+        # %%% --- LWC profile ---
+        @st.fragment
+        def lwc_data():
+            with st.expander("Liquid water content profile"):
+                st.number_input(
+                    "Vertical LWC range",
+                    min_value=0.5,
+                    step=0.5,
+                    value=st.session_state.lwc_custom_step,
+                    key="lwc_custom_step"
                 )
-                st.warning('Please choose a temperature unit.')
+                if st.button("Reset table", key="reset_lwc_profile"):
+                    reset_profile("lwc")
                 
-            temp_locked = is_temperature_locked(df_temp)
-            
-            # Unite selection
-            st.selectbox(
-                "Temperature unit",
-                TEMP_UNITS,
-                key="temp_unit",
-                disabled=temp_locked
-            )
-            if st.session_state.temp_unit != "K":
-                st.caption(f"Temperature displayed in {st.session_state.temp_unit}, stored internally in K")
-            st.caption("To reset the table, change the vertical temperature range or the snow depth")
-            
-        # %%% --- LWC profile ---
-        with st.expander("Liquid water content profile"):
-            st.number_input(
-                "Vertical LWC range",
-                min_value=0.5,
-                step=0.5,
-                value=st.session_state.lwc_custom_step,
-                key="lwc_custom_step",
-                on_change=regenerate_profile(
-                    st.session_state.lwc_custom_step,
-                    "LWC (%)"
+                if st.session_state.lwc_custom_step is None or st.session_state.SD==0: 
+                    locked_df_lwc = True
+                    st.caption("Complete snow depth and vertical LWC range")
+                else : locked_df_lwc = False
+                
+                df_lwc = profile_editor(
+                    "lwc", st.session_state.lwc_custom_step, "LWC (%)", disabled=locked_df_lwc
                 )
-            )
-            
-            if st.session_state.lwc_custom_step is None or st.session_state.SD==0: 
-                locked_df_lwc = True
-                st.caption("Complete snow depth and vertical LWC range")
-            else : locked_df_lwc = False
-            
-            df_lwc = st.data_editor(
-                st.session_state.lwc_df,
-                key="lwc_editor",
-                num_rows="dynamic",
-                disabled=locked_df_lwc
-            )
+            return df_lwc
+        
+        df_lwc = lwc_data()
         
         # %%% --- Save/Refresh ---
         ivisible_divider()
@@ -578,9 +658,7 @@ if st.session_state.action == OPTIONS[1]:
                 AT_K = unit_to_K(AT, "°C")
                 
                 unit = f"temperature ({st.session_state.temp_unit})"
-                df_temp_copy[unit] = df_temp_copy[unit].apply(
-                    lambda v: unit_to_K(v, st.session_state.temp_unit)
-                )
+                df_temp_copy[unit] = unit_to_K_array(df_temp_copy[unit], st.session_state.temp_unit)
                 df_temp_K = df_temp_copy.rename(columns={unit: "temperature (K)"})
                     
                 # Snow pit validation    
@@ -606,14 +684,26 @@ if st.session_state.action == OPTIONS[1]:
                     "temperature_profile (K)": df_temp_K.dropna().to_dict("records"),
                     "lwc_profile (%)": df_lwc.dropna().to_dict("records")
                 }
-                action = save_or_update_snowpit(save_path, snowpit)
-            
-                if action == "updated":
-                    st.success(f"Snow pit ID: {snowpit_id} udpated ✅")
-                else:
-                    st.success(f"Snow pit ID: {snowpit_id} saved ✅")
+                # Written in the background, once per content of the pit and
+                # after the saves of the pit still running
+                start_job(
+                    "save_snowpit",
+                    ("save", str(save_path), snowpit_id, content_key(snowpit)),
+                    save_or_update_snowpit, save_path, snowpit,
+                    queue=(str(save_path), snowpit_id), label="Saving snow pit",
+                )
+                job = show_job("save_snowpit")
+                if job.error is not None:
+                    st.session_state.save_button = False
+                    st.stop()
                 
-                st.write("Saving to:", save_path.resolve())
+                if job_succeeded(job):
+                    if job.result() == "updated":
+                        st.success(f"Snow pit ID: {snowpit_id} udpated ✅")
+                    else:
+                        st.success(f"Snow pit ID: {snowpit_id} saved ✅")
+                    
+                    st.write("Saving to:", save_path.resolve())
         
         # Refresh
         soft_divider()
@@ -655,167 +745,199 @@ if st.session_state.action == OPTIONS[2]:
         )
         selected_id = pit_labels[label]
         st.code(f"Snow pit ID: {selected_id}", language="text")
-        pit = next(p for p in database if p["id"] == selected_id)
+        pit = get_snowpit(data_path, selected_id)
+        if pit is None:
+            refresh_day(data_path, force=True)
+            st.session_state.start_button_clicked = False
+            st.session_state.mode_locked = False
+            st.warning("This snow pit is no longer stored for this day, the list of snow pits has been refreshed.")
+            st.stop()
+        
+        # Each section is a fragment: editing it only reruns that section
         
         # %%% --- General data edit ---
-        with st.expander("General data edition"):
+        @st.fragment
+        def general_data_edit(pit):
+            AT_stored = K_to_unit(pit["Air_T (K)"],"°C")
+            with st.expander("General data edition"):
             
-            if st.button("Reset modifications on general data"):
-                st.session_state.SD_edit=pit["SD (cm)"]
-                st.session_state.AT_edit=K_to_unit(pit["Air_T (K)"],"°C")
+                if st.button("Reset modifications on general data"):
+                    st.session_state.SD_edit=pit["SD (cm)"]
+                    st.session_state.AT_edit=AT_stored
             
-            col1, col2 = st.columns(2)
-            with col1:
-                SD_edit=st.number_input(
-                    "Snow depth (cm)", 
-                    min_value=(0.0),
-                    value=pit["SD (cm)"],
-                    key="SD_edit"
-                )
-            with col2:
-                AT_edit=st.number_input(
-                    "Air temperature (°C)",
-                    min_value=(-273.15),
-                    value=K_to_unit(pit["Air_T (K)"],"°C"),
-                    key="AT_edit"
-                    ) 
+                col1, col2 = st.columns(2)
+                with col1:
+                    SD_edit=st.number_input(
+                        "Snow depth (cm)", 
+                        min_value=(0.0),
+                        value=pit["SD (cm)"],
+                        key="SD_edit"
+                    )
+                with col2:
+                    AT_edit=st.number_input(
+                        "Air temperature (°C)",
+                        min_value=(-273.15),
+                        value=AT_stored,
+                        key="AT_edit"
+                        )
+            # The save button follows the pending changes
+            sync_page("general_data_edit_changed", SD_edit != pit["SD (cm)"] or AT_edit != AT_stored)
+            return SD_edit, AT_edit
+        
+        SD_edit, AT_edit = general_data_edit(pit)
                 
         # %%% --- Layers edit ---
-        with st.expander("Layers edition"):
-            st.warning("\u26A0\ufe0f Ground level still at 0 cm")
+        @st.fragment
+        def layers_data_edit(pit):
+            with st.expander("Layers edition"):
+                st.warning("\u26A0\ufe0f Ground level still at 0 cm")
             
-            if st.button("Reset modifications on layers"):
-                st.session_state.reset_counter_layers_edit += 1 
+                if st.button("Reset modifications on layers"):
+                    st.session_state.reset_counter_layers_edit += 1 
                 
-            key = f"layers_edit_editor_{st.session_state.reset_counter_layers_edit}"
+                key = f"layers_edit_editor_{st.session_state.reset_counter_layers_edit}"
             
-            pit_layers_edit_work = pit["layers"]
+                pit_layers_edit_work = pit["layers"]
             
-            if to_df(pit_layers_edit_work).empty: 
-                pit_layers_edit_work = st.session_state.layers_df
+                if to_df(pit_layers_edit_work).empty: 
+                    pit_layers_edit_work = st.session_state.layers_df
                 
-            df_layers_edit = st.data_editor(
-                pit_layers_edit_work,
-                key=key,
-                num_rows="dynamic",
-                column_config={
-                    "grain (IACS)": st.column_config.SelectboxColumn(
-                        "grain (IACS)",
-                        options=IACS_GRAINS
-                    ),
-                    "snow hardness": st.column_config.SelectboxColumn(
-                        "snow hardness",
-                        options=SNOW_HARDNESS
-                    )
-                }
-            )
-            with st.expander("Reference – Grain types (IACS) & Snow hardness"): 
-                st.markdown("[IACS Classification]" 
-    "(https://cryosphericsciences.org/wp-content/uploads/2019/02/snowclass_2009-11-23-tagged-highres.pdf)")
-                st.markdown("[Snow hardness Classification]"
-    "(https://avalanche.org/avalanche-encyclopedia/snowpack/snowpack-observations/snow-pit/snow-hardness/)")
+                df_layers_edit = st.data_editor(
+                    pit_layers_edit_work,
+                    key=key,
+                    num_rows="dynamic",
+                    column_config={
+                        "grain (IACS)": st.column_config.SelectboxColumn(
+                            "grain (IACS)",
+                            options=IACS_GRAINS
+                        ),
+                        "snow hardness": st.column_config.SelectboxColumn(
+                            "snow hardness",
+                            options=SNOW_HARDNESS
+                        )
+                    }
+                )
+                with st.expander("Reference – Grain types (IACS) & Snow hardness"): 
+                    st.markdown("[IACS Classification]" 
+        "(https://cryosphericsciences.org/wp-content/uploads/2019/02/snowclass_2009-11-23-tagged-highres.pdf)")
+                    st.markdown("[Snow hardness Classification]"
+        "(https://avalanche.org/avalanche-encyclopedia/snowpack/snowpack-observations/snow-pit/snow-hardness/)")
+            # The save button follows the pending changes, from the editor's edits only
+            sync_page("layers_data_edit_changed", editor_changed(key, pit["layers"]))
+            return df_layers_edit
+        
+        df_layers_edit = layers_data_edit(pit)
                 
         # %%% --- Temperature profile edit ---
-        with st.expander("Temperature profile edition"):
-            # Reset modification
-            if st.button("Reset modifications on temperature profile"):
-                st.session_state.reset_counter_temp_profile_edit += 1
-                st.session_state.temp_locked_edit = False
-                st.session_state.temp_unit_edit = None
+        @st.fragment
+        def temperature_data_edit(pit):
+            with st.expander("Temperature profile edition"):
+                # Reset modification
+                if st.button("Reset modifications on temperature profile"):
+                    st.session_state.reset_counter_temp_profile_edit += 1
+                    st.session_state.temp_locked_edit = False
+                    st.session_state.temp_unit_edit = None
             
-            key = f"temp_profile_edit_editor_{st.session_state.reset_counter_temp_profile_edit}"
+                key = f"temp_profile_edit_editor_{st.session_state.reset_counter_temp_profile_edit}"
             
-            df_temp_edit_display=to_df(pit["temperature_profile (K)"])
+                df_temp_edit_display=to_df(pit["temperature_profile (K)"])
             
-            if df_temp_edit_display.empty:
-                df_temp_edit_display = st.session_state.empty_temp_df
+                if df_temp_edit_display.empty:
+                    df_temp_edit_display = st.session_state.empty_temp_df
             
-            df_temp_edit_display['temperature (K)']=df_temp_edit_display['temperature (K)'].apply(
-                lambda v: K_to_unit(v, st.session_state.temp_unit_edit)
-            )
-            df_temp_edit_display=df_temp_edit_display.rename(
-                columns={
-                    f"temperature (K)": f"temperature ({st.session_state.temp_unit_edit})"
-                }
-            )
-            if st.session_state.temp_unit_edit is not None:
+                df_temp_edit_display['temperature (K)']=K_to_unit_array(
+                    df_temp_edit_display['temperature (K)'], st.session_state.temp_unit_edit
+                )
+                df_temp_edit_display=df_temp_edit_display.rename(
+                    columns={
+                        f"temperature (K)": f"temperature ({st.session_state.temp_unit_edit})"
+                    }
+                )
+                if st.session_state.temp_unit_edit is not None:
                 
-                st.session_state.temp_locked_edit = True
+                    st.session_state.temp_locked_edit = True
                 
-                df_temp_edit = st.data_editor(
-                    df_temp_edit_display,
-                    key=key,
-                    num_rows="dynamic"
-                )
-                st.info('Reset changes to switch units. All changes will be lost.')
+                    df_temp_edit = st.data_editor(
+                        df_temp_edit_display,
+                        key=key,
+                        num_rows="dynamic"
+                    )
+                    st.info('Reset changes to switch units. All changes will be lost.')
                 
-                df_temp_edit = normalize_numeric_df(df_temp_edit)
+                    df_temp_edit = normalize_numeric_df(df_temp_edit)
                 
-            else :
-                df_temp_edit_display = df_temp_edit_display.rename(
-                    columns={
-                        f"temperature (None)": f"temperature (K)"
-                    }
+                else :
+                    df_temp_edit_display = df_temp_edit_display.rename(
+                        columns={
+                            f"temperature (None)": f"temperature (K)"
+                        }
+                    )
+                    df_temp_edit = st.data_editor(
+                        df_temp_edit_display,
+                        key=key,
+                        num_rows="dynamic",
+                        disabled=True
+                    )
+                    df_temp_edit = df_temp_edit.rename(
+                        columns={
+                            f"temperature (K)": f"temperature (None)"
+                        }
+                    )
+                    st.info('Choose temperature unit to edit the profile.')
+            
+                st.selectbox(
+                    "Temperature unit",
+                    TEMP_UNITS,
+                    key="temp_unit_edit",
+                    disabled=st.session_state.temp_locked_edit
                 )
-                df_temp_edit = st.data_editor(
-                    df_temp_edit_display,
-                    key=key,
-                    num_rows="dynamic",
-                    disabled=True
+            
+                df_temp_edit_final = df_temp_edit.copy()
+                unit = f"temperature ({st.session_state.temp_unit_edit})"
+                df_temp_edit_final[unit]=unit_to_K_array(
+                    df_temp_edit_final[unit], st.session_state.temp_unit_edit
                 )
-                df_temp_edit = df_temp_edit.rename(
+                df_temp_edit_final=df_temp_edit_final.rename(
                     columns={
-                        f"temperature (K)": f"temperature (None)"
+                        f"temperature ({st.session_state.temp_unit_edit})" : f"temperature (K)"
                     }
                 )
-                st.info('Choose temperature unit to edit the profile.')
-            
-            st.selectbox(
-                "Temperature unit",
-                TEMP_UNITS,
-                key="temp_unit_edit",
-                disabled=st.session_state.temp_locked_edit
-            )
-            
-            df_temp_edit_final = df_temp_edit.copy()
-            unit = f"temperature ({st.session_state.temp_unit_edit})"
-            df_temp_edit_final[unit]=df_temp_edit_final[unit].apply(
-                lambda v: unit_to_K(v, st.session_state.temp_unit_edit)
-            )
-            df_temp_edit_final=df_temp_edit_final.rename(
-                columns={
-                    f"temperature ({st.session_state.temp_unit_edit})" : f"temperature (K)"
-                }
-            )
+            # The save button follows the pending changes, from the editor's edits only
+            sync_page("temperature_data_edit_changed", editor_changed(key, pit["temperature_profile (K)"], stored_temperature))
+            return df_temp_edit_final
+        
+        df_temp_edit_final = temperature_data_edit(pit)
 
         # %%% --- LWC profile edit ---
-        with st.expander("LWC profile edition"):
+        @st.fragment
+        def lwc_data_edit(pit):
+            with st.expander("LWC profile edition"):
             
-            if st.button("Reset modifications on LWC profile"):
-                st.session_state.reset_counter_lwc_profile_edit += 1
+                if st.button("Reset modifications on LWC profile"):
+                    st.session_state.reset_counter_lwc_profile_edit += 1
                 
-            pit_lwc_edit_work = pit["lwc_profile (%)"]
+                pit_lwc_edit_work = pit["lwc_profile (%)"]
             
-            if to_df(pit_lwc_edit_work).empty: 
-                pit_lwc_edit_work = st.session_state.empty_lwc_df
+                if to_df(pit_lwc_edit_work).empty: 
+                    pit_lwc_edit_work = st.session_state.empty_lwc_df
             
-            key = f"lwc_profile_edit_editor_{st.session_state.reset_counter_lwc_profile_edit}"
+                key = f"lwc_profile_edit_editor_{st.session_state.reset_counter_lwc_profile_edit}"
             
-            df_lwc_edit = st.data_editor(
-                pit_lwc_edit_work,
-                key=key,
-                num_rows="dynamic"
-            )
+                df_lwc_edit = st.data_editor(
+                    pit_lwc_edit_work,
+                    key=key,
+                    num_rows="dynamic"
+                )
+            # The save button follows the pending changes, from the editor's edits only
+            sync_page("lwc_data_edit_changed", editor_changed(key, pit["lwc_profile (%)"]))
+            return df_lwc_edit
+        
+        df_lwc_edit = lwc_data_edit(pit)
         
         # %%% --- Save/Refresh ---
         ivisible_divider()
-        has_changes = (
-            SD_edit != pit["SD (cm)"]
-            or AT_edit != K_to_unit(pit["Air_T (K)"],"°C")
-            or not to_df(df_layers_edit).equals(to_df(pit["layers"]))
-            or not to_df(df_temp_edit_final).equals(to_df(pit["temperature_profile (K)"]))
-            or not to_df(df_lwc_edit).equals(to_df(pit["lwc_profile (%)"]))
-        )
+        # Already compared by each section
+        has_changes = edit_has_changes()
           
         #locked_save=True
         if has_changes: locked_save=False
@@ -858,13 +980,25 @@ if st.session_state.action == OPTIONS[2]:
                 "lwc_profile (%)": to_df(df_lwc_edit).dropna().to_dict("records")
             }
             
-            action = save_or_update_snowpit(data_path, snowpit)
+            # Written in the background, once per content of the pit and
+            # after the saves of the pit still running
+            start_job(
+                "save_snowpit_edit",
+                ("save", str(data_path), selected_id, content_key(snowpit)),
+                save_edited_snowpit, data_path, snowpit, changed_fields(snowpit),
+                queue=(str(data_path), selected_id), label="Saving snow pit",
+            )
+            job = show_job("save_snowpit_edit")
+            if job.error is not None:
+                st.session_state.save_button_edit = False
+                st.stop()
         
-            if action == "updated":
-                st.success(f"Snow pit ID: {selected_id} udpated ✅")
-            else:
-                st.success(f"Snow pit ID: {selected_id} saved ✅")
-            st.write("Saving to:", data_path.resolve())
+            if job_succeeded(job):
+                if job.result() == "updated":
+                    st.success(f"Snow pit ID: {selected_id} udpated ✅")
+                else:
+                    st.success(f"Snow pit ID: {selected_id} saved ✅")
+                st.write("Saving to:", data_path.resolve())
     
     # Refresh
     soft_divider()
@@ -920,19 +1054,16 @@ if st.session_state.action == OPTIONS[3]:
         )
         selected_id = pit_labels[label]
         st.code(f"Snow pit ID: {selected_id}", language="text")
-        delet_pit = [p for p in database if p["id"] != selected_id]
-
-        if len(delet_pit) == 0:
-            if data_path.exists():
-                data_path.unlink()
-                st.session_state.confirm_remove_clicked  = False
-                st.error(f"Snow pit (ID: {selected_id}) deleted ✅")
-                st.error("No snow pits left for this date. JSON file removed!")
-        else:
-            with open(data_path, "w") as f:
-                json.dump(delet_pit, f, indent=2)
-                st.error(f"Snow pit (ID: {selected_id}) deleted ✅")
-                st.session_state.confirm_remove_clicked  = False
+        st.session_state.confirm_remove_clicked  = False
+        try:
+            remaining = remove_snowpit(data_path, selected_id)
+        except SealedSeasonError as e:
+            st.error(str(e))
+            st.stop()
+        st.error(f"Snow pit (ID: {selected_id}) deleted ✅")
+
+        if remaining == 0:
+            st.error("No snow pits left for this date!")
             
             
     soft_divider()
@@ -947,6 +1078,9 @@ if st.session_state.action == OPTIONS[3]:
 # %% Single snow pit plot 
 # ============================================================                            
 if st.session_state.action == OPTIONS[4]:
+    # Only the plot pages import matplotlib
+    from utilities.plotting import render_snowpit_image, snowpit_fingerprint
+    
     if st.session_state.pit_to_plot is  not None:
         section_title_box(
             "Single snow pit stratigraphy plot",
@@ -954,7 +1088,11 @@ if st.session_state.action == OPTIONS[4]:
             badge_type="success"
         )
         selected_id = pit_labels[label]
-        pit = next(p for p in database if p["id"] == selected_id)
+        pit = get_snowpit(data_path, selected_id)
+        if pit is None:
+            refresh_day(data_path, force=True)
+            st.warning("This snow pit is no longer stored for this day, the list of snow pits has been refreshed.")
+            st.stop()
         st.code(f"Snow pit ID: {selected_id}", language="text")
         
         title = st.text_input('Snow pit title', value='Snow pit profile')
@@ -966,45 +1104,115 @@ if st.session_state.action == OPTIONS[4]:
             weather = st.text_input("Weather")
             plot_lwc = st.toggle("Plot LWC")
         
-        fig = plot_snowpit_grid_mapped(
-            pit,
-            plot_temp,
-            plot_lwc,
+        plot_options = dict(
             title=title,
             location=location,
             date=pit["Date"],
             weather=weather,
             air_temperature=K_to_unit(pit["Air_T (K)"], "°C"),
         )
-        st.pyplot(fig, use_container_width=True)
+        preview = render_snowpit_image(pit, plot_temp, plot_lwc, preview=True, **plot_options)
+        st.image(preview, use_container_width=True)
+        fmt = st.selectbox("Format", FIGURE_FORMATS, key="plot_format")
         save_plot_path = (
             BASE_DIR
             / site_plot
             / season_plot
             / "plot"
-            / f"{title}-{pit['Date']}.png"
+            / f"{title}-{pit['Date']}.{fmt}"
         )
         st.caption(f"Your figure will be registered at: {save_plot_path}")
         col_left, col_center, col_right = st.columns([1, 1.1, 0.52])
         with col_center :
             if st.button('Save stratigraphy', type='primary'):
-                st.session_state.save_strati = True
-                fig.savefig(
-                    save_plot_path,
-                    dpi=300,
-                    bbox_inches="tight",
-                    )
-        if st.session_state.save_strati == True: st.write("Saving to:", save_plot_path.resolve())
-    
-    
-    
-    
-    
-    
-    
-    
+                # Full resolution figure, rendered and written in the background
+                start_job(
+                    "save_plot",
+                    ("figure", str(save_plot_path), snowpit_fingerprint(pit, plot_temp=plot_temp, plot_lwc=plot_lwc, **plot_options)),
+                    write_file, save_plot_path, render_snowpit_image, pit, plot_temp, plot_lwc, fmt=fmt, **plot_options,
+                    label="Rendering the stratigraphy",
+                )
+        job = show_job("save_plot")
+        if job_succeeded(job): st.write("Saved to:", job.result().resolve())
+
+# ============================================================
+# %% Seasonal stratigraphy plot 
+# ============================================================
+if st.session_state.action == OPTIONS[5]:
+    from utilities.plotting import render_season_image
     
+    section_title_box(
+        "Seasonal stratigraphy plot",
+        badge_text="READY",
+        badge_type="success"
+    )
+    daily = grid.daily()
+    st.caption(
+        f"{len(grid.columns()['ids'])} snow pits from {daily['days'][0]} to {daily['days'][-1]}"
+    )
     
+    title = st.text_input('Plot title', value=f'{site_seasonal} {season_seasonal}')
+    col1, col2 = st.columns(2)
+    with col1:
+        plot_temp = st.toggle("Plot temperature")
+    with col2:
+        plot_lwc = st.toggle("Plot LWC")
     
+    preview = render_season_image(grid, plot_temp, plot_lwc, title=title, preview=True)
+    st.image(preview, use_container_width=True)
+    fmt = st.selectbox("Format", FIGURE_FORMATS, key="season_plot_format")
+    save_plot_path = (
+        BASE_DIR
+        / site_seasonal
+        / season_seasonal
+        / "plot"
+        / f"{title}-season.{fmt}"
+    )
+    st.caption(f"Your figure will be registered at: {save_plot_path}")
+    col_left, col_center, col_right = st.columns([1, 1.1, 0.52])
+    with col_center :
+        if st.button('Save stratigraphy', type='primary'):
+            # Rendered and written in the background
+            start_job(
+                "save_season_plot",
+                ("figure", str(save_plot_path), grid.version, plot_temp, plot_lwc, title),
+                write_file, save_plot_path, render_season_image, grid, plot_temp, plot_lwc, title=title, fmt=fmt,
+                label="Rendering the season",
+            )
+    job = show_job("save_season_plot")
+    if job_succeeded(job): st.write("Saved to:", job.result().resolve())
     
-    
\ No newline at end of file
+    # %%% --- Season atlas ---
+    soft_divider()
+    atlas_vector = st.toggle("Vector atlas pages (for print)", key="atlas_vector")
+    atlas_path = (
+        BASE_DIR
+        / site_seasonal
+        / season_seasonal
+        / "plot"
+        / f"{title}-atlas.pdf"
+    )
+    st.caption(f"The atlas of every snow pit of the season will be registered at: {atlas_path}")
+    col_left, col_center, col_right = st.columns([1, 1.1, 0.52])
+    with col_center :
+        if st.button('Export season atlas'):
+            from utilities.atlas import export_atlas
+            
+            # One page per pit in date order, rendered and written in the background
+            start_job(
+                "season_atlas",
+                ("atlas", str(atlas_path), grid.version, plot_temp, plot_lwc, atlas_vector),
+                export_atlas, BASE_DIR, atlas_path,
+                sites=[site_seasonal], seasons=[season_seasonal],
+                vector=atlas_vector, plot_temp=plot_temp, plot_lwc=plot_lwc, atlas_title=title,
+                total=len(grid.columns()['ids']), label="Rendering the atlas",
+            )
+    job = show_job("season_atlas")
+    if job_succeeded(job): st.write("Saved to:", job.result()[0].resolve())
+
+# ============================================================
+# %% Warm-up 
+# ============================================================
+# Once the first page is painted, matplotlib loads in the background so the
+# plot pages do not pay for it
+start_warm_up()
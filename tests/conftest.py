@@ -0,0 +1,23 @@
+"""
+Shared fixtures of the test suite, run from the repository root with `python -m pytest`.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+
+from utilities import storage  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def json_backend():
+    """Every test starts with the default backend and empty caches."""
+    storage.set_storage_backend(storage.JSONStore.name)
+    yield
+    storage.set_storage_backend(storage.JSONStore.name)
+    storage._day_cache.invalidate()
+    storage._model_cache.invalidate()
@@ -0,0 +1,54 @@
+"""
+Smoke tests of the Streamlit pages, run headless with AppTest.
+"""
+
+import json
+import subprocess
+import sys
+
+from streamlit.testing.v1 import AppTest
+
+from conftest import REPO_DIR
+from utilities.constants import OPTIONS_LITE
+
+PIT = {
+    "id": "p1",
+    "Date": "2026-01-05",
+    "SD (cm)": 50.0,
+    "Air_T (K)": 268.15,
+    "layers": [
+        {"bottom (cm)": 0, "top (cm)": 50, "grain (IACS)": "DF", "density (g cm⁻³)": 0.2, "snow hardness": "F"}
+    ],
+    "temperature_profile (K)": [{"z (cm)": 0.0, "temperature (K)": 270.0}],
+    "lwc_profile (%)": [],
+}
+
+
+def test_lite_edit_page():
+    at = AppTest.from_file(str(REPO_DIR / "Glacio-Log_app-lite.py"), default_timeout=60).run()
+    at.sidebar.selectbox(key="action").set_value(OPTIONS_LITE[2]).run()
+    at.file_uploader(key="pit_to_edit").set_value(("pit.json", json.dumps(PIT).encode(), "application/json")).run()
+    at.button[0].click().run()
+    assert not at.exception
+    assert not at.session_state["temperature_data_edit_changed"]
+    assert [b.label for b in at.get("download_button")] == ["Download snowpit"]
+
+
+def test_lite_bulk_page_reports_repeated_ids():
+    at = AppTest.from_file(str(REPO_DIR / "Glacio-Log_app-lite.py"), default_timeout=60).run()
+    at.sidebar.selectbox(key="action").set_value(OPTIONS_LITE[4]).run()
+    other = dict(PIT, Date="2026-01-06")
+    at.file_uploader(key="bulk_files").set_value([
+        ("a.json", json.dumps(PIT).encode(), "application/json"),
+        ("b.json", json.dumps(other).encode(), "application/json"),
+    ]).run()
+    assert not at.exception
+    assert [w.value for w in at.warning] == ["1 snow pits skipped: their id was already uploaded"]
+
+
+def test_pages_import_matplotlib_lazily():
+    code = (
+        "import sys, utilities.functions, utilities.storage, utilities.validation; "
+        "assert 'matplotlib' not in sys.modules, 'matplotlib imported'"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True)
@@ -0,0 +1,79 @@
+"""
+Season atlas: every pit of some sites and seasons in one document, in date order.
+"""
+
+import re
+from datetime import date
+
+import pytest
+
+from utilities import atlas
+from utilities.atlas import export_atlas, summary_rows
+from utilities.storage import save_snowpits
+from utilities.tree import day_path
+
+
+def pit(snowpit_id, date, SD=40.0):
+    return {
+        "id": snowpit_id,
+        "Date": date,
+        "SD (cm)": SD,
+        "Air_T (K)": 260.0,
+        "layers": [{"bottom (cm)": 0.0, "top (cm)": SD, "grain (IACS)": "DF", "snow hardness": "F"}],
+        "temperature_profile (K)": [],
+        "lwc_profile (%)": [],
+    }
+
+
+def make_tree(base_dir):
+    save_snowpits(day_path(base_dir, "Summit", "2025-01-05"), [pit("a", "2025-01-05"), pit("b", "2025-01-05", 60.0)])
+    save_snowpits(day_path(base_dir, "Ridge", "2025-01-02"), [pit("c", "2025-01-02", 20.0)])
+    # No air temperature recorded
+    save_snowpits(day_path(base_dir, "Summit", "2025-02-01"), [{k: v for k, v in pit("d", "2025-02-01").items() if k != "Air_T (K)"}])
+
+
+def pdf_pages(path):
+    return len(re.findall(rb"/Type\s*/Page\b", path.read_bytes()))
+
+
+def test_summary_rows(tmp_path):
+    make_tree(tmp_path)
+    rows = summary_rows(atlas._atlas_days(tmp_path, None, None, None, None))
+    assert rows == [
+        ["Ridge", "2024-2025", 1, "2025-01-02", "2025-01-02", 20.0, 20.0],
+        ["Summit", "2024-2025", 3, "2025-01-05", "2025-02-01", 46.7, 60.0],
+    ]
+
+
+@pytest.mark.parametrize("vector", [False, True])
+def test_pdf_atlas(tmp_path, vector):
+    make_tree(tmp_path)
+    done = []
+    out = tmp_path / "atlas.pdf"
+    assert export_atlas(tmp_path, out, vector=vector, dpi=50, workers=1, progress=lambda *a: done.append(a)) == [out]
+    # The summary, then one page per pit
+    assert pdf_pages(out) == 5
+    assert done == [(1, 4), (2, 4), (3, 4), (4, 4)]
+
+
+def test_svg_atlas_filters(tmp_path):
+    make_tree(tmp_path)
+    written = export_atlas(tmp_path, tmp_path / "svg", fmt="svg", sites=["Summit"], end=date(2025, 1, 31), workers=1)
+    assert [p.name for p in written] == ["0000-summary.svg", "0001.svg", "0002.svg"]
+    assert all(p.read_bytes().lstrip().startswith(b"<?xml") for p in written)
+
+
+def test_pooled_pages_keep_the_date_order(tmp_path, monkeypatch):
+    make_tree(tmp_path)
+    days = atlas._atlas_days(tmp_path, None, None, None, None)
+    args = ("png", 50, False, False, "Snow pit profile", "json")
+    in_process = list(atlas._rendered_pages(days, args, workers=1))
+    monkeypatch.setattr(atlas, "DAYS_PER_TASK", 1)
+    pooled = list(atlas._rendered_pages(days, args, workers=2))
+    assert len(pooled) == 4
+    assert pooled == in_process
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        export_atlas(tmp_path, tmp_path / "atlas.png", fmt="png")
@@ -0,0 +1,70 @@
+"""
+Headless validation of a whole data tree.
+"""
+
+import csv
+import io
+import json
+
+from utilities.batch_validate import run_batch_validation, validate_days
+from utilities.storage import JSONStore, load_snowpits, save_snowpits
+from utilities.tree import day_path
+
+
+def pit(snowpit_id, SD=50.0, top=None):
+    layers = [{"bottom (cm)": 0, "top (cm)": SD if top is None else top, "grain (IACS)": "DF", "snow hardness": "F"}]
+    return {
+        "id": snowpit_id,
+        "Date": "2025-01-05",
+        "SD (cm)": SD,
+        "Air_T (K)": 260.0,
+        "layers": layers,
+        "temperature_profile (K)": [],
+        "lwc_profile (%)": [],
+    }
+
+
+def test_same_id_on_two_days_is_reported_on_its_own_day(tmp_path):
+    first = day_path(tmp_path, "Summit", "2025-01-05")
+    second = day_path(tmp_path, "Summit", "2025-01-06")
+    save_snowpits(first, [pit("a", top=40.0)])
+    save_snowpits(second, [pit("a")])
+    n, rows = validate_days(tmp_path, [first, second], JSONStore.name)
+    assert n == 2
+    assert [row[:5] for row in rows] == [["Summit", "2024-2025", "2025-01-05", "a", "layers"]]
+
+
+def test_failing_day_is_reported_and_the_chunk_goes_on(tmp_path):
+    broken = day_path(tmp_path, "Summit", "2025-01-05")
+    legacy = day_path(tmp_path, "Summit", "2025-01-06")
+    broken.parent.mkdir(parents=True)
+    broken.write_text("[{")
+    no_sd = pit("b")
+    del no_sd["SD (cm)"]
+    legacy.write_text(json.dumps([no_sd, pit("c", top=80.0)]))
+
+    n, rows = validate_days(tmp_path, [broken, legacy], JSONStore.name, repair_dir=tmp_path / "repaired")
+    assert n == 2
+    assert [(row[2], row[3], row[7]) for row in rows] == [
+        ("2025-01-05", "", "day_failed"),
+        ("2025-01-06", "b", "invalid_sd"),
+        ("2025-01-06", "c", "top_above_sd"),
+        ("2025-01-06", "c", "thickness_sum"),
+    ]
+    repaired = load_snowpits(tmp_path / "repaired" / legacy.relative_to(tmp_path))
+    assert repaired[0] == no_sd
+    assert repaired[1]["layers"][0]["top (cm)"] == 50.0
+
+
+def test_report(tmp_path):
+    save_snowpits(day_path(tmp_path, "Summit", "2025-01-05"), [pit("a"), pit("b", top=20.0)])
+    save_snowpits(day_path(tmp_path, "Ridge", "2025-02-01"), [pit("c")])
+    report = io.StringIO()
+    progress = []
+    assert run_batch_validation(
+        tmp_path, report, workers=1, progress=lambda done, total: progress.append((done, total))
+    ) == (3, 1)
+    rows = list(csv.reader(io.StringIO(report.getvalue())))
+    assert rows[0] == ["site", "season", "day", "id", "section", "row", "field", "code", "message"]
+    assert [row[:4] + [row[7]] for row in rows[1:]] == [["Summit", "2024-2025", "2025-01-05", "b", "thickness_sum"]]
+    assert progress == [(2, 2)]
@@ -0,0 +1,75 @@
+"""
+Bulk import and export of the lite app.
+"""
+
+import io
+import json
+import zipfile
+
+from utilities import bulk
+from utilities.bulk import build_export_zip, export_name, iter_upload, read_upload
+
+
+def pit(snowpit_id, date="2025-01-05", SD=50.0, top=None):
+    return {
+        "id": snowpit_id,
+        "Date": date,
+        "SD (cm)": SD,
+        "Air_T (K)": 260.0,
+        "layers": [
+            {"bottom (cm)": 0, "top (cm)": SD if top is None else top, "grain (IACS)": "DF", "snow hardness": "F"}
+        ],
+        "temperature_profile (K)": [],
+        "lwc_profile (%)": [],
+    }
+
+
+def zip_upload(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    buf.seek(0)
+    return buf
+
+
+def test_zip_upload():
+    upload = zip_upload({
+        "day1.json": json.dumps([pit("a"), pit("b", top=20.0)]),
+        "notes/day2.json": json.dumps(pit("c", date="2025-02-01")),
+        "broken.json": "{",
+        "other.json": json.dumps({"name": "not a pit"}),
+        "readme.txt": "skipped",
+    })
+    entries = {(source, p and p["id"]): errors for source, p, errors in iter_upload(upload, "field.zip")}
+    assert entries[("field.zip/day1.json", "a")] == []
+    assert entries[("field.zip/day1.json", "b")]
+    assert entries[("field.zip/notes/day2.json", "c")] == []
+    assert entries[("field.zip/broken.json", None)][0].startswith("unreadable file")
+    assert entries[("field.zip/other.json", None)] == ["not a Glacio-Log snow pit (no id or date)"]
+    assert len(entries) == 5
+
+
+def test_repeated_ids_keep_their_own_errors():
+    upload = io.BytesIO(json.dumps([pit("a"), pit("a", top=20.0)]).encode())
+    (_, _, first), (_, _, second) = iter_upload(upload)
+    assert first == [] and second
+
+
+def test_uploads_are_parsed_once(monkeypatch):
+    data = json.dumps([pit("a")]).encode()
+    first = read_upload(io.BytesIO(data), "a.json")
+    monkeypatch.setattr(bulk, "iter_upload", None)
+    assert read_upload(io.BytesIO(data), "a.json") is first
+
+
+def test_export_zip():
+    pits = [pit("a"), {k: v for k, v in pit("b").items() if k != "Air_T (K)"}]
+    done = []
+    data = build_export_zip(pits, progress=done.append)
+    assert done == [1, 2]
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = archive.namelist()
+        assert names == [f"{export_name(p)}.{ext}" for p in pits for ext in ("json", "png")]
+        assert json.loads(archive.read(names[2])) == pits[1]
+        assert archive.read(names[3]).startswith(b"\x89PNG")
@@ -0,0 +1,72 @@
+"""
+In-process caches shared by every Streamlit session of the server.
+"""
+
+import os
+
+from utilities.cache import BytesCache, FileCache, file_signature
+
+
+def touch(path, text):
+    path.write_text(text)
+    # A new mtime even on coarse clocks
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_files_are_parsed_once_per_version(tmp_path):
+    path = tmp_path / "day.json"
+    touch(path, "a")
+    cache, parsed = FileCache(), []
+    load = lambda p: parsed.append(p.read_text()) or p.read_text()
+
+    assert cache.load(path, load) == cache.load(path, load) == "a"
+    assert cache.get(path) == "a" and cache.get(path, tag="other") is None
+    touch(path, "bb")
+    assert cache.get(path, "stale") == "stale"
+    assert cache.load(path, load) == "bb"
+    assert parsed == ["a", "bb"]
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_missing_file_is_a_version_too(tmp_path):
+    path = tmp_path / "day.json"
+    assert file_signature(path) == (None, None)
+    cache = FileCache()
+    assert cache.load(path, lambda p: []) == []
+    touch(path, "a")
+    assert cache.load(path, lambda p: p.read_text()) == "a"
+
+
+def test_dropped_values_are_evicted(tmp_path):
+    paths = [tmp_path / f"{i}.json" for i in range(3)]
+    for path in paths:
+        touch(path, path.name)
+    evicted = []
+    cache = FileCache(maxsize=2, on_evict=evicted.append)
+    for path in paths:
+        cache.load(path, lambda p: p.name)
+    assert evicted == ["0.json"] and len(cache) == 2
+
+    touch(paths[1], "changed")
+    cache.load(paths[1], lambda p: "new")
+    cache.invalidate(paths[2])
+    assert evicted == ["0.json", "1.json", "2.json"]
+    cache.invalidate()
+    assert evicted[-1] == "new" and len(cache) == 0
+
+
+def test_bytes_cache_is_bounded_by_size():
+    cache = BytesCache(max_bytes=10)
+    renders = []
+    render = lambda blob: lambda: renders.append(blob) or blob
+    assert cache.get("a", render(b"aaaa")) == b"aaaa"
+    assert cache.get("a", render(b"other")) == b"aaaa"
+    cache.get("b", render(b"bbbb"))
+    cache.get("c", render(b"cccc"))
+    assert (len(cache), cache.size) == (2, 8)
+    # Too large to be kept, still returned
+    assert cache.get("big", render(b"x" * 11)) == b"x" * 11
+    assert len(cache) == 2
+    cache.get("a", render(b"aaaa"))
+    assert renders == [b"aaaa", b"bbbb", b"cccc", b"x" * 11, b"aaaa"]
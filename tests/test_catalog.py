@@ -0,0 +1,119 @@
+"""
+Catalog of the pits of a data tree, kept in step with the writes.
+"""
+
+import json
+import os
+import time
+from datetime import date
+
+from utilities.catalog import (
+    CATALOG_NAME,
+    catalog_path,
+    ensure_catalog,
+    find_pit,
+    list_day_pits,
+    list_pits,
+    rebuild_catalog,
+    refresh_day,
+)
+from utilities.storage import remove_snowpit, save_or_update_snowpit
+
+
+def pit(snowpit_id, SD=50.0, layers=1):
+    return {
+        "id": snowpit_id,
+        "Date": "2025-01-05",
+        "SD (cm)": SD,
+        "Air_T (K)": 260.0,
+        "layers": [{"bottom (cm)": 0, "top (cm)": SD, "grain (IACS)": "DF"}] * layers,
+        "temperature_profile (K)": [],
+        "lwc_profile (%)": [],
+    }
+
+
+def day_path(base_dir, site="Summit", season="2024-2025", date="2025-01-05"):
+    return base_dir / site / season / "clean_data" / f"snowpits_{date}.json"
+
+
+def test_writes_outside_a_tree_are_not_indexed(tmp_path):
+    save_or_update_snowpit(tmp_path / "snowpits_2025-01-05.json", pit("a"))
+    save_or_update_snowpit(tmp_path / "x" / "y" / "z" / "snowpits_2025-01-05.json", pit("b"))
+    assert not list(tmp_path.rglob(CATALOG_NAME))
+
+
+def test_writes_do_not_create_a_catalog(tmp_path):
+    save_or_update_snowpit(day_path(tmp_path), pit("a"))
+    assert not catalog_path(tmp_path).exists()
+
+
+def make_tree(base_dir):
+    save_or_update_snowpit(day_path(base_dir), pit("a", 40.0, layers=2))
+    save_or_update_snowpit(day_path(base_dir), pit("b", 80.0))
+    save_or_update_snowpit(day_path(base_dir, "Ridge", date="2025-02-01"), pit("c", 120.0))
+    return rebuild_catalog(base_dir)
+
+
+def test_rebuild_and_lookups(tmp_path):
+    assert make_tree(tmp_path) == 3
+    row = find_pit(tmp_path, "b")
+    assert (row["site"], row["season"], row["date"], row["SD (cm)"], row["position"]) == (
+        "Summit", "2024-2025", "2025-01-05", 80.0, 1
+    )
+    assert row["day_path"] == "Summit/2024-2025/clean_data/snowpits_2025-01-05.json"
+    assert find_pit(tmp_path, "missing") is None
+
+    assert [r["id"] for r in list_pits(tmp_path)] == ["a", "b", "c"]
+    assert [r["id"] for r in list_pits(tmp_path, site="Ridge")] == ["c"]
+    assert [r["id"] for r in list_pits(tmp_path, start="2025-01-10")] == ["c"]
+    assert [r["id"] for r in list_pits(tmp_path, end=date(2025, 1, 5))] == ["a", "b"]
+    assert [r["id"] for r in list_pits(tmp_path, min_sd=50, max_sd=100)] == ["b"]
+    assert [r["id"] for r in list_pits(tmp_path, min_layers=2)] == ["a"]
+
+
+def test_writes_update_the_catalog(tmp_path):
+    make_tree(tmp_path)
+    save_or_update_snowpit(day_path(tmp_path), pit("d", 10.0))
+    assert find_pit(tmp_path, "d")["position"] == 2
+    remove_snowpit(day_path(tmp_path), "a")
+    assert find_pit(tmp_path, "a") is None
+    assert [r["id"] for r in list_pits(tmp_path, site="Summit")] == ["b", "d"]
+
+
+def test_external_change_is_picked_up(tmp_path):
+    make_tree(tmp_path)
+    path = day_path(tmp_path)
+    assert [r["id"] for r in list_day_pits(tmp_path, "Summit", date(2025, 1, 5), "2024-2025")] == ["a", "b"]
+
+    # Synced from another laptop, behind the storage's back
+    time.sleep(0.01)
+    path.write_text(json.dumps([pit("e")]))
+    assert [r["id"] for r in list_day_pits(tmp_path, "Summit", date(2025, 1, 5), "2024-2025")] == ["e"]
+    assert find_pit(tmp_path, "a") is None
+
+
+def test_forced_refresh_fixes_a_stale_listing(tmp_path):
+    make_tree(tmp_path)
+    path = day_path(tmp_path)
+    listing = lambda: [r["id"] for r in list_day_pits(tmp_path, "Summit", date(2025, 1, 5), "2024-2025")]
+    assert listing() == ["a", "b"]
+
+    # Same size and modification time: the change goes unnoticed
+    stat = path.stat()
+    text = path.read_text().replace('"a"', '"z"')
+    path.write_text(text)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert listing() == ["a", "b"]
+
+    refresh_day(path, force=True)
+    assert listing() == ["z", "b"]
+    assert find_pit(tmp_path, "a") is None
+
+
+def test_ensure_catalog_builds_it_once(tmp_path):
+    save_or_update_snowpit(day_path(tmp_path), pit("a"))
+    ensure_catalog(tmp_path)
+    assert [r["id"] for r in list_pits(tmp_path)] == ["a"]
+    save_or_update_snowpit(day_path(tmp_path), pit("b"))
+    ensure_catalog(tmp_path)
+    assert [r["id"] for r in list_pits(tmp_path)] == ["a", "b"]
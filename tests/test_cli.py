@@ -0,0 +1,71 @@
+"""
+Command line over a data tree, as used by scripts.
+"""
+
+import csv
+import json
+
+from utilities import api
+from utilities.cli import main
+from utilities.jobs import process_pool
+
+
+def pit(snowpit_id, date="2025-01-05", SD=50.0, top=None):
+    return {
+        "id": snowpit_id,
+        "Date": date,
+        "SD (cm)": SD,
+        "Air_T (K)": 260.0,
+        "layers": [
+            {"bottom (cm)": 0, "top (cm)": SD if top is None else top, "grain (IACS)": "DF", "snow hardness": "F"}
+        ],
+        "temperature_profile (K)": [],
+        "lwc_profile (%)": [],
+    }
+
+
+def test_tree(tmp_path):
+    assert main(["tree", str(tmp_path), "--sites", "Summit", "Ridge", "--seasons", "2024-2025"]) == 0
+    assert (tmp_path / "Ridge" / "2024-2025" / "clean_data").is_dir()
+    assert (tmp_path / "Summit" / "2024-2025" / "plot").is_dir()
+
+
+def test_import_validate_export(tmp_path):
+    src, base = tmp_path / "field", tmp_path / "data"
+    src.mkdir()
+    (src / "day1.json").write_text(json.dumps([pit("a"), pit("b", top=20.0)]))
+    (src / "day2.json").write_text(json.dumps(pit("c", date="2025-02-01")))
+
+    assert main(["import", str(src), str(base), "--site", "Summit", "--workers", "1"]) == 0
+    assert [p["id"] for p in api.load_snowpits(api.day_path(base, "Summit", "2025-01-05"))] == ["a", "b"]
+
+    report = tmp_path / "report.csv"
+    assert main(["validate", str(base), "--report", str(report), "--workers", "1"]) == 1
+    assert [row[3] for row in csv.reader(report.open())][1:] == ["b"]
+
+    out = tmp_path / "pits.csv"
+    assert main(["export", str(base), "--out", str(out), "--workers", "1"]) == 0
+    rows = list(csv.DictReader(out.open(encoding="utf-8")))
+    assert [(r["date"], r["id"]) for r in rows] == [("2025-01-05", "a"), ("2025-01-05", "b"), ("2025-02-01", "c")]
+
+
+def test_import_with_validation_skips_invalid_pits(tmp_path):
+    src, base = tmp_path / "field", tmp_path / "data"
+    src.mkdir()
+    (src / "day1.json").write_text(json.dumps([pit("a"), pit("b", top=20.0)]))
+    assert main(["import", str(src), str(base), "--site", "Summit", "--validate", "--workers", "1"]) == 1
+    assert [p["id"] for p in api.load_snowpits(api.day_path(base, "Summit", "2025-01-05"))] == ["a"]
+
+
+def test_import_on_spawned_workers(tmp_path):
+    src, base = tmp_path / "field", tmp_path / "data"
+    src.mkdir()
+    for i in range(api.FILES_PER_TASK + 1):
+        (src / f"pit{i}.json").write_text(json.dumps(pit(f"p{i}", date=f"2025-01-{i % 28 + 1:02d}")))
+    assert main(["import", str(src), str(base), "--site", "Summit", "--workers", "2"]) == 0
+    assert sum(len(api.load_snowpits(p)) for p in api.find_day_files(base)) == api.FILES_PER_TASK + 1
+
+
+def test_process_pool_spawns():
+    with process_pool(1) as pool:
+        assert pool._mp_context.get_start_method() == "spawn"
@@ -0,0 +1,46 @@
+"""
+Background jobs: shared jobs and the order of the jobs of a queue.
+"""
+
+import threading
+import time
+
+from utilities.jobs import submit
+
+
+def test_same_key_is_shared():
+    release = threading.Event()
+    first = submit(("render", "shared"), release.wait, 5)
+    assert submit(("render", "shared"), release.wait, 5) is first
+    release.set()
+    assert first.result(5)
+
+
+def test_queue_keeps_the_submission_order():
+    written = []
+
+    def save(value, delay):
+        time.sleep(delay)
+        written.append(value)
+        return value
+
+    queue = ("pit", "ordered")
+    older = submit(("save", 1), save, 1, 0.2, queue=queue)
+    submit(("save", 2), save, 2, 0, queue=queue)
+    # Same content as the running save, submitted after another edit
+    last = submit(("save", 1), save, 3, 0, queue=queue)
+    assert last is not older
+    assert submit(("save", 1), save, 4, 0, queue=queue) is last
+    assert last.result(5) == 3
+    assert written == [1, 2, 3]
+
+
+def test_failed_job_does_not_block_its_queue():
+    def fail():
+        raise OSError("disk full")
+
+    queue = ("pit", "failing")
+    failed = submit(("save", "fail"), fail, queue=queue)
+    after = submit(("save", "after"), lambda: "saved", queue=queue)
+    assert after.result(5) == "saved"
+    assert isinstance(failed.error, OSError)
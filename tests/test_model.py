@@ -0,0 +1,82 @@
+"""
+Array-backed Snowpit model: lossless round trip of stored pits.
+"""
+
+import json
+import pickle
+
+import numpy as np
+import pytest
+
+from utilities.model import GRAIN_CODES, MISSING, Snowpit, stack_columns
+from utilities.validation import validate_snowpits
+
+
+def layer(bottom, top, grain="DF", density=0.3, hardness="F"):
+    return {"bottom (cm)": bottom, "top (cm)": top, "grain (IACS)": grain,
+            "density (g cm⁻³)": density, "snow hardness": hardness}
+
+
+def pit(**changes):
+    stored = {
+        "id": "a",
+        "Date": "2025-01-05",
+        "SD (cm)": 50.5,
+        "Air_T (K)": 260.15,
+        "layers": [layer(0.0, 20.25), layer(20.25, 50.5, grain="MF", density=None, hardness="K")],
+        "temperature_profile (K)": [{"z (cm)": 0.0, "temperature (K)": 268.15}],
+        "lwc_profile (%)": [{"z (cm)": 10.0, "LWC (%)": 1.5}],
+    }
+    stored.update(changes)
+    return stored
+
+
+ROUND_TRIPS = {
+    "app pit": pit(),
+    "integers": pit(**{"SD (cm)": 50, "layers": [layer(0, 20), layer(20, 50)]}),
+    "ints among floats": pit(layers=[layer(0, 20.5), layer(20.5, 50)]),
+    "long decimals": pit(**{"temperature_profile (K)": [{"z (cm)": 0.0, "temperature (K)": 1 / 3 + 260}]}),
+    "nulls and typos": pit(layers=[layer(None, "12", grain="df", hardness=None)]),
+    "missing fields": pit(layers=[{"top (cm)": 10.0, "grain (IACS)": "DF"}], **{"Air_T (K)": None}),
+    "missing keys": {"id": "b", "Date": "2025-01-05", "layers": []},
+    "extra keys and order": {"note": "windy", **pit(), "observer": ["A", "B"]},
+    "extra layer keys": pit(layers=[{"comment": "ice lens", **layer(0.0, 50.5)}]),
+    "not a list": pit(**{"lwc_profile (%)": "not measured"}),
+}
+
+
+@pytest.mark.parametrize("stored", ROUND_TRIPS.values(), ids=ROUND_TRIPS.keys())
+def test_round_trip(stored):
+    model = Snowpit.from_dict(stored)
+    restored = model.to_dict()
+    assert restored == stored
+    assert json.dumps(restored) == json.dumps(stored)
+    assert pickle.loads(pickle.dumps(model)).to_dict() == stored
+
+
+def test_arrays():
+    model = Snowpit.from_dict(pit())
+    assert model.layers.dtype == np.float32
+    np.testing.assert_array_equal(model.numbers("layers")[:, 1], [20.25, 50.5])
+    assert list(model.grain_codes) == [GRAIN_CODES["DF"], GRAIN_CODES["MF"]]
+    assert Snowpit.from_dict(ROUND_TRIPS["long decimals"]).temperature.dtype == np.float64
+    assert Snowpit.from_dict(ROUND_TRIPS["missing keys"]).SD is MISSING
+
+
+def test_stack_columns_match_the_records():
+    pits = [Snowpit.from_dict(p) for p in ROUND_TRIPS.values()]
+    columns, sizes = stack_columns(pits, "layers")
+    records = [r for p in ROUND_TRIPS.values() if isinstance(p.get("layers"), list) for r in p["layers"]]
+    assert sizes.sum() == len(records)
+    assert columns["grain (IACS)"].tolist() == [r.get("grain (IACS)") for r in records]
+    assert columns["bottom (cm)"][8] is None and columns["top (cm)"][8] == "12"
+
+
+@pytest.mark.parametrize("stored", ROUND_TRIPS.values(), ids=ROUND_TRIPS.keys())
+def test_models_and_dicts_validate_alike(stored):
+    assert validate_snowpits([Snowpit.from_dict(stored)]).equals(validate_snowpits([stored]))
+
+
+def test_a_batch_of_models_and_dicts_validate_alike():
+    pits = list(ROUND_TRIPS.values())
+    assert validate_snowpits([Snowpit.from_dict(p) for p in pits]).equals(validate_snowpits(pits))
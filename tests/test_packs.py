@@ -0,0 +1,104 @@
+"""
+Memory-mapped season packs, kept up to date after the saves.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utilities import jobs, packs
+from utilities.model import GRAIN_CODES
+from utilities.packs import build_pack, open_pack, query
+from utilities.storage import save_or_update_snowpit, save_snowpits
+from utilities.tables import load_tables
+from utilities.tree import day_path
+
+
+def pit(snowpit_id, date, grains=("DF", "FC")):
+    return {
+        "id": snowpit_id,
+        "Date": date,
+        "SD (cm)": 10.0 * len(grains),
+        "Air_T (K)": 260.0,
+        "layers": [
+            {"bottom (cm)": 10.0 * i, "top (cm)": 10.0 * (i + 1), "grain (IACS)": g,
+             "density (g cm⁻³)": 0.25, "snow hardness": "4F"}
+            for i, g in enumerate(grains)
+        ],
+        "temperature_profile (K)": [{"z (cm)": 0.0, "temperature (K)": 270.0}],
+        "lwc_profile (%)": [],
+    }
+
+
+def make_tree(base_dir):
+    save_snowpits(day_path(base_dir, "Summit", "2025-01-05"), [pit("a", "2025-01-05"), pit("b", "2025-01-05", ("MF",))])
+    save_or_update_snowpit(day_path(base_dir, "Summit", "2025-01-09"), pit("c", "2025-01-09", ("FC", "FC", "RG")))
+    return day_path(base_dir, "Summit", "2025-01-05").parent
+
+
+def wait_for_rebuild(data_dir):
+    job = jobs._queues.get(("pack", str(data_dir)))
+    if job is not None:
+        job.result(timeout=30)
+
+
+def test_pack_matches_the_tables(tmp_path):
+    make_tree(tmp_path)
+    pack = open_pack(tmp_path, "Summit", "2024-2025")
+    assert pack.pits["id"].tolist() == [b"a", b"b", b"c"]
+    assert pack.pits["layers_count"].tolist() == [2, 1, 3]
+
+    everything = query(tmp_path, "layers", lambda L: np.ones(len(L), dtype=bool))
+    layers, *_ = load_tables(tmp_path, workers=1)
+    columns = list(everything.columns)
+    pd.testing.assert_frame_equal(
+        everything.astype({"density (g cm⁻³)": np.float32}),
+        layers[columns].astype({"density (g cm⁻³)": np.float32}),
+        check_dtype=False,
+        check_categorical=False,
+    )
+
+
+def test_query(tmp_path):
+    make_tree(tmp_path)
+    faceted = query(tmp_path, "layers", lambda L: L["grain"] == GRAIN_CODES["FC"], seasons=["2024-2025"])
+    assert list(zip(faceted["id"], faceted["layer"])) == [("a", 1), ("c", 0), ("c", 1)]
+    assert query(tmp_path, "lwc", lambda P: P["value"] > 0).empty
+
+
+def test_only_changed_days_are_parsed_again(tmp_path, monkeypatch):
+    data_dir = make_tree(tmp_path)
+    first = build_pack(data_dir)
+    assert build_pack(data_dir) == first
+
+    parsed = []
+    load = packs.load_snowpit_models
+    monkeypatch.setattr(packs, "load_snowpit_models", lambda path: parsed.append(path.name) or load(path))
+    monkeypatch.setattr(packs, "submit", lambda *args, **kwargs: None)
+    save_or_update_snowpit(day_path(tmp_path, "Summit", "2025-01-09"), pit("d", "2025-01-09"))
+    manifest = build_pack(data_dir)
+    assert parsed == ["snowpits_2025-01-09.json"]
+    assert manifest["version"] == first["version"] + 1
+    assert open_pack(tmp_path, "Summit", "2024-2025", refresh=False).pits["id"].tolist() == [b"a", b"b", b"c", b"d"]
+
+
+def test_saves_only_schedule_a_rebuild(tmp_path, monkeypatch):
+    data_dir = make_tree(tmp_path)
+    version = build_pack(data_dir)["version"]
+    submitted = []
+    monkeypatch.setattr(packs, "submit", lambda *args, **kwargs: submitted.append(args))
+
+    save_or_update_snowpit(day_path(tmp_path, "Summit", "2025-01-09"), pit("d", "2025-01-09"))
+    save_or_update_snowpit(day_path(tmp_path, "Summit", "2025-01-10"), pit("e", "2025-01-10"))
+    assert packs._read_manifest(data_dir.parent / packs.PACK_DIR)["version"] == version
+    # Both saves share the rebuild waiting to start
+    assert len(submitted) == 1
+    packs._rebuild(data_dir)
+    assert open_pack(tmp_path, "Summit", "2024-2025", refresh=False).pits["id"].tolist() == [b"a", b"b", b"c", b"d", b"e"]
+
+
+def test_background_rebuild(tmp_path):
+    data_dir = make_tree(tmp_path)
+    build_pack(data_dir)
+    save_or_update_snowpit(day_path(tmp_path, "Summit", "2025-01-10"), pit("e", "2025-01-10"))
+    wait_for_rebuild(data_dir)
+    assert open_pack(tmp_path, "Summit", "2024-2025", refresh=False).pits["id"].tolist() == [b"a", b"b", b"c", b"e"]
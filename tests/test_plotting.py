@@ -0,0 +1,107 @@
+"""
+Stratigraphy figures rendered on a bounded pool, once per content.
+"""
+
+import sys
+import threading
+
+import pytest
+
+from utilities import plotting
+from utilities.plotting import render_season_image, render_snowpit_image, snowpit_fingerprint
+from utilities.seasonal import season_grid
+from utilities.storage import save_or_update_snowpit
+from utilities.tree import day_path
+
+PIT = {
+    "id": "a",
+    "Date": "2025-01-05",
+    "SD (cm)": 40.0,
+    "Air_T (K)": 260.0,
+    "layers": [
+        {"bottom (cm)": 0.0, "top (cm)": 20.0, "grain (IACS)": "DF", "density (g cm⁻³)": 0.2, "snow hardness": "F"},
+        {"bottom (cm)": 20.0, "top (cm)": 40.0, "grain (IACS)": "MF", "density (g cm⁻³)": 0.3, "snow hardness": "K"},
+    ],
+    "temperature_profile (K)": [{"z (cm)": 0.0, "temperature (K)": 270.0}],
+    "lwc_profile (%)": [{"z (cm)": 10.0, "LWC (%)": 1.0}],
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_render_cache():
+    plotting._render_cache.clear()
+    yield
+    plotting._render_cache.clear()
+
+
+@pytest.mark.parametrize("fmt, magic", [("png", b"\x89PNG"), ("svg", b"<?xml"), ("pdf", b"%PDF")])
+def test_formats(fmt, magic):
+    assert render_snowpit_image(PIT, True, True, fmt=fmt, preview=True).startswith(magic)
+
+
+@pytest.mark.parametrize("n_cm, step", [(40, 1), (60, 1), (61, 2), (250, 5), (3000, 50), (10000, 100)])
+def test_preview_grid_step(n_cm, step):
+    assert plotting._preview_grid_step(n_cm) == step
+
+
+def test_preview_is_lighter_than_the_export():
+    deep = dict(PIT, **{"SD (cm)": 200.0})
+    preview = plotting.plot_snowpit_grid_mapped(deep, True, True, preview=True)
+    full = plotting.plot_snowpit_grid_mapped(deep, True, True)
+    assert preview.dpi == plotting.PREVIEW_DPI and full.dpi == 300
+    minor = lambda fig: len(fig.axes[0].get_yticks(minor=True))
+    assert minor(preview) <= plotting.PREVIEW_MAX_GRID_LINES + 1 < minor(full)
+    # Cached apart from the export it stands for
+    assert render_snowpit_image(PIT, False, False, preview=True) != render_snowpit_image(PIT, False, False, dpi=100)
+
+
+def test_pyplot_is_left_alone():
+    render_snowpit_image(PIT, True, False, preview=True)
+    # Figures are standalone: pyplot, shared by every session, is never needed
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    assert pyplot is None or not pyplot.get_fignums()
+
+
+def test_renders_are_cached_per_content(monkeypatch):
+    calls = []
+    plot = plotting.plot_snowpit_grid_mapped
+    monkeypatch.setattr(plotting, "plot_snowpit_grid_mapped", lambda *a, **k: calls.append(1) or plot(*a, **k))
+    first = render_snowpit_image(PIT, False, False, preview=True)
+    assert render_snowpit_image(dict(PIT), False, False, preview=True) == first
+    assert len(calls) == 1
+    render_snowpit_image(dict(PIT, **{"SD (cm)": 41.0}), False, False, preview=True)
+    assert len(calls) == 2
+    assert snowpit_fingerprint(PIT, dpi=72) != snowpit_fingerprint(PIT, dpi=300)
+
+
+def test_sessions_asking_at_once_share_one_render(monkeypatch):
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow_plot(*args, **kwargs):
+        calls.append(1)
+        started.set()
+        release.wait(10)
+        return plotting._new_figure(figsize=(1, 1))
+
+    monkeypatch.setattr(plotting, "plot_snowpit_grid_mapped", slow_plot)
+    results = []
+    sessions = [threading.Thread(target=lambda: results.append(render_snowpit_image(PIT, False, False))) for _ in range(3)]
+    sessions[0].start()
+    started.wait(10)
+    for session in sessions[1:]:
+        session.start()
+    release.set()
+    for session in sessions:
+        session.join(10)
+    assert len(calls) == 1
+    assert len(results) == 3 and len(set(results)) == 1
+
+
+def test_season_image_follows_the_grid(tmp_path):
+    save_or_update_snowpit(day_path(tmp_path, "Summit", "2025-01-05"), PIT)
+    grid = season_grid(tmp_path, "Summit", "2024-2025")
+    first = render_season_image(grid, True, False, preview=True)
+    assert first.startswith(b"\x89PNG")
+    assert render_season_image(grid, True, False, preview=True) is first
+    save_or_update_snowpit(day_path(tmp_path, "Summit", "2025-01-08"), dict(PIT, id="b", Date="2025-01-08"))
+    assert render_season_image(grid, True, False, preview=True) != first
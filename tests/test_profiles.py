@@ -0,0 +1,57 @@
+"""
+Depth grids of the temperature and LWC tables of the Create pages.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.profiles import measured_points, profile_depths, resample_profile
+from utilities.units import unit_to_K_array
+
+
+def table(z, values, name="LWC (%)"):
+    return pd.DataFrame({"z (cm)": z, name: values})
+
+
+@pytest.mark.parametrize("SD, step", [(None, 5.0), (0, 5.0), (50.0, None), (50.0, np.nan), (50.0, 0.0), (50.0, -5.0)])
+def test_no_grid_while_unset(SD, step):
+    assert profile_depths(SD, step).size == 0
+
+
+def test_profile_depths():
+    np.testing.assert_array_equal(profile_depths(50.0, 10.0), [0, 10, 20, 30, 40])
+    np.testing.assert_array_equal(profile_depths(12.0, 5.0), [0, 5, 10])
+
+
+def test_measured_points():
+    z, values = measured_points(table([0, 5, "x", 15, None], [1.0, None, 2.0, "3", 4.0]))
+    np.testing.assert_array_equal(z, [0, 15])
+    np.testing.assert_array_equal(values, [1.0, 3.0])
+    for empty in (None, table([], []), pd.DataFrame({"z (cm)": [0.0]})):
+        assert measured_points(empty)[0].size == 0
+
+
+def test_measured_values_are_kept_on_a_new_grid():
+    entered = resample_profile(None, profile_depths(30.0, 10.0), "LWC (%)")
+    entered.loc[1, "LWC (%)"] = 2.5
+    entered.loc[3] = [25.0, 1.0]
+
+    # Snow depth and step changed: the grid is merged with the measured depths
+    resampled = resample_profile(entered, profile_depths(40.0, 20.0), "LWC (%)")
+    np.testing.assert_array_equal(resampled["z (cm)"], [0, 10, 20, 25])
+    np.testing.assert_array_equal(resampled["LWC (%)"], [np.nan, 2.5, np.nan, 1.0])
+
+
+def test_unit_change():
+    entered = table([0.0, 10.0], [0.0, np.nan], "temperature (°C)")
+    resampled = resample_profile(
+        entered, profile_depths(20.0, 10.0), "temperature (K)", convert=lambda v: unit_to_K_array(v, "°C")
+    )
+    assert list(resampled.columns) == ["z (cm)", "temperature (K)"]
+    np.testing.assert_allclose(resampled["temperature (K)"], [273.15, np.nan])
+
+
+def test_depth_measured_twice_keeps_its_last_value():
+    resampled = resample_profile(table([5.0, 5.0], [1.0, 2.0]), np.array([0.0]), "LWC (%)")
+    np.testing.assert_array_equal(resampled["LWC (%)"], [np.nan, 2.0])
@@ -0,0 +1,73 @@
+"""
+Season grid of rasterized pits, kept in step with the writes.
+"""
+
+import json
+import time
+
+import numpy as np
+
+from utilities.model import GRAIN_CODES
+from utilities.seasonal import NO_SNOW, SeasonGrid, rasterize_snowpit, season_grid
+from utilities.storage import save_or_update_snowpit
+
+
+def pit(snowpit_id, date, SD=4.0, grains=("DF", "RG"), temperature=()):
+    step = SD / len(grains)
+    return {
+        "id": snowpit_id,
+        "Date": date,
+        "SD (cm)": SD,
+        "Air_T (K)": 260.0,
+        "layers": [
+            {"bottom (cm)": i * step, "top (cm)": (i + 1) * step, "grain (IACS)": g, "snow hardness": "F"}
+            for i, g in enumerate(grains)
+        ],
+        "temperature_profile (K)": [{"z (cm)": z, "temperature (K)": T} for z, T in temperature],
+        "lwc_profile (%)": [],
+    }
+
+
+def day_path(base_dir, date):
+    return base_dir / "Summit" / "2024-2025" / "clean_data" / f"snowpits_{date}.json"
+
+
+def test_rasterize_snowpit():
+    z = np.array([0.5, 1.5, 2.5, 3.5, 4.5])
+    grain, T, lwc = rasterize_snowpit(pit("a", "2025-01-05", temperature=[(0, 270.0)]), z)
+    assert list(grain) == [GRAIN_CODES["DF"]] * 2 + [GRAIN_CODES["RG"]] * 2 + [NO_SNOW]
+    # From 270 K at the ground to the air temperature at the surface
+    np.testing.assert_allclose(T, [268.75, 266.25, 263.75, 261.25, np.nan])
+    assert np.isnan(lwc).all()
+
+
+def test_columns_and_daily_fields(tmp_path):
+    save_or_update_snowpit(day_path(tmp_path, "2025-01-01"), pit("a", "2025-01-01", temperature=[(0, 270.0)]))
+    save_or_update_snowpit(day_path(tmp_path, "2025-01-05"), pit("b", "2025-01-05", SD=6.0, grains=("MF",)))
+    grid = SeasonGrid(day_path(tmp_path, "x").parent).refresh()
+
+    cols = grid.columns()
+    assert cols["ids"] == ["a", "b"]
+    assert cols["grain"].shape == (2, 6)
+    assert list(cols["grain"][0]) == [GRAIN_CODES["DF"]] * 2 + [GRAIN_CODES["RG"]] * 2 + [NO_SNOW] * 2
+
+    daily = grid.daily()
+    assert daily["days"].size == 5
+    # Grains hold until the next pit, temperatures are interpolated in time
+    assert (daily["grain"][3] == daily["grain"][0]).all()
+    assert (daily["grain"][4] == GRAIN_CODES["MF"]).all()
+    assert np.isnan(daily["temperature"][2]).all()
+
+
+def test_writes_and_external_changes_update_the_grid(tmp_path):
+    save_or_update_snowpit(day_path(tmp_path, "2025-01-01"), pit("a", "2025-01-01"))
+    grid = season_grid(tmp_path, "Summit", "2024-2025")
+    version = grid.version
+
+    save_or_update_snowpit(day_path(tmp_path, "2025-01-02"), pit("b", "2025-01-02"))
+    assert grid.columns()["ids"] == ["a", "b"] and grid.version > version
+    assert season_grid(tmp_path, "Summit", "2024-2025") is grid
+
+    time.sleep(0.01)
+    day_path(tmp_path, "2025-01-01").write_text(json.dumps([pit("c", "2025-01-01")]))
+    assert grid.refresh().columns()["ids"] == ["c", "b"]
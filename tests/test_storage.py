@@ -0,0 +1,444 @@
+"""
+Storage backends: round trips, folders written by several processes,
+concurrent writers, file permissions, sealed seasons, JSON Lines logs and
+compressed day files.
+"""
+
+import json
+import os
+import stat
+import subprocess
+import sys
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from conftest import REPO_DIR
+from utilities import storage
+from utilities.storage import (
+    JSONLStore,
+    MixedStorageError,
+    SQLiteStore,
+    STORAGE_BACKENDS,
+    atomic_write,
+    folder_backend,
+    list_days,
+    load_snowpits,
+    remove_snowpit,
+    save_or_update_snowpit,
+    save_snowpits,
+    seal_season,
+    set_storage_backend,
+    unseal_season,
+    update_snowpit_fields,
+)
+
+BACKENDS = list(STORAGE_BACKENDS)
+
+
+def pit(snowpit_id, SD=50.0):
+    return {
+        "id": snowpit_id,
+        "Date": "2025-01-05",
+        "SD (cm)": SD,
+        "Air_T (K)": 260.0,
+        "layers": [{"bottom (cm)": 0, "top (cm)": SD, "grain (IACS)": "DF"}],
+        "temperature_profile (K)": [],
+        "lwc_profile (%)": [],
+    }
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / "Summit" / "2024-2025" / "clean_data"
+    path.mkdir(parents=True)
+    return path
+
+
+def day(data_dir, date="2025-01-05"):
+    return data_dir / f"snowpits_{date}.json"
+
+
+def write_day_file(path, pits):
+    path.write_text(json.dumps(pits, indent=4))
+
+
+def fresh(path):
+    """Pits of a day read again from the disk."""
+    storage._day_cache.invalidate()
+    storage._log_cache.invalidate()
+    return storage.open_store(path).load()
+
+
+def run_in_process(code):
+    """Run `code` in a new interpreter, with the default (json) backend selected."""
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True)
+
+# ============================================================
+# %% Round trip
+# ============================================================
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_round_trip(data_dir, backend):
+    set_storage_backend(backend)
+    path = day(data_dir)
+    assert save_snowpits(path, [pit("a"), pit("b")]) == ["created", "created"]
+    assert save_or_update_snowpit(path, pit("a", 60.0)) == "updated"
+    assert update_snowpit_fields(path, "b", {"SD (cm)": 99.0}) == "updated"
+    assert update_snowpit_fields(path, "missing", {"SD (cm)": 1.0}) is None
+
+    assert fresh(path) == [pit("a", 60.0), dict(pit("b"), **{"SD (cm)": 99.0})]
+    assert list_days(data_dir) == [path]
+    assert folder_backend(data_dir) == backend
+
+    assert remove_snowpit(path, "a") == 1
+    assert remove_snowpit(path, "b") == 0
+    assert fresh(path) == []
+    assert list_days(data_dir) == []
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_legacy_day_file_is_read(data_dir, backend):
+    path = day(data_dir)
+    write_day_file(path, [pit("a")])
+    set_storage_backend(backend)
+    assert load_snowpits(path) == [pit("a")]
+    assert list_days(data_dir) == [path]
+
+# ============================================================
+# %% Folders written by several processes
+# ============================================================
+
+@pytest.mark.parametrize("backend", ["sqlite", "jsonl"])
+def test_json_writer_uses_the_folder_backend(data_dir, backend):
+    path = day(data_dir)
+    write_day_file(path, [pit("a", 10.0)])
+    set_storage_backend(backend)
+    update_snowpit_fields(path, "a", {"SD (cm)": 99.0})
+
+    # Another process on the default backend, as the CLI and the API
+    run_in_process(
+        "from utilities import api\n"
+        f"api.save_or_update_snowpit({str(path)!r}, {pit('b')!r})\n"
+        f"assert api.load_snowpits({str(path)!r})[0]['SD (cm)'] == 99.0\n"
+    )
+    assert [sp["id"] for sp in fresh(path)] == ["a", "b"]
+    assert fresh(path)[0]["SD (cm)"] == 99.0
+
+
+def test_selected_backend_applies_to_new_folders(data_dir, tmp_path):
+    set_storage_backend("sqlite")
+    save_or_update_snowpit(day(data_dir), pit("a"))
+    assert (data_dir / storage.SQLITE_DB_NAME).exists()
+
+    set_storage_backend("jsonl")
+    other = tmp_path / "Ridge" / "2024-2025" / "clean_data"
+    save_or_update_snowpit(day(other), pit("b"))
+    save_or_update_snowpit(day(data_dir), pit("c"))
+    assert folder_backend(data_dir) == "sqlite"
+    assert folder_backend(other) == "jsonl"
+    assert not list(data_dir.glob("*.jsonl"))
+
+def test_failing_listener_does_not_fail_the_save(data_dir, monkeypatch, caplog):
+    seen = []
+
+    def broken(path, snowpits):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(storage, "_write_listeners", [broken, lambda path, snowpits: seen.append(path)])
+    path = day(data_dir)
+    assert save_or_update_snowpit(path, pit("a")) == "created"
+    assert seen == [path]
+    assert "index unavailable" in caplog.text
+    assert fresh(path) == [pit("a")]
+
+# ============================================================
+# %% Concurrent writers
+# ============================================================
+
+def _save_pits(backend, path, ids):
+    set_storage_backend(backend)
+    for snowpit_id in ids:
+        save_or_update_snowpit(path, pit(snowpit_id))
+    return len(ids)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_concurrent_threads(data_dir, backend):
+    path = day(data_dir)
+    threads = [
+        threading.Thread(target=_save_pits, args=(backend, path, [f"t{i}-{j}" for j in range(10)]))
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(sp["id"] for sp in fresh(path)) == sorted(f"t{i}-{j}" for i in range(4) for j in range(10))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_concurrent_processes(data_dir, backend):
+    path = day(data_dir)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        chunks = [[f"p{i}-{j}" for j in range(10)] for i in range(2)]
+        assert sum(pool.map(_save_pits, [backend] * 2, [path] * 2, chunks)) == 20
+    set_storage_backend(backend)
+    assert sorted(sp["id"] for sp in fresh(path)) == sorted(i for chunk in chunks for i in chunk)
+
+# ============================================================
+# %% File modes
+# ============================================================
+
+def test_atomic_write_modes(tmp_path):
+    path = tmp_path / "day.json"
+    mask = os.umask(0o022)
+    try:
+        atomic_write(path, lambda f: f.write("[]"))
+        assert stat.S_IMODE(path.stat().st_mode) == 0o644
+        path.chmod(0o640)
+        atomic_write(path, lambda f: f.write("[1]"))
+        assert stat.S_IMODE(path.stat().st_mode) == 0o640
+        assert path.read_text() == "[1]"
+    finally:
+        os.umask(mask)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_day_files_are_not_private(data_dir, backend):
+    set_storage_backend(backend)
+    path = day(data_dir)
+    mask = os.umask(0o022)
+    try:
+        save_or_update_snowpit(path, pit("a"))
+    finally:
+        os.umask(mask)
+    for written in data_dir.iterdir():
+        if not written.name.endswith(".lock"):
+            assert stat.S_IMODE(written.stat().st_mode) & 0o044 == 0o044, written
+
+# ============================================================
+# %% Sealed seasons
+# ============================================================
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_seal_and_unseal(data_dir, backend):
+    path = day(data_dir)
+    write_day_file(path, [pit("a", 10.0), pit("b")])
+    set_storage_backend(backend)
+    update_snowpit_fields(path, "a", {"SD (cm)": 99.0})
+    save_or_update_snowpit(day(data_dir, "2025-01-06"), pit("c"))
+    expected = {p.name: fresh(p) for p in list_days(data_dir)}
+
+    # Sealed by a process selecting another backend, as the CLI does by default
+    set_storage_backend("json")
+    assert seal_season(data_dir) == 2
+    assert sorted(p.name for p in data_dir.iterdir() if not p.name.endswith(".lock")) == ["season.zip"]
+    with zipfile.ZipFile(data_dir / "season.zip") as archive:
+        assert json.loads(archive.read("index.json"))["backend"] == backend
+        assert json.loads(archive.read(path.name))[0]["SD (cm)"] == 99.0
+    assert {p.name: fresh(p) for p in list_days(data_dir)} == expected
+    with pytest.raises(storage.SealedSeasonError):
+        save_or_update_snowpit(path, pit("d"))
+
+    assert unseal_season(data_dir) == 2
+    assert not (data_dir / "season.zip").exists()
+    assert folder_backend(data_dir) == backend
+    assert {p.name: fresh(p) for p in list_days(data_dir)} == expected
+
+
+def test_seal_refuses_a_mixed_folder(data_dir):
+    SQLiteStore(day(data_dir)).upsert(pit("a"))
+    JSONLStore(day(data_dir, "2025-01-06")).upsert(pit("b"))
+    before = sorted(p.name for p in data_dir.iterdir())
+    with pytest.raises(MixedStorageError):
+        seal_season(data_dir)
+    assert sorted(p.name for p in data_dir.iterdir()) == before
+
+
+def test_write_during_a_seal_is_refused(data_dir, monkeypatch):
+    path = day(data_dir)
+    write_day_file(path, [pit("a")])
+    listed, release = threading.Event(), threading.Event()
+    list_days = storage.JSONStore.list_days
+
+    def list_days_slowly(folder):
+        listed.set()
+        release.wait(10)
+        return list_days(folder)
+
+    monkeypatch.setattr(storage.JSONStore, "list_days", staticmethod(list_days_slowly))
+    sealer = threading.Thread(target=seal_season, args=(data_dir,))
+    sealer.start()
+    listed.wait(10)
+
+    errors = []
+    def write():
+        try:
+            save_or_update_snowpit(path, pit("b"))
+        except storage.SealedSeasonError as e:
+            errors.append(e)
+    writer = threading.Thread(target=write)
+    writer.start()
+    # The write waits for the seal instead of landing in the folder being archived
+    writer.join(0.2)
+    assert writer.is_alive()
+    release.set()
+    sealer.join(10)
+    writer.join(10)
+    assert len(errors) == 1
+    with zipfile.ZipFile(data_dir / "season.zip") as archive:
+        assert [sp["id"] for sp in json.loads(archive.read(path.name))] == ["a"]
+
+
+def test_dropped_archives_are_closed(data_dir):
+    write_day_file(day(data_dir), [pit("a")])
+    seal_season(data_dir)
+    archive = storage.open_archive(data_dir)
+    storage._archive_cache.invalidate()
+    assert archive._zip is None
+    # Still readable by whoever held it
+    assert [sp["id"] for sp in archive.load_day(day(data_dir).name)] == ["a"]
+    archive.close()
+
+
+def test_cli_seals_the_folder_backend(data_dir):
+    path = day(data_dir)
+    write_day_file(path, [pit("a")])
+    set_storage_backend("sqlite")
+    save_or_update_snowpit(path, pit("b"))
+    base_dir = data_dir.parents[2]
+    run_in_process(f"from utilities import cli; cli.main(['seal', {str(base_dir)!r}, 'Summit', '2024-2025'])")
+    with zipfile.ZipFile(data_dir / "season.zip") as archive:
+        assert [sp["id"] for sp in json.loads(archive.read(path.name))] == ["a", "b"]
+
+# ============================================================
+# %% Pit ids
+# ============================================================
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_same_id_on_two_days(data_dir, backend):
+    set_storage_backend(backend)
+    first, second = day(data_dir), day(data_dir, "2025-01-06")
+    save_or_update_snowpit(first, pit("a", 10.0))
+    assert save_or_update_snowpit(second, pit("a", 20.0)) == "created"
+    update_snowpit_fields(first, "a", {"Air_T (K)": 250.0})
+    assert fresh(first) == [dict(pit("a", 10.0), **{"Air_T (K)": 250.0})]
+    assert fresh(second) == [pit("a", 20.0)]
+    assert remove_snowpit(second, "a") == 0
+    assert fresh(first)[0]["SD (cm)"] == 10.0
+
+
+def test_sqlite_database_keyed_on_id_is_migrated(data_dir):
+    import sqlite3
+
+    con = sqlite3.connect(data_dir / storage.SQLITE_DB_NAME)
+    con.executescript(
+        """
+        CREATE TABLE snowpits (id TEXT PRIMARY KEY, day TEXT NOT NULL, position INTEGER NOT NULL, payload TEXT NOT NULL);
+        CREATE INDEX snowpits_day ON snowpits(day, position);
+        CREATE TABLE days (day TEXT PRIMARY KEY);
+        """
+    )
+    con.execute("INSERT INTO snowpits VALUES ('a', ?, 0, ?)", (day(data_dir).name, json.dumps(pit("a"))))
+    con.execute("INSERT INTO days VALUES (?)", (day(data_dir).name,))
+    con.commit()
+    con.close()
+
+    assert fresh(day(data_dir)) == [pit("a")]
+    assert save_or_update_snowpit(day(data_dir, "2025-01-06"), pit("a", 20.0)) == "created"
+    assert fresh(day(data_dir)) == [pit("a")]
+
+# ============================================================
+# %% JSON Lines logs
+# ============================================================
+
+def log_records(path):
+    return [json.loads(line) for line in path.with_suffix(".jsonl").read_text().splitlines()]
+
+
+def test_log_appends_one_record_per_write(data_dir):
+    set_storage_backend(JSONLStore.name)
+    path = day(data_dir)
+    write_day_file(path, [pit("a")])
+    save_or_update_snowpit(path, pit("b"))
+    update_snowpit_fields(path, "a", {"SD (cm)": 70.0})
+    remove_snowpit(path, "b")
+    # The day file is copied into the log on the first write
+    assert log_records(path) == [
+        {"put": pit("a")},
+        {"put": pit("b")},
+        {"patch": "a", "fields": {"SD (cm)": 70.0}},
+        {"delete": "b"},
+    ]
+    assert fresh(path) == [dict(pit("a"), **{"SD (cm)": 70.0})]
+
+
+def test_torn_last_line_is_ignored_and_cut(data_dir):
+    set_storage_backend(JSONLStore.name)
+    path = day(data_dir)
+    save_or_update_snowpit(path, pit("a"))
+    with open(path.with_suffix(".jsonl"), "a") as f:
+        f.write('{"put": {"id": "b"')
+    assert fresh(path) == [pit("a")]
+    save_or_update_snowpit(path, pit("c"))
+    assert log_records(path) == [{"put": pit("a")}, {"put": pit("c")}]
+
+
+def test_compaction(data_dir):
+    set_storage_backend(JSONLStore.name)
+    path = day(data_dir)
+    save_snowpits(path, [pit("a"), pit("b")])
+    for sd in range(10):
+        update_snowpit_fields(path, "a", {"SD (cm)": float(sd)})
+    assert storage.compact_days(data_dir) == 1
+    assert log_records(path) == [{"put": dict(pit("a"), **{"SD (cm)": 9.0})}, {"put": pit("b")}]
+    assert storage.compact_days(data_dir) == 0
+    assert fresh(path) == [dict(pit("a"), **{"SD (cm)": 9.0}), pit("b")]
+
+
+def test_superseded_log_is_compacted_in_the_background(data_dir):
+    set_storage_backend(JSONLStore.name)
+    path = day(data_dir)
+    save_or_update_snowpit(path, pit("a"))
+    for sd in range(storage.COMPACT_MIN_RECORDS + 2):
+        update_snowpit_fields(path, "a", {"SD (cm)": float(sd)})
+    for _ in range(100):
+        if len(log_records(path)) == 1:
+            break
+        threading.Event().wait(0.05)
+    assert log_records(path) == [{"put": dict(pit("a"), **{"SD (cm)": float(storage.COMPACT_MIN_RECORDS + 1)})}]
+
+# ============================================================
+# %% Compressed day files
+# ============================================================
+
+@pytest.mark.parametrize("compression", ["gzip", "lzma"])
+def test_compressed_day_files(data_dir, compression):
+    site_dir = data_dir.parents[1]
+    path = day(data_dir)
+    save_or_update_snowpit(path, pit("a"))
+    storage.set_site_compression(site_dir, compression)
+    assert storage.site_compression(site_dir) == compression
+
+    # Existing files follow on their next write, or all at once
+    save_or_update_snowpit(day(data_dir, "2025-01-06"), pit("b"))
+    suffix = storage.COMPRESSED_SUFFIXES[compression]
+    assert storage.day_file(day(data_dir, "2025-01-06")).name == "snowpits_2025-01-06.json" + suffix
+    assert storage.recompress_site(site_dir) == 1
+    assert storage.day_file(path).name == "snowpits_2025-01-05.json" + suffix
+    assert not path.exists()
+
+    assert list_days(data_dir) == [path, day(data_dir, "2025-01-06")]
+    assert fresh(path) == [pit("a")]
+
+    storage.set_site_compression(site_dir, "none")
+    assert storage.recompress_site(site_dir) == 2
+    assert json.loads(path.read_text()) == [pit("a")]
+
+
+def test_unknown_compression(data_dir):
+    with pytest.raises(ValueError):
+        storage.set_site_compression(data_dir.parents[1], "zip")
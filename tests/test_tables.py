@@ -0,0 +1,81 @@
+"""
+Tidy tables of the pits of a data tree.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utilities import tables
+from utilities.constants import HARDNESS_MAP
+from utilities.storage import save_or_update_snowpit, save_snowpits
+from utilities.tables import load_tables
+from utilities.tree import day_path
+
+
+def pit(snowpit_id, date, grains=("DF", "MF"), hardness=("F", "K")):
+    return {
+        "id": snowpit_id,
+        "Date": date,
+        "SD (cm)": 20.0 * len(grains),
+        "Air_T (K)": 260.0,
+        "layers": [
+            {"bottom (cm)": 20.0 * i, "top (cm)": 20.0 * (i + 1), "grain (IACS)": g, "snow hardness": h}
+            for i, (g, h) in enumerate(zip(grains, hardness))
+        ],
+        "temperature_profile (K)": [{"z (cm)": 0.0, "temperature (K)": 270.0}],
+        "lwc_profile (%)": [],
+    }
+
+
+def make_tree(base_dir):
+    save_snowpits(day_path(base_dir, "Summit", "2025-01-05"), [pit("a", "2025-01-05"), pit("b", "2025-01-05")])
+    save_snowpits(day_path(base_dir, "Ridge", "2025-02-01"), [pit("c", "2025-02-01", ("XX",), ("?",))])
+
+
+def test_layers_table(tmp_path):
+    make_tree(tmp_path)
+    layers, temperature, lwc = load_tables(tmp_path, workers=1)
+    assert list(layers["id"]) == ["c", "a", "a", "b", "b"]
+    assert list(layers["layer"]) == [0, 0, 1, 0, 1]
+    assert layers["grain (IACS)"].dtype == tables.GRAIN_DTYPE
+    assert layers["snow hardness"].dtype == tables.HARDNESS_DTYPE
+    # Unknown categories are missing values
+    assert layers["grain (IACS)"].isna().tolist() == [True, False, False, False, False]
+    assert layers["hardness code"].tolist()[1:3] == [HARDNESS_MAP["F"], HARDNESS_MAP["K"]]
+    assert layers["hardness code"].isna().iloc[0]
+    assert list(temperature.columns) == ["site", "season", "date", "id", "z (cm)", "temperature (K)"]
+    assert len(temperature) == 3 and lwc.empty
+
+
+def test_filters(tmp_path):
+    make_tree(tmp_path)
+    layers, *_ = load_tables(tmp_path, sites=["Summit"], workers=1)
+    assert set(layers["site"]) == {"Summit"}
+    layers, *_ = load_tables(tmp_path, start=date(2025, 1, 10), workers=1)
+    assert list(layers["id"]) == ["c"]
+    assert (layers["date"] == pd.Timestamp("2025-02-01")).all()
+
+
+def test_tables_are_cached_until_a_day_changes(tmp_path):
+    make_tree(tmp_path)
+    first = load_tables(tmp_path, workers=1)
+    assert load_tables(tmp_path, workers=1) is first
+    save_or_update_snowpit(day_path(tmp_path, "Ridge", "2025-02-01"), pit("d", "2025-02-01"))
+    layers, *_ = load_tables(tmp_path, workers=1)
+    assert "d" in set(layers["id"])
+
+
+def test_pool_gives_the_same_tables(tmp_path, monkeypatch):
+    for day in range(1, 5):
+        save_or_update_snowpit(day_path(tmp_path, "Summit", f"2025-01-0{day}"), pit(f"p{day}", f"2025-01-0{day}"))
+    in_process = load_tables(tmp_path, workers=1)
+    tables._day_models.invalidate()
+    tables._tables_cache.clear()
+    monkeypatch.setattr(tables, "PARALLEL_MIN_DAYS", 2)
+    monkeypatch.setattr(tables, "DAYS_PER_TASK", 2)
+    pooled = load_tables(tmp_path, workers=2)
+    for a, b in zip(in_process, pooled):
+        pd.testing.assert_frame_equal(a, b)
+    assert np.array_equal(pooled[0]["top (cm)"], [20.0, 40.0] * 4)
@@ -0,0 +1,44 @@
+"""
+Temperature unit conversions, on whole columns and on single values.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utilities.units import K_to_unit, K_to_unit_array, unit_to_K, unit_to_K_array
+
+UNITS = ["K", "°C", "°F"]
+
+
+def test_known_values():
+    K = np.array([273.15, 233.15, np.nan])
+    np.testing.assert_allclose(K_to_unit_array(K, "°C"), [0.0, -40.0, np.nan])
+    np.testing.assert_allclose(K_to_unit_array(K, "°F"), [32.0, -40.0, np.nan])
+    np.testing.assert_allclose(K_to_unit_array(K, "K"), K)
+    assert K_to_unit(273.15, "°F") == pytest.approx(32.0)
+    assert unit_to_K(-40.0, "°C") == pytest.approx(233.15)
+
+
+@pytest.mark.parametrize("unit", UNITS + [None])
+def test_round_trip_and_scalars_agree(unit):
+    K = np.array([250.0, 260.5, np.nan, 273.15])
+    np.testing.assert_allclose(unit_to_K_array(K_to_unit_array(K, unit), unit), K)
+    for value, converted in zip(K, K_to_unit_array(K, unit)):
+        np.testing.assert_allclose(K_to_unit(value, unit), converted)
+        np.testing.assert_allclose(unit_to_K(converted, unit), value)
+
+
+def test_series_keep_their_index_and_name():
+    K = pd.Series([260.0, None], index=[3, 7], name="T (K)")
+    converted = K_to_unit_array(K, "°C")
+    assert isinstance(converted, pd.Series)
+    assert list(converted.index) == [3, 7] and converted.name == "T (K)"
+    assert converted.iloc[0] == pytest.approx(-13.15) and np.isnan(converted.iloc[1])
+
+
+def test_unknown_unit():
+    with pytest.raises(ValueError):
+        K_to_unit_array([260.0], "°R")
+    with pytest.raises(ValueError):
+        unit_to_K_array([260.0], "°R")
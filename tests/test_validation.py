@@ -0,0 +1,123 @@
+"""
+Vectorized validation of one pit being edited and of whole collections of pits.
+"""
+
+import pandas as pd
+
+from utilities.validation import repair_snowpit, validate_snowpit, validate_snowpit_table, validate_snowpits
+
+
+def layer(bottom, top, grain="DF", hardness="F"):
+    return {"bottom (cm)": bottom, "top (cm)": top, "grain (IACS)": grain, "snow hardness": hardness}
+
+
+def pit(snowpit_id, SD=50.0, layers=None, temperature=(), lwc=()):
+    return {
+        "id": snowpit_id,
+        "Date": "2025-01-05",
+        "SD (cm)": SD,
+        "Air_T (K)": 260.0,
+        "layers": [layer(0, 20), layer(20, SD)] if layers is None else layers,
+        "temperature_profile (K)": [{"z (cm)": z, "temperature (K)": 265.0} for z in temperature],
+        "lwc_profile (%)": [{"z (cm)": z, "LWC (%)": 1.0} for z in lwc],
+    }
+
+
+def codes(errors):
+    return list(errors["code"])
+
+
+def test_valid_pit_has_no_errors():
+    errors = validate_snowpits([pit("a", temperature=[0, 10, 50])])
+    assert errors.empty
+    assert list(errors.columns) == ["id", "section", "row", "field", "code", "message"]
+
+
+def test_layer_checks():
+    layers = [
+        layer(0, 20, grain="XX"),
+        layer(15, 30, hardness="?"),
+        layer(30, 25),
+        layer(-5, 60),
+        layer("a", 10),
+    ]
+    errors = validate_snowpits([pit("a", layers=layers)])
+    assert set(codes(errors)) == {
+        "invalid_grain",
+        "invalid_hardness",
+        "top_le_bottom",
+        "top_above_sd",
+        "bottom_below_zero",
+        "invalid_numeric",
+        "thickness_sum",
+        "overlap",
+    }
+    assert errors.loc[errors["code"] == "invalid_grain", "row"].tolist() == [0]
+    assert errors.loc[errors["code"] == "invalid_numeric", "row"].tolist() == [4]
+
+
+def test_profile_checks():
+    errors = validate_snowpits([pit("a", temperature=[-1, 10, 10], lwc=[60])])
+    assert list(zip(errors["section"], errors["code"])) == [
+        ("Temperature", "z_below_zero"),
+        ("Temperature", "duplicated_depth"),
+        ("LWC", "z_above_sd"),
+    ]
+
+
+def test_errors_are_told_apart_by_pit():
+    pits = [pit("a"), pit("b", layers=[layer(0, 40)]), pit("c", lwc=[80])]
+    errors = validate_snowpits(pits)
+    assert list(zip(errors["id"], errors["code"])) == [("b", "thickness_sum"), ("c", "z_above_sd")]
+
+
+def test_single_pit_entry_points():
+    layers_df = pd.DataFrame([layer(0, 20), layer(10, 50)])
+    temp_df = pd.DataFrame({"z (cm)": [5.0, 5.0], "T (K)": [265.0, 266.0]})
+    lwc_df = pd.DataFrame(columns=["z (cm)", "LWC (%)"])
+    table = validate_snowpit_table(50.0, layers_df, temp_df, lwc_df)
+    assert codes(table) == ["thickness_sum", "overlap", "duplicated_depth"]
+    assert validate_snowpit(50.0, layers_df, temp_df, lwc_df) == list(table["message"])
+
+
+def test_missing_snow_depth():
+    no_sd = pit("b")
+    del no_sd["SD (cm)"]
+    errors = validate_snowpits([pit("a"), no_sd, pit("c", SD=-1.0, layers=[])])
+    assert list(zip(errors["id"], errors["field"], errors["code"])) == [
+        ("b", "SD (cm)", "invalid_sd"),
+        ("c", "SD (cm)", "invalid_sd"),
+    ]
+    assert list(errors.index) == [1, 2]
+
+
+def test_repair_makes_the_geometry_consistent():
+    layers = [layer(30, 70), layer(-5, 10), layer(12, 20), layer(14, 18)]
+    repaired = repair_snowpit(pit("a", layers=layers, temperature=[-1, 10, 10, 60]))
+    assert [(l["bottom (cm)"], l["top (cm)"]) for l in repaired["layers"]] == [(0, 10), (10, 20), (20, 50)]
+    assert [p["z (cm)"] for p in repaired["temperature_profile (K)"]] == [10]
+    assert validate_snowpits([repaired]).empty
+
+
+def test_repair_leaves_a_pit_without_snow_depth():
+    no_sd = pit("a", layers=[layer(0, 80)])
+    del no_sd["SD (cm)"]
+    assert repair_snowpit(no_sd) == no_sd
+
+
+def test_pits_without_rows():
+    bare = {"id": "a", "Date": "2025-01-05", "SD (cm)": 50.0}
+    assert validate_snowpits([bare]).empty
+    assert validate_snowpits([]).empty
+    assert validate_snowpits([pit("b", layers="not measured")]).empty
+
+
+def test_errors_do_not_depend_on_the_other_pits():
+    short = pit("a", layers=[layer(0, 20), layer(20, 40)])
+    commented = pit("b", layers=[{**layer(0, 50), "comment": "ice lens"}])
+    legacy = pit("c", layers=[{"bottom (cm)": 0, "top (cm)": None, "grain (IACS)": "DF", "snow hardness": "F"}])
+    with_density = pit("d", layers=[{**layer(0, 50), "density (g cm⁻³)": 0.3}])
+    alone = [validate_snowpits([p]) for p in (short, commented, legacy, with_density)]
+    together = validate_snowpits([short, commented, legacy, with_density])
+    assert list(together["code"]) == [code for errors in alone for code in errors["code"]]
+    assert list(together["code"]) == ["thickness_sum", "invalid_numeric"]
@@ -0,0 +1,307 @@
+"""
+Headless Glacio-Log, without Streamlit.
+
+    from utilities import api
+
+    path = api.day_path(base_dir, "Summit", "2026-01-05")
+    api.save_or_update_snowpit(path, pit)
+    errors = api.validate_snowpits(api.load_snowpits(path))
+    fig = api.plot_snowpit_grid_mapped(pit, plot_temp=True, plot_lwc=False)
+
+Validation (pandas) and plotting (matplotlib) are only imported on first
+use, so importing this module stays cheap. Bulk operations run in a process
+pool and call `progress(done, total)` as chunks complete.
+"""
+
+import csv
+import importlib
+from pathlib import Path
+
+import utilities.catalog  # keeps the catalog in step with every write below
+from utilities.storage import (
+    JSON_SUFFIXES,
+    STORAGE_BACKENDS,
+    compact_days,
+    export_snowpits_json,
+    get_snowpit,
+    get_storage_backend,
+    SealedSeasonError,
+    MixedStorageError,
+    import_snowpits_json,
+    list_days,
+    load_snowpit_models,
+    load_snowpits,
+    open_archive,
+    read_json_file,
+    recompress_site,
+    remove_snowpit,
+    save_or_update_snowpit,
+    save_snowpits,
+    seal_season,
+    set_site_compression,
+    set_storage_backend,
+    site_compression,
+    unseal_season,
+    update_snowpit_fields,
+)
+from utilities.jobs import process_pool
+from utilities.model import MISSING, Snowpit
+from utilities.packs import build_pack, open_pack, query  # packs also follow every write
+from utilities.tree import (
+    DATA_TEMPLATE,
+    PLOT_TEMPLATE,
+    create_file_tree,
+    current_season,
+    day_path,
+    find_data_dirs,
+    find_day_files,
+    plot_dir,
+)
+from utilities.units import K_to_unit, unit_to_K
+
+_LAZY = {
+    "validate_snowpit": "utilities.validation",
+    "validate_snowpit_table": "utilities.validation",
+    "validate_snowpits": "utilities.validation",
+    "repair_snowpit": "utilities.validation",
+    "plot_snowpit_grid_mapped": "utilities.plotting",
+    "render_snowpit_image": "utilities.plotting",
+    "plot_season_stratigraphy": "utilities.plotting",
+    "render_season_image": "utilities.plotting",
+    "season_grid": "utilities.seasonal",
+    "load_tables": "utilities.tables",
+    "list_pits": "utilities.catalog",
+    "find_pit": "utilities.catalog",
+    "rebuild_catalog": "utilities.catalog",
+    "export_atlas": "utilities.atlas",
+}
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+FILES_PER_TASK = 64
+DAYS_PER_TASK = 16
+
+TABLE_COLUMNS = {
+    "pits": ["site", "season", "date", "id", "SD (cm)", "Air_T (K)", "n_layers"],
+    "layers": ["site", "season", "date", "id", "layer", "bottom (cm)", "top (cm)",
+               "grain (IACS)", "density (g cm⁻³)", "snow hardness"],
+    "temperature": ["site", "season", "date", "id", "z (cm)", "temperature (K)"],
+    "lwc": ["site", "season", "date", "id", "z (cm)", "LWC (%)"],
+}
+
+# ============================================================
+# %% Process pool
+# ============================================================
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def _run_chunks(worker, chunks, args=(), workers=None, progress=None, total=None):
+    """Results of `worker(chunk, *args)` in chunk order, from a process pool.
+
+    With `workers=1` everything runs in this process, which is faster for a
+    handful of chunks.
+    """
+    total = total if total is not None else len(chunks)
+    done = 0
+    if workers == 1 or len(chunks) <= 1:
+        results = (worker(chunk, *args) for chunk in chunks)
+        pool = None
+    else:
+        pool = process_pool(workers)
+        results = pool.map(worker, chunks, *[[a] * len(chunks) for a in args])
+    try:
+        for chunk, result in zip(chunks, results):
+            done += len(chunk)
+            if progress is not None:
+                progress(done, total)
+            yield result
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+# ============================================================
+# %% Import
+# ============================================================
+
+def read_snowpit_file(json_path: Path):
+    """Pits of a JSON file (compressed or not): a day file (list of pits) or one pit downloaded from the lite app."""
+    data = read_json_file(json_path)
+    return data if isinstance(data, list) else [data]
+
+def _site_of(src_dir: Path, json_path: Path):
+    """Site of a file laid out as {site}/{season}/clean_data/..., None otherwise."""
+    parts = json_path.relative_to(src_dir).parts
+    if len(parts) == 4 and parts[2] == "clean_data":
+        return parts[0]
+    return None
+
+def _import_files(files, base_dir, backend, validate):
+    """Worker: import a chunk of (file, site), returns (number of pits imported, skipped)."""
+    set_storage_backend(backend)
+    skipped = []
+    by_day = {}
+    for json_path, site in files:
+        try:
+            pits = read_snowpit_file(json_path)
+            for pit in pits:
+                by_day.setdefault(day_path(base_dir, site, pit["Date"]), []).append(pit)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            skipped.append((str(json_path), None, f"unreadable file: {e}"))
+
+    n = 0
+    for path, pits in by_day.items():
+        if validate:
+            from utilities.validation import validate_snowpits
+            errors = validate_snowpits(pits)
+            invalid = set(errors["id"])
+            for error in errors.itertuples(index=False):
+                skipped.append((str(path), error.id, error.message))
+            pits = [pit for pit in pits if pit.get("id") not in invalid]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        n += len(save_snowpits(path, pits))
+    return n, skipped
+
+def import_directory(src_dir: Path, base_dir: Path, site=None, validate=False, workers=None, progress=None):
+    """Upsert every pit found in the JSON files under `src_dir` into the tree at `base_dir`.
+
+    Files laid out as a Glacio-Log tree keep their site; other files (e.g.
+    lite app downloads) go to `site`. Pits land in the season of their date.
+    With `validate`, invalid pits are skipped. Returns (pits imported,
+    skipped) where skipped lists (file or day, pit id, reason).
+    """
+    src_dir, base_dir = Path(src_dir), Path(base_dir)
+    files, skipped = [], []
+    for json_path in sorted(p for p in src_dir.rglob("*") if p.name.lower().endswith(JSON_SUFFIXES)):
+        file_site = _site_of(src_dir, json_path) or site
+        if file_site is None:
+            skipped.append((str(json_path), None, "unknown site"))
+        else:
+            files.append((json_path, file_site))
+
+    n = 0
+    for imported, chunk_skipped in _run_chunks(
+        _import_files, _chunks(files, FILES_PER_TASK), (base_dir, get_storage_backend(), validate),
+        workers, progress, len(files),
+    ):
+        n += imported
+        skipped.extend(chunk_skipped)
+    return n, skipped
+
+# ============================================================
+# %% Export
+# ============================================================
+
+def _value(v):
+    return None if v is MISSING else v
+
+def _table_rows(days, table, backend):
+    """Worker: rows of `table` for a chunk of day paths."""
+    set_storage_backend(backend)
+    rows = []
+    for path in days:
+        path = Path(path)
+        keys = [path.parents[2].name, path.parents[1].name, path.stem[len("snowpits_"):]]
+        for pit in load_snowpit_models(path):
+            head = keys + [_value(pit.id)]
+            if table == "pits":
+                rows.append(head + [_value(pit.SD), _value(pit.air_T), len(pit)])
+                continue
+            columns = pit.columns(table)
+            fields = TABLE_COLUMNS[table][5:] if table == "layers" else TABLE_COLUMNS[table][4:]
+            values = zip(*(map(_value, columns[f]) for f in fields))
+            if table == "layers":
+                rows.extend(head + [i, *v] for i, v in enumerate(values))
+            else:
+                rows.extend(head + list(v) for v in values)
+    return rows
+
+def export_table(base_dir: Path, out, table="pits", sites=None, seasons=None, workers=None, progress=None):
+    """Write one flat CSV table (see TABLE_COLUMNS) of the tree to the `out` text stream.
+
+    Rows are streamed in site, season and date order; returns the number of rows.
+    """
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    days = find_day_files(base_dir, sites, seasons)
+    writer = csv.writer(out)
+    writer.writerow(TABLE_COLUMNS[table])
+    n = 0
+    for rows in _run_chunks(
+        _table_rows, _chunks(days, DAYS_PER_TASK), (table, get_storage_backend()),
+        workers, progress, len(days),
+    ):
+        writer.writerows(rows)
+        n += len(rows)
+    return n
+
+# ============================================================
+# %% Render
+# ============================================================
+
+def _render_days(days, out_dir, fmt, dpi, plot_temp, plot_lwc, title, backend):
+    """Worker: render every pit of a chunk of days, returns the written paths."""
+    from utilities.plotting import render_snowpit_image
+
+    set_storage_backend(backend)
+    written = []
+    for path in days:
+        pits = load_snowpits(path)
+        for i, pit in enumerate(pits):
+            suffix = f"-{i + 1}" if len(pits) > 1 else ""
+            out_path = Path(out_dir) / f"{title}-{pit['Date']}{suffix}.{fmt}"
+            out_path.write_bytes(render_snowpit_image(
+                pit, plot_temp, plot_lwc,
+                title=title,
+                date=pit["Date"],
+                air_temperature=K_to_unit(pit["Air_T (K)"], "°C"),
+                fmt=fmt,
+                dpi=dpi,
+            ))
+            written.append(str(out_path))
+    return written
+
+def render_season(
+    base_dir: Path,
+    site,
+    season,
+    out_dir: Path = None,
+    fmt="png",
+    dpi=300,
+    plot_temp=False,
+    plot_lwc=False,
+    title="Snow pit profile",
+    overview=True,
+    workers=None,
+    progress=None,
+):
+    """Render every pit of a site and season, plus the seasonal overview, into `out_dir`.
+
+    `out_dir` defaults to the plot folder of the season. Returns the written paths.
+    """
+    out_dir = Path(out_dir or plot_dir(base_dir, site, season))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    days = list_days(Path(base_dir) / DATA_TEMPLATE.format(site=site, season=season))
+
+    written = []
+    for paths in _run_chunks(
+        _render_days, _chunks(days, DAYS_PER_TASK),
+        (out_dir, fmt, dpi, plot_temp, plot_lwc, title, get_storage_backend()),
+        workers, progress, len(days),
+    ):
+        written.extend(paths)
+
+    if overview and days:
+        from utilities.plotting import render_season_image
+        from utilities.seasonal import season_grid
+
+        out_path = out_dir / f"{site} {season}-season.{fmt}"
+        grid = season_grid(base_dir, site, season)
+        out_path.write_bytes(render_season_image(
+            grid, plot_temp, plot_lwc, title=f"{site} {season}", fmt=fmt, dpi=dpi
+        ))
+        written.append(str(out_path))
+    return written
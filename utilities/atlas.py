@@ -0,0 +1,176 @@
+"""
+Season atlas: every pit of some sites and seasons in one document, in date order.
+
+    export_atlas(base_dir, "Summit-2025-2026.pdf", sites=["Summit"], seasons=["2025-2026"])
+    export_atlas(base_dir, "atlas.pdf", vector=True)     # vector pages, for print
+    export_atlas(base_dir, "atlas_svg", fmt="svg")       # one SVG file per page
+
+The first page sums up the pits of each site and season. Pit pages are
+rendered in a process pool a few chunks ahead of the writer and written as
+they come back, in date order, so only those chunks are held in memory.
+A PDF atlas holds the pages as images at `dpi`. A vector PDF is drawn page
+by page in this process, as a PDF file has a single writer; SVG pages are
+vector and rendered in the pool.
+"""
+
+import os
+from collections import deque
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from utilities.jobs import process_pool
+from utilities.storage import atomic_write, get_storage_backend, load_snowpits, set_storage_backend
+from utilities.tables import find_days
+from utilities.units import K_to_unit
+
+ATLAS_FORMATS = ["pdf", "svg"]
+ATLAS_DPI = 200
+DAYS_PER_TASK = 8
+
+# ============================================================
+# %% Pages
+# ============================================================
+
+def _atlas_days(base_dir, sites, seasons, start, end):
+    """(site, season, day, path) of every day file, by date then site."""
+    return sorted(find_days(base_dir, sites, seasons, start, end), key=lambda d: (d[2], d[0]))
+
+def _plot_options(site, pit, title):
+    return dict(
+        title=title,
+        location=site,
+        date=pit["Date"],
+        air_temperature=K_to_unit(pit.get("Air_T (K)", np.nan), "°C"),
+    )
+
+def _page_figures(days, plot_temp, plot_lwc, title):
+    """Figure of every pit of some days, built one at a time."""
+    from utilities.plotting import plot_snowpit_grid_mapped
+
+    for site, _, _, path in days:
+        for pit in load_snowpits(path):
+            yield plot_snowpit_grid_mapped(pit, plot_temp, plot_lwc, **_plot_options(site, pit, title))
+
+def _render_pages(days, fmt, dpi, plot_temp, plot_lwc, title, backend):
+    """Worker: encoded page of every pit of a chunk of days."""
+    from utilities.plotting import encode_figure
+
+    set_storage_backend(backend)
+    return [encode_figure(fig, fmt, dpi) for fig in _page_figures(days, plot_temp, plot_lwc, title)]
+
+def _rendered_pages(days, args, workers):
+    """Encoded pages of `days` in order, at most 2 * `workers` chunks rendered ahead."""
+    chunks = [days[i:i + DAYS_PER_TASK] for i in range(0, len(days), DAYS_PER_TASK)]
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from _render_pages(chunk, *args)
+        return
+
+    pool = process_pool(workers)
+    try:
+        chunks = iter(chunks)
+        pending = deque(pool.submit(_render_pages, chunk, *args) for chunk in islice(chunks, 2 * workers))
+        while pending:
+            pages = pending.popleft().result()
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(pool.submit(_render_pages, chunk, *args))
+            yield from pages
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def summary_rows(days):
+    """Rows of SUMMARY_COLUMNS (see utilities.plotting) for the pits of `days`."""
+    groups = {}
+    for site, season, day, path in days:
+        pits = load_snowpits(path)
+        if pits:
+            groups.setdefault((site, season), []).append((day, [pit.get("SD (cm)") for pit in pits]))
+    rows = []
+    for (site, season), found in sorted(groups.items()):
+        SD = np.array([v for _, values in found for v in values if v is not None], dtype=float)
+        rows.append([
+            site,
+            season,
+            sum(len(values) for _, values in found),
+            str(min(day for day, _ in found)),
+            str(max(day for day, _ in found)),
+            round(float(SD.mean()), 1) if SD.size else "",
+            round(float(SD.max()), 1) if SD.size else "",
+        ])
+    return rows
+
+# ============================================================
+# %% Export
+# ============================================================
+
+def export_atlas(
+    base_dir: Path,
+    out_path: Path,
+    sites=None,
+    seasons=None,
+    start=None,
+    end=None,
+    fmt="pdf",
+    vector=False,
+    dpi=ATLAS_DPI,
+    plot_temp=False,
+    plot_lwc=False,
+    title="Snow pit profile",
+    atlas_title="Snow pit atlas",
+    workers=None,
+    progress=None,
+):
+    """Write the atlas of the pits of some sites, seasons and dates, returns the written paths.
+
+    `out_path` is the PDF file, or the folder of the SVG pages. `start` and
+    `end` are dates (inclusive); `progress(done, total)` counts pits.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+    from utilities.plotting import encode_figure, image_page, plot_atlas_summary
+
+    if fmt not in ATLAS_FORMATS:
+        raise ValueError(f"Unknown atlas format: {fmt}")
+    out_path = Path(out_path)
+    days = _atlas_days(base_dir, sites, seasons, start, end)
+    rows = summary_rows(days)
+    total = sum(row[2] for row in rows)
+    summary = plot_atlas_summary(rows, atlas_title)
+
+    def pages():
+        if vector and fmt == "pdf":
+            yield from _page_figures(days, plot_temp, plot_lwc, title)
+        else:
+            page_fmt = "svg" if fmt == "svg" else "png"
+            args = (page_fmt, dpi, plot_temp, plot_lwc, title, get_storage_backend())
+            yield from _rendered_pages(days, args, workers)
+
+    def counted(pages):
+        for done, page in enumerate(pages, 1):
+            yield page
+            if progress is not None:
+                progress(done, total)
+
+    if fmt == "svg":
+        out_path.mkdir(parents=True, exist_ok=True)
+        written = [out_path / "0000-summary.svg"]
+        written[0].write_bytes(encode_figure(summary, "svg", dpi))
+        for i, svg in enumerate(counted(pages()), 1):
+            written.append(out_path / f"{i:04d}.svg")
+            written[-1].write_bytes(svg)
+        return written
+
+    def write(f):
+        with PdfPages(f) as pdf:
+            pdf.savefig(summary)
+            for page in counted(pages()):
+                if vector:
+                    pdf.savefig(page, bbox_inches="tight")
+                else:
+                    pdf.savefig(image_page(page, dpi), dpi=dpi)
+
+    atomic_write(out_path, write, mode="wb")
+    return [out_path]
@@ -0,0 +1,177 @@
+"""
+Headless validation of a whole archive.
+
+Walks the {site}/{season}/clean_data tree created by create_file_tree,
+validates every pit in a process pool and streams failures as CSV.
+Optionally writes auto-repaired copies of the day files to another folder.
+
+    python -m utilities.batch_validate ../ --report report.csv --repair ../repaired
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+
+from utilities.jobs import process_pool
+from utilities.storage import (
+    atomic_write_json,
+    get_storage_backend,
+    load_snowpits,
+    set_storage_backend,
+    STORAGE_BACKENDS,
+)
+from utilities.tree import find_day_files
+
+# Followed by the columns of the validation error table; validation (and
+# pandas) is only imported once a run starts, to keep the CLI fast to start
+REPORT_KEYS = ["site", "season", "day", "id"]
+
+DAYS_PER_TASK = 64
+
+# ============================================================
+# %% Chunks
+# ============================================================
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# ============================================================
+# %% Worker
+# ============================================================
+
+def _day_keys(path):
+    path = Path(path)
+    return [path.parents[2].name, path.parents[1].name, path.stem[len("snowpits_"):]]
+
+def validate_days(base_dir, day_paths, backend, repair_dir=None):
+    """Validate a chunk of days, returns (number of pits, report rows).
+
+    A day that cannot be read or repaired is reported as a "day_failed" row
+    instead of failing the whole chunk.
+    """
+    from utilities.validation import repair_snowpit, validate_snowpits
+
+    set_storage_backend(backend)
+    base_dir = Path(base_dir)
+    pits, owners, rows = [], [], []
+    for path in day_paths:
+        try:
+            day_pits = load_snowpits(path)
+            if repair_dir is not None and day_pits:
+                atomic_write_json(
+                    Path(repair_dir) / Path(path).relative_to(base_dir),
+                    [repair_snowpit(sp) for sp in day_pits],
+                    indent=2,
+                )
+        except Exception as e:
+            rows.append(_day_keys(path) + ["", "day", "", "", "day_failed", f"{type(e).__name__}: {e}"])
+            continue
+        pits.extend(day_pits)
+        owners.extend([path] * len(day_pits))
+
+    # Errors are indexed by the position of their pit: ids repeat across days
+    errors = validate_snowpits(pits)
+    for position, error in zip(errors.index, errors.itertuples(index=False)):
+        rows.append(_day_keys(owners[position]) + [
+            error.id,
+            error.section,
+            "" if error.row is None else error.row,
+            error.field,
+            error.code,
+            error.message,
+        ])
+    return len(pits), rows
+
+# ============================================================
+# %% Driver
+# ============================================================
+
+def run_batch_validation(
+    base_dir: Path,
+    report,
+    sites=None,
+    seasons=None,
+    repair_dir=None,
+    workers=None,
+    backend=None,
+    progress=None,
+):
+    """Validate every pit under `base_dir`, writing failures to the `report` CSV stream.
+
+    Returns (number of pits, number of errors). `progress(done, total)` is
+    called after each chunk of days. `backend` selects the storage of the
+    folders not held by one yet, see `utilities.storage.folder_backend`.
+    """
+    from utilities.validation import ERROR_COLUMNS
+
+    backend = backend or get_storage_backend()
+    days = find_day_files(base_dir, sites, seasons)
+    writer = csv.writer(report)
+    writer.writerow(REPORT_KEYS + ERROR_COLUMNS)
+
+    n_pits = n_errors = n_days = 0
+    with process_pool(workers) as pool:
+        futures = {
+            pool.submit(validate_days, base_dir, chunk, backend, repair_dir): len(chunk)
+            for chunk in _chunks(days, DAYS_PER_TASK)
+        }
+        for future in as_completed(futures):
+            pits, rows = future.result()
+            writer.writerows(rows)
+            report.flush()
+            n_pits += pits
+            n_errors += len(rows)
+            n_days += futures[future]
+            if progress is not None:
+                progress(n_days, len(days))
+    return n_pits, n_errors
+
+def _print_progress(done, total):
+    print(f"\r{done}/{total} days", end="" if done < total else "\n", file=sys.stderr, flush=True)
+
+def add_arguments(parser):
+    parser.add_argument("base_dir", type=Path, help="Folder holding the {site}/{season} tree")
+    parser.add_argument("--sites", nargs="*", help="Only these sites")
+    parser.add_argument("--seasons", nargs="*", help="Only these seasons")
+    parser.add_argument("--report", type=Path, help="CSV report (default: standard output)")
+    parser.add_argument("--repair", type=Path, help="Write auto-repaired day files under this folder")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument(
+        "--storage", choices=list(STORAGE_BACKENDS), help="Storage of the folders holding no snow pits yet"
+    )
+
+def run(args):
+    start = time.perf_counter()
+    report = open(args.report, "w", newline="") if args.report else sys.stdout
+    try:
+        n_pits, n_errors = run_batch_validation(
+            args.base_dir,
+            report,
+            sites=args.sites,
+            seasons=args.seasons,
+            repair_dir=args.repair,
+            workers=args.workers,
+            backend=args.storage,
+            progress=_print_progress,
+        )
+    finally:
+        if report is not sys.stdout:
+            report.close()
+    print(
+        f"{n_pits} snow pits checked, {n_errors} errors, {time.perf_counter() - start:.1f} s",
+        file=sys.stderr,
+    )
+    return 1 if n_errors else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate every snow pit of a Glacio-Log data tree.")
+    add_arguments(parser)
+    return run(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
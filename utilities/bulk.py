@@ -0,0 +1,164 @@
+"""
+Bulk import and export of the lite app.
+
+    entries = read_upload(uploaded_file)        # (source, pit, errors) of each pit
+    data = build_export_zip(pits, plot_temp=True)   # zip of JSON and PNG files
+
+An upload is one pit, a day file or a zip of them (compressed or not). Zip
+members are decompressed, parsed and validated one at a time, and each
+upload is parsed once per content: reruns find it by its sha256. The page
+builds exports as background jobs (see utilities.jobs).
+"""
+
+import hashlib
+import io
+import json
+import threading
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+from utilities.storage import JSON_SUFFIXES, load_json
+from utilities.units import K_to_unit
+
+ZIP_MAGIC = b"PK\x03\x04"
+# Larger members are skipped rather than decompressed
+MAX_MEMBER_BYTES = 64 * 1024 * 1024
+VALIDATE_CHUNK = 32
+EXPORT_DPI = 200
+
+# ============================================================
+# %% Upload
+# ============================================================
+
+def _members(f, name):
+    """(source, document or None, error) of every JSON document of an upload."""
+    f.seek(0)
+    if f.read(4) != ZIP_MAGIC:
+        f.seek(0)
+        try:
+            yield name, load_json(f), None
+        except (ValueError, OSError, EOFError) as e:
+            yield name, None, f"unreadable file: {e}"
+        return
+
+    f.seek(0)
+    with zipfile.ZipFile(f) as archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(JSON_SUFFIXES)
+        ]
+        for info in members:
+            source = f"{name}/{info.filename}"
+            if info.file_size > MAX_MEMBER_BYTES:
+                yield source, None, f"skipped, larger than {MAX_MEMBER_BYTES // 2**20} MB"
+                continue
+            try:
+                with archive.open(info) as member:
+                    yield source, load_json(member), None
+            except (ValueError, OSError, EOFError, zipfile.BadZipFile) as e:
+                yield source, None, f"unreadable file: {e}"
+
+def _validated(batch):
+    """`batch` of (source, pit, errors) with the validation errors of its pits added."""
+    from utilities.validation import validate_snowpits
+
+    checked = [i for i, (_, _, errors) in enumerate(batch) if not errors]
+    messages = {}
+    if checked:
+        # Errors are indexed by the position of their pit: uploaded ids may repeat
+        errors = validate_snowpits([batch[i][1] for i in checked])
+        for position, message in zip(errors.index, errors["message"]):
+            messages.setdefault(checked[position], []).append(message)
+    return [
+        (source, pit, errors or list(dict.fromkeys(messages.get(i, []))))
+        for i, (source, pit, errors) in enumerate(batch)
+    ]
+
+def iter_upload(f, name="upload"):
+    """(source, pit, errors) of every pit of an upload, validated by chunks as they are read."""
+    batch = []
+    for source, document, error in _members(f, name):
+        if error is not None:
+            batch.append((source, None, [error]))
+            continue
+        for pit in document if isinstance(document, list) else [document]:
+            if not isinstance(pit, dict) or not pit.get("id") or not pit.get("Date"):
+                batch.append((source, None, ["not a Glacio-Log snow pit (no id or date)"]))
+            else:
+                batch.append((source, pit, []))
+        if len(batch) >= VALIDATE_CHUNK:
+            yield from _validated(batch)
+            batch = []
+    yield from _validated(batch)
+
+# Parsed uploads, keyed on the sha256 of their content
+_upload_cache = OrderedDict()
+_upload_lock = threading.Lock()
+UPLOAD_CACHE_SIZE = 16
+
+def upload_digest(f):
+    f.seek(0)
+    data = f.getbuffer() if hasattr(f, "getbuffer") else f.read()
+    return hashlib.sha256(data).hexdigest()
+
+def read_upload(f, name=None, progress=None):
+    """(source, pit, errors) of every pit of an upload, parsed once per content.
+
+    `progress(n)` is called with the number of pits read so far. The
+    entries are shared between reruns and sessions: do not mutate them.
+    """
+    name = name or getattr(f, "name", "upload")
+    key = upload_digest(f)
+    with _upload_lock:
+        if key in _upload_cache:
+            _upload_cache.move_to_end(key)
+            return _upload_cache[key]
+
+    entries = []
+    for entry in iter_upload(f, name):
+        entries.append(entry)
+        if progress is not None:
+            progress(len(entries))
+    entries = tuple(entries)
+
+    with _upload_lock:
+        _upload_cache[key] = entries
+        while len(_upload_cache) > UPLOAD_CACHE_SIZE:
+            _upload_cache.popitem(last=False)
+    return entries
+
+# ============================================================
+# %% Export
+# ============================================================
+
+def export_name(pit):
+    return f"Snowpit_{pit['Date']}_{str(pit['id'])[:8]}"
+
+def build_export_zip(pits, plot_temp=False, plot_lwc=False, title="Snow pit profile", progress=None):
+    """Zip of the JSON file and the rendered PNG of every pit."""
+    from utilities.plotting import render_snowpit_image
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for i, pit in enumerate(pits):
+            name = export_name(pit)
+            archive.writestr(
+                f"{name}.json",
+                json.dumps(pit, indent=2, ensure_ascii=False),
+                compress_type=zipfile.ZIP_DEFLATED,
+            )
+            png = render_snowpit_image(
+                pit, plot_temp, plot_lwc,
+                title=title,
+                date=pit["Date"],
+                air_temperature=K_to_unit(pit.get("Air_T (K)", np.nan), "°C"),
+                fmt="png",
+                dpi=EXPORT_DPI,
+            )
+            # PNG is compressed already
+            archive.writestr(f"{name}.png", png, compress_type=zipfile.ZIP_STORED)
+            if progress is not None:
+                progress(i + 1)
+    return buf.getvalue()
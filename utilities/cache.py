@@ -0,0 +1,129 @@
+"""
+In-process caches shared by every Streamlit session of the server.
+
+Entries are keyed on the file path plus its mtime and size, so a file
+changed on disk is reloaded on the next access; the app's own writes
+invalidate their entries explicitly.
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+def file_signature(path: Path):
+    """(mtime_ns, size) of a file, (None, None) if it does not exist."""
+    try:
+        st = Path(path).stat()
+    except FileNotFoundError:
+        return None, None
+    return st.st_mtime_ns, st.st_size
+
+
+class FileCache:
+    """Thread-safe LRU cache of values parsed from files.
+
+    Cached values are shared between sessions and must not be mutated.
+    `on_evict(value)` is called on every value dropped from the cache
+    (replaced by a newer version, evicted or invalidated), e.g. to close it.
+    """
+
+    def __init__(self, maxsize=128, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._data = OrderedDict()  # (path, tag) -> (signature, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key, signature):
+        entry = self._data.get(key)
+        if entry is not None and entry[0] == signature:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+        return False, None
+
+    def load(self, path: Path, loader, stat_path: Path = None, tag=None):
+        """Return `loader(path)`, parsed at most once per version of the file.
+
+        `stat_path` is the file whose signature versions the entry when it is
+        not `path` itself (e.g. a database holding the day); `tag` tells apart
+        several values derived from the same path.
+        """
+        key = (str(path), tag)
+        signature = file_signature(stat_path or path)
+        with self._lock:
+            found, value = self._lookup(key, signature)
+            if found:
+                return value
+            self.misses += 1
+
+        value = loader(path)
+
+        with self._lock:
+            # Replaces the older version of the entry, if any
+            dropped = [self._data[key][1]] if key in self._data else []
+            self._data[key] = (signature, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                dropped.append(self._data.popitem(last=False)[1][1])
+        self._evicted(dropped)
+        return value
+
+    def get(self, path: Path, default=None, stat_path: Path = None, tag=None):
+        """Value cached for the current version of the file, `default` if none."""
+        with self._lock:
+            found, value = self._lookup((str(path), tag), file_signature(stat_path or path))
+        return value if found else default
+
+    def invalidate(self, path: Path = None):
+        """Drop every entry of `path`, or the whole cache."""
+        with self._lock:
+            keys = list(self._data) if path is None else [k for k in self._data if k[0] == str(path)]
+            dropped = [self._data.pop(key)[1] for key in keys]
+        self._evicted(dropped)
+
+    def _evicted(self, values):
+        if self.on_evict is not None:
+            for value in values:
+                self.on_evict(value)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class BytesCache:
+    """Thread-safe LRU of encoded blobs (rendered figures), bounded by their total size."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        """Return the blob stored under `key`, calling `render()` to produce it on a miss."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+
+        blob = render()
+
+        with self._lock:
+            if key not in self._data and len(blob) <= self.max_bytes:
+                self._data[key] = blob
+                self.size += len(blob)
+                while self.size > self.max_bytes:
+                    _, evicted = self._data.popitem(last=False)
+                    self.size -= len(evicted)
+        return blob
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
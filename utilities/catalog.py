@@ -0,0 +1,232 @@
+"""
+Cross-site, cross-season catalog of snow pits.
+
+One SQLite file at the root of the data tree (next to the site folders)
+holds a summary row per pit. It is refreshed day by day from every write
+made through utilities.storage, so pages can list and find pits without
+opening the day files.
+"""
+
+import sqlite3
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+
+from utilities.cache import FileCache
+from utilities.storage import add_write_listener, forget_day, list_days, load_snowpits, open_store, LOCK_TIMEOUT
+
+CATALOG_NAME = "glacio_catalog.sqlite"
+
+COLUMNS = ["id", "site", "season", "date", "SD (cm)", "Air_T (K)", "n_layers", "day_path", "position"]
+
+# Day listings shown in the sidebar, kept until the day changes
+_day_listing = FileCache(maxsize=256)
+
+# ============================================================
+# %% Catalog database
+# ============================================================
+
+def catalog_path(base_dir: Path):
+    return Path(base_dir) / CATALOG_NAME
+
+def _connect(base_dir: Path):
+    con = sqlite3.connect(catalog_path(base_dir), timeout=LOCK_TIMEOUT)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS pits (
+            id TEXT PRIMARY KEY,
+            site TEXT NOT NULL,
+            season TEXT NOT NULL,
+            date TEXT NOT NULL,
+            sd REAL,
+            air_t REAL,
+            n_layers INTEGER NOT NULL,
+            day_path TEXT NOT NULL,
+            position INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS pits_site_date ON pits(site, date);
+        CREATE INDEX IF NOT EXISTS pits_date ON pits(date);
+        CREATE INDEX IF NOT EXISTS pits_day ON pits(day_path);
+        CREATE TABLE IF NOT EXISTS days (
+            day_path TEXT PRIMARY KEY,
+            mtime_ns INTEGER,
+            size INTEGER
+        );
+        """
+    )
+    return con
+
+def _split_day_path(path: Path):
+    """`{base}/{site}/{season}/clean_data/snowpits_{date}.json` -> (base, site, season, date).
+
+    None for a day file outside such a tree.
+    """
+    path = Path(path)
+    if (
+        len(path.parents) < 4
+        or path.parent.name != "clean_data"
+        or path.suffix != ".json"
+        or not path.stem.startswith("snowpits_")
+    ):
+        return None
+    day = path.stem[len("snowpits_"):]
+    try:
+        date.fromisoformat(day)
+    except ValueError:
+        return None
+    base_dir, site, season = path.parents[3], path.parents[2].name, path.parents[1].name
+    return base_dir, site, season, day
+
+def _relative(base_dir: Path, path: Path):
+    return Path(path).relative_to(base_dir).as_posix()
+
+def _backing_stat(path: Path):
+    backing = open_store(path).backing_path
+    if not backing.exists():
+        return None, None
+    st = backing.stat()
+    return st.st_mtime_ns, st.st_size
+
+def _index_day(con, base_dir, path, snowpits):
+    _, site, season, day = _split_day_path(path)
+    day_path = _relative(base_dir, path)
+    con.execute("DELETE FROM pits WHERE day_path=?", (day_path,))
+    con.executemany(
+        "INSERT OR REPLACE INTO pits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                sp["id"], site, season, day,
+                sp.get("SD (cm)"), sp.get("Air_T (K)"), len(sp.get("layers", [])),
+                day_path, position,
+            )
+            for position, sp in enumerate(snowpits)
+        ]
+    )
+    mtime_ns, size = _backing_stat(path)
+    con.execute("INSERT OR REPLACE INTO days VALUES (?, ?, ?)", (day_path, mtime_ns, size))
+
+def record_day(path: Path, snowpits: list):
+    """Replace the catalog rows of one day, called after every committed write.
+
+    Only the catalog of a tree already using one is kept up to date: a write
+    never creates a catalog (ensure_catalog does, on first use of the tree).
+    """
+    parts = _split_day_path(path)
+    if parts is None or not catalog_path(parts[0]).exists():
+        return
+    base_dir = parts[0]
+    with closing(_connect(base_dir)) as con, con:
+        _index_day(con, base_dir, path, snowpits)
+    _day_listing.invalidate(path)
+
+add_write_listener(record_day)
+
+def refresh_day(path: Path, force=False):
+    """Re-index one day if its file changed outside the app (e.g. synced from another laptop).
+
+    `force` re-indexes even when the file looks unchanged, for a listing
+    found stale anyway (a sync keeping the modification time).
+    """
+    parts = _split_day_path(path)
+    if parts is None:
+        return
+    base_dir = parts[0]
+    day_path = _relative(base_dir, path)
+    with closing(_connect(base_dir)) as con, con:
+        recorded = con.execute(
+            "SELECT mtime_ns, size FROM days WHERE day_path=?", (day_path,)
+        ).fetchone()
+        if recorded == _backing_stat(path) and not force:
+            return
+        if force:
+            forget_day(path)
+        _index_day(con, base_dir, path, load_snowpits(path))
+    if force:
+        _day_listing.invalidate(path)
+
+def rebuild_catalog(base_dir: Path, data_template="{site}/{season}/clean_data"):
+    """Walk the whole site/season tree once and index every day."""
+    base_dir = Path(base_dir)
+    pattern = data_template.format(site="*", season="*").rstrip("/")
+    with closing(_connect(base_dir)) as con, con:
+        con.execute("DELETE FROM pits")
+        con.execute("DELETE FROM days")
+        n = 0
+        for data_dir in sorted(base_dir.glob(pattern)):
+            for path in list_days(data_dir):
+                snowpits = load_snowpits(path)
+                _index_day(con, base_dir, path, snowpits)
+                n += len(snowpits)
+    return n
+
+def ensure_catalog(base_dir: Path):
+    """Build the catalog on first use of an existing data tree."""
+    if not catalog_path(base_dir).exists():
+        rebuild_catalog(base_dir)
+
+# ============================================================
+# %% Lookups
+# ============================================================
+
+def _row_to_dict(row):
+    return dict(zip(COLUMNS, row))
+
+def find_pit(base_dir: Path, snowpit_id):
+    """Catalog row of a pit from its ID, or None."""
+    with closing(_connect(base_dir)) as con:
+        row = con.execute(
+            "SELECT id, site, season, date, sd, air_t, n_layers, day_path, position "
+            "FROM pits WHERE id=?", (snowpit_id,)
+        ).fetchone()
+    return _row_to_dict(row) if row else None
+
+def list_pits(
+    base_dir: Path,
+    site=None,
+    season=None,
+    start=None,
+    end=None,
+    min_sd=None,
+    max_sd=None,
+    min_air_t=None,
+    max_air_t=None,
+    min_layers=None,
+):
+    """Catalog rows matching every given filter, in date then file order.
+
+    `start` and `end` are inclusive dates (date objects or ISO strings);
+    temperatures are in K as stored.
+    """
+    filters = {
+        "site = ?": site,
+        "season = ?": season,
+        "date >= ?": str(start) if start is not None else None,
+        "date <= ?": str(end) if end is not None else None,
+        "sd >= ?": min_sd,
+        "sd <= ?": max_sd,
+        "air_t >= ?": min_air_t,
+        "air_t <= ?": max_air_t,
+        "n_layers >= ?": min_layers,
+    }
+    clauses = [clause for clause, value in filters.items() if value is not None]
+    values = [value for value in filters.values() if value is not None]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with closing(_connect(base_dir)) as con:
+        rows = con.execute(
+            "SELECT id, site, season, date, sd, air_t, n_layers, day_path, position "
+            f"FROM pits {where} ORDER BY date, site, position",
+            values
+        ).fetchall()
+    return [_row_to_dict(row) for row in rows]
+
+def list_day_pits(base_dir: Path, site, day: date, season):
+    """Pits of one site and date, re-indexing the day first if its file changed."""
+    path = Path(base_dir) / site / season / "clean_data" / f"snowpits_{day}.json"
+
+    def load(_):
+        refresh_day(path)
+        return list_pits(base_dir, site=site, season=season, start=day, end=day)
+
+    return _day_listing.load(path, load, stat_path=open_store(path).backing_path)
@@ -0,0 +1,279 @@
+"""
+Glacio-Log command line, for scripted processing of a data tree.
+
+    python -m utilities.cli tree ../ --sites Summit Ridge --seasons 2025-2026
+    python -m utilities.cli import ~/sync/field ../ --site Summit --validate
+    python -m utilities.cli validate ../ --report report.csv
+    python -m utilities.cli export ../ --table layers --out layers.csv
+    python -m utilities.cli render ../ Summit 2025-2026 --temperature --format pdf
+    python -m utilities.cli atlas ../ atlas.pdf --sites Summit --seasons 2025-2026
+    python -m utilities.cli compact ../ --seasons 2025-2026
+    python -m utilities.cli compress ../ Summit gzip
+    python -m utilities.cli seal ../ Summit 2024-2025
+
+Every folder is read and written with the storage its pits are kept in,
+--storage only picks the one of the folders holding none yet; heavy modules
+are imported by the command that needs them only.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+from utilities import batch_validate
+from utilities.constants import COMPRESSION_FORMATS, STORAGE_FORMATS
+
+STORAGE_HELP = "Storage of the folders holding no snow pits yet (default: json)"
+
+# ============================================================
+# %% Progress
+# ============================================================
+
+def progress_printer(unit):
+    """`progress(done, total)` callback drawing one updating line on stderr."""
+    start = time.perf_counter()
+
+    def progress(done, total):
+        rate = done / max(time.perf_counter() - start, 1e-9)
+        print(
+            f"\r{done}/{total} {unit} ({rate:.0f}/s)",
+            end="" if done < total else "\n",
+            file=sys.stderr,
+            flush=True,
+        )
+    return progress
+
+# ============================================================
+# %% Commands
+# ============================================================
+
+def _api(args):
+    from utilities import api
+
+    if args.storage:
+        api.set_storage_backend(args.storage)
+    return api
+
+def cmd_tree(args):
+    from utilities.tree import create_file_tree, DATA_TEMPLATE, PLOT_TEMPLATE
+
+    create_file_tree(args.base_dir, args.sites, args.seasons, DATA_TEMPLATE, PLOT_TEMPLATE)
+    return 0
+
+def cmd_import(args):
+    api = _api(args)
+    n, skipped = api.import_directory(
+        args.src_dir,
+        args.base_dir,
+        site=args.site,
+        validate=args.validate,
+        workers=args.workers,
+        progress=progress_printer("files"),
+    )
+    for where, snowpit_id, reason in skipped:
+        print(f"skipped {where} {snowpit_id or ''}: {reason}", file=sys.stderr)
+    print(f"{n} snow pits imported, {len(skipped)} skipped", file=sys.stderr)
+    return 1 if skipped else 0
+
+def cmd_export(args):
+    api = _api(args)
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        n = api.export_table(
+            args.base_dir,
+            out,
+            table=args.table,
+            sites=args.sites,
+            seasons=args.seasons,
+            workers=args.workers,
+            progress=progress_printer("days"),
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{n} rows exported", file=sys.stderr)
+    return 0
+
+def cmd_render(args):
+    api = _api(args)
+    written = api.render_season(
+        args.base_dir,
+        args.site,
+        args.season,
+        out_dir=args.out,
+        fmt=args.format,
+        dpi=args.dpi,
+        plot_temp=args.temperature,
+        plot_lwc=args.lwc,
+        title=args.title,
+        overview=not args.no_overview,
+        workers=args.workers,
+        progress=progress_printer("days"),
+    )
+    print(f"{len(written)} figures written", file=sys.stderr)
+    return 0
+
+def cmd_atlas(args):
+    api = _api(args)
+    written = api.export_atlas(
+        args.base_dir,
+        args.out,
+        sites=args.sites,
+        seasons=args.seasons,
+        start=args.start,
+        end=args.end,
+        fmt=args.format,
+        vector=args.vector,
+        dpi=args.dpi,
+        plot_temp=args.temperature,
+        plot_lwc=args.lwc,
+        title=args.title,
+        workers=args.workers,
+        progress=progress_printer("pits"),
+    )
+    print(f"{len(written)} files written", file=sys.stderr)
+    return 0
+
+def cmd_compact(args):
+    from utilities.storage import compact_days
+    from utilities.tree import find_data_dirs
+
+    n = sum(compact_days(data_dir) for *_, data_dir in find_data_dirs(args.base_dir, args.sites, args.seasons))
+    print(f"{n} day logs compacted", file=sys.stderr)
+    return 0
+
+def cmd_compress(args):
+    from utilities.storage import JSONStore, day_file, recompress_site, set_site_compression
+
+    site_dir = args.base_dir / args.site
+
+    def size():
+        return sum(
+            day_file(path).stat().st_size
+            for data_dir in site_dir.glob("*/clean_data") for path in JSONStore.list_days(data_dir)
+        )
+
+    before = size()
+    set_site_compression(site_dir, args.compression)
+    n = recompress_site(site_dir)
+    print(f"{n} day files rewritten, {before} -> {size()} bytes", file=sys.stderr)
+    return 0
+
+def cmd_seal(args):
+    from utilities.storage import MixedStorageError, seal_season, unseal_season
+    from utilities.tree import DATA_TEMPLATE, current_season
+
+    data_dir = args.base_dir / DATA_TEMPLATE.format(site=args.site, season=args.season)
+    if args.unseal:
+        print(f"{unseal_season(data_dir, args.storage)} days unsealed", file=sys.stderr)
+        return 0
+    if args.season == current_season(date.today()) and not args.force:
+        print(f"{args.season} is the current season, use --force to seal it anyway", file=sys.stderr)
+        return 1
+    try:
+        n = seal_season(data_dir)
+    except MixedStorageError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{n} days sealed into {data_dir}", file=sys.stderr)
+    return 0
+
+# ============================================================
+# %% Parser
+# ============================================================
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m utilities.cli", description="Glacio-Log without Streamlit.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def command(name, func, help):
+        sub = commands.add_parser(name, help=help, description=help)
+        sub.set_defaults(func=func)
+        return sub
+
+    def common(sub):
+        sub.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+        sub.add_argument("--storage", choices=STORAGE_FORMATS, help=STORAGE_HELP)
+
+    sub = command("tree", cmd_tree, "Create the {site}/{season} folders")
+    sub.add_argument("base_dir", type=Path)
+    sub.add_argument("--sites", nargs="+", required=True)
+    sub.add_argument("--seasons", nargs="+", required=True)
+
+    sub = command("import", cmd_import, "Upsert the pits of every JSON file under a folder")
+    sub.add_argument("src_dir", type=Path, help="Synced folder: a Glacio-Log tree or loose JSON files")
+    sub.add_argument("base_dir", type=Path)
+    sub.add_argument("--site", help="Site of the files not laid out as a Glacio-Log tree")
+    sub.add_argument("--validate", action="store_true", help="Skip invalid pits")
+    common(sub)
+
+    sub = command("validate", batch_validate.run, "Validate every pit, report errors as CSV")
+    batch_validate.add_arguments(sub)
+
+    sub = command("export", cmd_export, "Export a flat CSV table")
+    sub.add_argument("base_dir", type=Path)
+    sub.add_argument("--table", choices=["pits", "layers", "temperature", "lwc"], default="pits")
+    sub.add_argument("--out", type=Path, help="CSV file (default: standard output)")
+    sub.add_argument("--sites", nargs="*")
+    sub.add_argument("--seasons", nargs="*")
+    common(sub)
+
+    sub = command("render", cmd_render, "Render every pit of a season and its overview")
+    sub.add_argument("base_dir", type=Path)
+    sub.add_argument("site")
+    sub.add_argument("season")
+    sub.add_argument("--out", type=Path, help="Output folder (default: the plot folder of the season)")
+    sub.add_argument("--format", choices=["png", "pdf", "svg"], default="png")
+    sub.add_argument("--dpi", type=int, default=300)
+    sub.add_argument("--title", default="Snow pit profile")
+    sub.add_argument("--temperature", action="store_true", help="Plot the temperature profile")
+    sub.add_argument("--lwc", action="store_true", help="Plot the LWC profile")
+    sub.add_argument("--no-overview", action="store_true", help="Skip the seasonal overview")
+    common(sub)
+
+    sub = command("atlas", cmd_atlas, "Every pit of some sites and seasons in one PDF, in date order")
+    sub.add_argument("base_dir", type=Path)
+    sub.add_argument("out", type=Path, help="PDF file, or the folder of the SVG pages")
+    sub.add_argument("--sites", nargs="*")
+    sub.add_argument("--seasons", nargs="*")
+    sub.add_argument("--start", type=date.fromisoformat, help="First date (YYYY-MM-DD)")
+    sub.add_argument("--end", type=date.fromisoformat, help="Last date (YYYY-MM-DD)")
+    sub.add_argument("--format", choices=["pdf", "svg"], default="pdf")
+    sub.add_argument("--vector", action="store_true", help="Vector PDF pages, drawn in this process")
+    sub.add_argument("--dpi", type=int, default=200, help="Resolution of the raster pages")
+    sub.add_argument("--title", default="Snow pit profile")
+    sub.add_argument("--temperature", action="store_true", help="Plot the temperature profile")
+    sub.add_argument("--lwc", action="store_true", help="Plot the LWC profile")
+    common(sub)
+
+    sub = command("compress", cmd_compress, "Set the day file compression of a site and apply it")
+    sub.add_argument("base_dir", type=Path)
+    sub.add_argument("site")
+    sub.add_argument("compression", choices=COMPRESSION_FORMATS)
+
+    sub = command("seal", cmd_seal, "Pack a closed season into a read-only archive")
+    sub.add_argument("base_dir", type=Path)
+    sub.add_argument("site")
+    sub.add_argument("season")
+    sub.add_argument("--unseal", action="store_true", help="Write the days back to the storage instead")
+    sub.add_argument("--force", action="store_true", help="Seal the current season too")
+    sub.add_argument(
+        "--storage", choices=STORAGE_FORMATS, help="Storage to unseal into (default: the one it was sealed from)"
+    )
+
+    sub = command("compact", cmd_compact, "Compact the day logs of the jsonl storage")
+    sub.add_argument("base_dir", type=Path)
+    sub.add_argument("--sites", nargs="*")
+    sub.add_argument("--seasons", nargs="*")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,9 +7,9 @@ Created on Fri Jan 30 22:24:00 2026
 """
 
 OPTIONS = ["---","Create", "Edit", 
-           "Remove", "Single Plot"]#,"Seasonal plot"]
+           "Remove", "Single Plot", "Seasonal plot"]
 
-OPTIONS_LITE = ["---","Create", "Edit", "Single Plot"]#,"Seasonal plot"]
+OPTIONS_LITE = ["---","Create", "Edit", "Single Plot", "Bulk import/export"]
 
 IACS_GRAINS = ["PP", "DF", "RG", "RGwp", "FC", "DH", "SH", "MF", "IF", "Not measured"]
 
@@ -17,6 +17,12 @@ SNOW_HARDNESS = ["F", "4F", "1F", "P", "K", "I"]
 
 TEMP_UNITS = ["K", "°C", "°F"]
 
+STORAGE_FORMATS = ["json", "sqlite", "jsonl"]
+
+COMPRESSION_FORMATS = ["none", "compact", "gzip", "lzma"]
+
+FIGURE_FORMATS = ["png", "svg", "pdf"]
+
 HARDNESS_MAP = {
     "F": 1,
     "4F": 2,
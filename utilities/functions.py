@@ -5,25 +5,50 @@ Created on Fri Jan 30 21:47:08 2026
 
 @author: paultudes
 """
+import copy
 import json
+import threading
 import streamlit as st
 from datetime import date
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
-from itertools import product
-
-from utilities.constants import OPTIONS, IACS_GRAINS, SNOW_HARDNESS, HARDNESS_MAP, GRAIN_COLORS, IACS_SYMBOLS
-
-plt.rcParams.update({
-    "font.size": 11,
-    "axes.titlesize": 14,
-    "axes.labelsize": 12,
-    "xtick.labelsize": 10,
-    "ytick.labelsize": 10,
-    "legend.fontsize": 10,
-})
+
+from utilities.constants import OPTIONS, IACS_GRAINS, SNOW_HARDNESS
+from utilities.cache import FileCache
+from utilities.storage import (
+    atomic_write_json,
+    set_storage_backend,
+    snowpits_exist,
+    load_snowpits,
+    get_snowpit,
+    save_or_update_snowpit,
+    update_snowpit_fields,
+    remove_snowpit,
+    export_snowpits_json,
+    import_snowpits_json,
+    load_json,
+    site_compression,
+    set_site_compression,
+    recompress_site,
+    SealedSeasonError,
+    MixedStorageError,
+    open_archive,
+    seal_season,
+    unseal_season,
+)
+from utilities.units import K_to_unit, unit_to_K, K_to_unit_array, unit_to_K_array
+from utilities.validation import validate_snowpit, validate_snowpit_table, validate_snowpits
+from utilities.catalog import ensure_catalog, rebuild_catalog, refresh_day, find_pit, list_pits, list_day_pits
+from utilities.seasonal import season_grid
+import utilities.packs  # keeps the existing season packs in step with every write
+from utilities.profiles import profile_depths, resample_profile
+from utilities.tree import current_season, create_file_tree, day_path, plot_dir
+from utilities.jobs import JOB_POLL_INTERVAL, content_key, submit, write_file
+
+# matplotlib is only imported by utilities.plotting, on the plot pages or
+# in the background by start_warm_up()
+
 # ============================================================
 # %% Functions style
 # ============================================================
@@ -87,6 +112,7 @@ def init_session_state():
         "reset_counter_lwc_profile_edit": 0,
         "temp_locked_edit": False,
         "save_strati": False,
+        "jobs": {},
         "config_validated": False,
         "config_saved": False,
         "modify_config": False,
@@ -122,23 +148,6 @@ def init_session_state():
         if key not in st.session_state:
             st.session_state[key] = value
 
-def init_profile_session_state():
-    defaults = {
-        "temp_df": generate_profile_df(
-                        st.session_state.SD, 
-                        st.session_state.temp_custom_step, 
-                        f"temperature ({st.session_state.temp_unit})"
-                 ),
-        "lwc_df": generate_profile_df(
-                        st.session_state.SD, 
-                        st.session_state.lwc_custom_step, 
-                        "LWC (%)"
-                 )
-    }
-    for key, value in defaults.items():
-        if key not in st.session_state:
-            st.session_state[key] = value
-    
 def init_site_season_state(user_config: dict):
 
     if "site" not in st.session_state:
@@ -150,54 +159,178 @@ def init_site_season_state(user_config: dict):
     if "site_plot" not in st.session_state:
         st.session_state.site_plot = user_config["sites"][0]
 
+    if "site_seasonal" not in st.session_state:
+        st.session_state.site_seasonal = user_config["sites"][0]
+
     if "season" not in st.session_state:
         st.session_state.season = user_config["seasons"][0]
+
+def sync_page(key, value):
+    """Rerun the whole app when a fragment changes `value`.
+
+    `value` is something the rest of the page depends on (snow depth,
+    pending changes, validity). Other edits only rerun the fragment; a
+    change of `value` costs one full rerun, after which it matches again.
+    """
+    previous = st.session_state.get(key, value)
+    st.session_state[key] = value
+    if previous != value:
+        st.rerun()
+
+def start_job(name, key, fn, *args, **kwargs):
+    """Run `fn` in the background as the session's job `name` (see utilities.jobs.submit).
+
+    The job already started under `name` is kept when it has the same `key`,
+    running or done, so reruns do not repeat it; a failed one is retried.
+    """
+    job = st.session_state.jobs.get(name)
+    if job is None or job.key != key or job.error is not None:
+        job = st.session_state.jobs[name] = submit(key, fn, *args, **kwargs)
+    return job
+
+def show_job(name):
+    """Progress of the session's job `name` while it runs, its error if it failed.
+
+    A fragment polls the job every JOB_POLL_INTERVAL s and reruns the whole
+    page once it ends, so the page can use the result. Returns the job, None
+    if none was started.
+    """
+    job = st.session_state.jobs.get(name)
+    if job is None:
+        return None
+    polling = not job.finished
+
+    @st.fragment(run_every=JOB_POLL_INTERVAL if polling else None)
+    def job_status():
+        if not job.finished:
+            text = f"{job.label} {job.done}/{job.total}" if job.total > 1 else job.label
+            st.progress(job.done / job.total, text=text)
+        elif polling:
+            st.rerun()
+
+    job_status()
+    if job.error is not None:
+        st.error(str(job.error))
+    return job
+
+def job_succeeded(job):
+    return job is not None and job.finished and job.error is None
+
+def section_values(scope):
+    """Latest value of each section of a page, shared between its fragments."""
+    if scope not in st.session_state:
+        st.session_state[scope] = {}
+    return st.session_state[scope]
 # ============================================================
 # %% Current functions 
 # ============================================================             
 
-def current_season(d):
-    y = d.year
-    return f"{y}-{y+1}" if d.month >= 10 else f"{y-1}-{y}"
-
-def generate_profile_df(SD, step, name_col):
-    if SD == None or SD == 0 or step == None or step == np.nan:
-        return pd.DataFrame(
-            columns=["z (cm)", name_col]
-            )
-    else:
-        z_values = np.arange(0, SD, step)
-        return pd.DataFrame({
-            "z (cm)": z_values,
-            name_col: np.nan
-            })
-
-def regenerate_profile(step, name_col):
-    SD = st.session_state.SD
-    if name_col == f"temperature ({st.session_state.temp_unit})":
-        st.session_state.temp_df = generate_profile_df(SD, step, name_col)
-    if name_col == "LWC (%)":
-        st.session_state.lwc_df = generate_profile_df(SD, step, name_col)
-    
-def K_to_unit(v, unit):
-    if pd.isna(v):
-        return v
-    if unit == "K" or unit is None or unit == 'None':
-        return v
-    if unit == "°C":
-        return v - 273.15
-    if unit == "°F":
-        return (v - 273.15) * 9/5 + 32
-
-def unit_to_K(v, unit):
-    if pd.isna(v):
-        return v
-    if unit == "K" or unit is None or unit == 'None':
-        return v
-    if unit == "°C":
-        return v + 273.15
-    if unit == "°F":
-        return (v - 32) * 5/9 + 273.15
+_config_cache = FileCache(maxsize=4)
+
+def load_user_config(config_path):
+    # Deep copy: the app edits the site and season lists in place
+    return copy.deepcopy(_config_cache.load(config_path, lambda p: json.loads(Path(p).read_text())))
+
+def save_user_config(config_path, user_config):
+    atomic_write_json(Path(config_path), user_config, indent=4)
+    _config_cache.invalidate(config_path)
+
+def _unit_of(name_col):
+    return name_col[len("temperature ("):-1] if name_col.startswith("temperature (") else None
+
+def profile_table(kind, step, name_col):
+    """Table and editor key of the "temp" or "lwc" profile of a Create page.
+
+    The table is only rebuilt when the snow depth, the step or the unit
+    changed, carrying the values entered so far onto the new grid; the
+    editor then gets a new key so it starts from that table.
+    """
+    state = st.session_state
+    grid = (state.SD, step, name_col)
+    if state.get(f"{kind}_grid") != grid:
+        previous = state.get(f"{kind}_edited")
+        convert = None
+        if previous is not None and kind == "temp":
+            old_unit, new_unit = _unit_of(previous.columns[-1]), _unit_of(name_col)
+            if old_unit != new_unit:
+                convert = lambda v: K_to_unit_array(unit_to_K_array(v, old_unit), new_unit)
+        state[f"{kind}_df"] = resample_profile(previous, profile_depths(state.SD, step), name_col, convert)
+        state[f"{kind}_grid"] = grid
+        state[f"{kind}_version"] = state.get(f"{kind}_version", 0) + 1
+    return state[f"{kind}_df"], f"{kind}_editor_{state[f'{kind}_version']}"
+
+def profile_editor(kind, step, name_col, disabled=False):
+    """Data editor of a profile table (see profile_table), returns the edited table."""
+    table, key = profile_table(kind, step, name_col)
+    edited = st.data_editor(table, key=key, num_rows="dynamic", disabled=disabled)
+    st.session_state[f"{kind}_edited"] = edited
+    return edited
+
+def reset_profile(kind):
+    """Empty a profile table: the next profile_table call rebuilds a blank grid."""
+    st.session_state.pop(f"{kind}_edited", None)
+    st.session_state.pop(f"{kind}_grid", None)
+
+def _same_value(a, b):
+    if a is None or (isinstance(a, float) and np.isnan(a)):
+        return b is None or (isinstance(b, float) and np.isnan(b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return bool(np.isclose(a, b, rtol=1e-9, atol=1e-9))
+    return a == b
+
+def editor_changed(key, records, stored_value=None):
+    """Whether the data editor `key`, started from the pit `records`, holds changes.
+
+    Only the edits kept by the editor are looked at (edited cells against
+    the stored ones, filled new rows, deleted rows), so the cost follows the
+    number of edits rather than the size of the table. `stored_value(record,
+    column)` gives the displayed value of a stored cell, when it differs.
+    """
+    state = st.session_state.get(key)
+    if not state:
+        return False
+    if state.get("deleted_rows"):
+        return True
+    if any(not _same_value(value, None) for row in state.get("added_rows", []) for value in row.values()):
+        return True
+    for row, cells in state.get("edited_rows", {}).items():
+        row = int(row)
+        record = records[row] if row < len(records) else {}
+        for column, value in cells.items():
+            old = stored_value(record, column) if stored_value is not None else record.get(column)
+            if not _same_value(value, old):
+                return True
+    return False
+
+def stored_temperature(record, column):
+    """Stored cell of the Edit page's temperature editor, in the displayed unit."""
+    if column.startswith("temperature ("):
+        return K_to_unit(record.get("temperature (K)"), st.session_state.get("temp_unit_edit"))
+    return record.get(column)
+
+# Stored fields written by each section of the Edit page
+EDIT_SECTIONS = {
+    "general_data_edit": ("SD (cm)", "Air_T (K)"),
+    "layers_data_edit": ("layers",),
+    "temperature_data_edit": ("temperature_profile (K)",),
+    "lwc_data_edit": ("lwc_profile (%)",),
+}
+
+def edit_has_changes():
+    return any(st.session_state.get(f"{section}_changed", False) for section in EDIT_SECTIONS)
+
+def changed_fields(snowpit):
+    """Fields of `snowpit` belonging to the sections of the Edit page with pending changes."""
+    return {
+        field: snowpit[field]
+        for section, fields in EDIT_SECTIONS.items()
+        if st.session_state.get(f"{section}_changed", False)
+        for field in fields
+    }
+
+def save_edited_snowpit(path, snowpit, fields):
+    """Write the edited `fields` of a stored pit, the whole `snowpit` if it is no longer stored."""
+    return update_snowpit_fields(path, snowpit["id"], fields) or save_or_update_snowpit(path, snowpit)
 
 def is_temperature_locked(df):
     
@@ -206,104 +339,6 @@ def is_temperature_locked(df):
             return True   # at least one value was find
     return False
 
-def save_or_update_snowpit(save_path: Path, new_snowpit: dict):
-    if save_path.exists():
-        with open(save_path) as f:
-            database = json.load(f)
-    else:
-        database = []
-        save_path.parent.mkdir(parents=True, exist_ok=True)
-
-    snowpit_id = new_snowpit["id"]
-
-    # Search for an existing snowpit with the same ID
-    existing_index = next(
-        (i for i, sp in enumerate(database) if sp.get("id") == snowpit_id),
-        None
-    )
-
-    if existing_index is not None:
-        # Replace
-        database[existing_index] = new_snowpit
-        action = "updated"
-    else:
-        # Add
-        database.append(new_snowpit)
-        action = "created"
-
-    with open(save_path, "w") as f:
-        json.dump(database, f, indent=2)
-
-    return action
-
-def validate_snowpit(SD, layers_df, temp_df, lwc_df):
-
-    errors = []
-    total_thickness = 0.0
-    TOL = 0.0  # tolerance for total thickness check
-
-    # --- 1. Validate layers row by row ---
-    valid_layers = []
-    for i, row in layers_df.iterrows():
-        # Convert numeric values
-        try:
-            top = float(row["top (cm)"])
-            bottom = float(row["bottom (cm)"])
-        except (ValueError, TypeError):
-            errors.append(f"Layer {i}: invalid numeric values")
-            continue
-
-        thickness = top - bottom
-        grain = row.get("grain (IACS)")
-        hardness = row.get("snow hardness")
-
-        # Basic checks
-        if top <= bottom:
-            errors.append(f"Layer {i}: top ({top}) <= bottom ({bottom})")
-        if top > SD:
-            errors.append(f"Layer {i}: top ({top}) > SD ({SD})")
-        if bottom < 0:
-            errors.append(f"Layer {i}: bottom ({bottom}) < 0")
-        if grain not in IACS_GRAINS:
-            errors.append(f"Layer {i}: invalid grain ({grain})")
-        if hardness not in SNOW_HARDNESS:
-            errors.append(f"Layer {i}: invalid snow hardness ({hardness})")
-
-        total_thickness += thickness
-        valid_layers.append((bottom, top))
-
-    # --- 2. Check total thickness against SD ---
-    if layers_df.dropna().shape[0] > 0 and abs(total_thickness - SD) > TOL:
-        errors.append(f"Layer thickness sum ({total_thickness:.1f} cm) ≠ SD ({SD} cm)")
-
-    # --- 3. Check for overlaps ---
-    valid_layers.sort()  # sort by bottom
-    for i in range(1, len(valid_layers)):
-        prev_top = valid_layers[i-1][1]
-        curr_bottom = valid_layers[i][0]
-        if curr_bottom < prev_top:
-            errors.append(f"Layer {i}: overlap detected with previous layer")
-
-    # --- 4. Validate profile DataFrames (Temperature and LWC) ---
-    for name, df in {"Temperature": temp_df, "LWC": lwc_df}.items():
-        if df.empty:
-            continue
-
-        # Ensure numeric z
-        df["z (cm)"] = pd.to_numeric(df["z (cm)"], errors="coerce")
-
-        # Check bounds
-        if df["z (cm)"].min() < 0:
-            errors.append(f"{name}: z < 0")
-        if df["z (cm)"].max() > SD:
-            errors.append(f"{name}: z > SD")
-
-        # Check duplicates
-        if df["z (cm)"].duplicated().any():
-            errors.append(f"{name}: duplicated depths")
-
-    return errors
-
 def to_df(obj):
     if isinstance(obj, pd.DataFrame):
         return obj
@@ -315,212 +350,36 @@ def normalize_numeric_df(df):
         df[col] = pd.to_numeric(df[col], errors="coerce")
     return df
 
+def assemble_snowpit(snowpit_id, day, SD, AT, df_layers, df_temp_K, df_lwc, check_temperature=True):
+    """Stored form of a snow pit filled in the app (air temperature in °C) and its errors."""
+    errors = validate_snowpit(SD, to_df(df_layers), to_df(df_temp_K), to_df(df_lwc))
+    if check_temperature and not errors and to_df(df_temp_K)["temperature (K)"].min() < 0:
+        errors.append('One or more values in temperature profile < 0 K')
+    snowpit = {
+        "id": snowpit_id,
+        "Date": str(day),
+        "SD (cm)": SD,
+        "Air_T (K)": unit_to_K(AT, "°C"),
+        "layers": to_df(df_layers).dropna().to_dict("records"),
+        "temperature_profile (K)": to_df(df_temp_K).dropna().to_dict("records"),
+        "lwc_profile (%)": to_df(df_lwc).dropna().to_dict("records")
+    }
+    return snowpit, errors
+
 def parse_list(text):
     return [x.strip() for x in text.split(",") if x.strip()]
 
-def create_file_tree(
-    base_dir: Path,
-    sites: list[str],
-    seasons: list[str],
-    data_template: str,
-    plot_template: str,
-):
-    for site, season in product(sites, seasons):
-        data_path = base_dir / data_template.format(
-            site=site,
-            season=season
-        )
-        plot_path = base_dir / plot_template.format(
-            site=site,
-            season=season
-        )
-
-        data_path.mkdir(parents=True, exist_ok=True)
-        plot_path.mkdir(parents=True, exist_ok=True)
-
-# ============================================================
-# %% Plot functions 
-# ============================================================     
-def plot_snowpit_grid_mapped(
-    pit,
-    plot_temp,
-    plot_lwc,
-    hardness_categories=HARDNESS_MAP,
-    grain_colors=GRAIN_COLORS,
-    title="Snow pit profile",
-    location=None,
-    weather=None,
-    date=None,
-    air_temperature=None,
-):
-    layers = pit["layers"]
-    temp_profile = pit["temperature_profile (K)"]
-
-    SD = int(pit["SD (cm)"])
-    grid_cols = SD
-
-    hardness_categories = list(hardness_categories)
-    n_hardness = len(hardness_categories)
-    
-    step = grid_cols // n_hardness
-    hardness_positions = [(i + 1) * step for i in range(n_hardness)]
-    
-    hardness_lookup = dict(zip(hardness_categories, hardness_positions))
-    
-    fig_height = max(6, SD / 6)
-    fig = plt.figure(figsize=(8, fig_height), dpi=300)
-    ax = fig.add_subplot(111)
-
-    for layer in layers:
-        bottom = float(layer["bottom (cm)"])
-        top = float(layer["top (cm)"])
-        height = top - bottom
-
-        h_label = layer["snow hardness"]
-        hardness_value = hardness_lookup[h_label]
-
-        grain = layer["grain (IACS)"]
-        grain_symbol = IACS_SYMBOLS.get(grain, "")
-        density = layer["density (g cm\u207b\u00b3)"]
-
-        ax.barh(
-            y=bottom,
-            width=hardness_value,
-            height=height,
-            left=0,
-            align="edge",
-            color=grain_colors.get(grain, "grey"),
-            edgecolor="black",
-            linewidth=0.6,
-        )
-
-        y_center = bottom + height / 2
-        label_text = f"Grain: {grain} - [{grain_symbol}]\nDensity: {density} g cm⁻³"
-        
-        if height < 5:
-            y_center = bottom + height / 2
-            
-            # Vertical offset of the annotation
-            if bottom == 0:
-                y_arrow = bottom + height / 3
-                y_text = top + 1.0
-                va = "bottom"
-            else:
-                y_arrow = bottom + 2 * height / 3
-                y_text = bottom - 1.0
-                va = "top"
-            
-            ax.annotate(
-                label_text,
-                xy=(hardness_value, y_arrow),
-                xytext=(hardness_value + step * 0.1, y_text),
-                ha="left",
-                va=va,
-                fontsize=8,
-                arrowprops=dict(
-                    arrowstyle="-",
-                    linewidth=0.8,
-                ),
-                bbox=dict(
-                    boxstyle="round,pad=0.2",
-                    fc="white",
-                    ec="black",
-                    linewidth=0.5,
-                ),
-            )
-        else:
-            ax.text(
-                hardness_value / 2,
-                y_center,
-                label_text,
-                ha="center",
-                va="center",
-                fontsize=8,
-                clip_on=True,
-            )
-    
-    ax.set_ylim(0, SD)
-    ax.yaxis.tick_right()
-    ax.yaxis.set_label_position("right")
-    ax.set_ylabel("Depth (cm)")
-
-    ax.set_xlim(0, max(hardness_positions) + 1)
-    ax.set_xlabel("Snow hardness")
-    ax.invert_xaxis()
-
-    ax.set_xticks(hardness_positions)
-    ax.set_xticklabels(hardness_categories)
-
-    ax.set_xticks(np.arange(0, grid_cols + 1, 1), minor=True)
-    ax.set_yticks(np.arange(0, SD + 1, 1), minor=True)
-
-    ax.grid(which="minor", axis="both", linewidth=0.3, alpha=0.35)
-    ax.grid(which="major", axis="both", linewidth=0.6, alpha=0.5)
-
-    if plot_temp:
-        K_to_C = lambda v: K_to_unit(v, "°C")
-        z = [p["z (cm)"] for p in temp_profile]
-        T = [K_to_C(p["temperature (K)"]) for p in temp_profile]
-        z.append(SD)
-        T.append(K_to_C(pit["Air_T (K)"]))
-
-        ax_top = ax.twiny()
-        ax_top.plot(T, z, color="darkred", linewidth=2, label='Temperature (°C)')
-        ax_top.set_xlim(0,-30)
-        ax_top.invert_xaxis()
-        ax_top.set_xlabel("Temperature (°C)")
-    
-    if plot_lwc:
-        z_lwc = [p["z (cm)"] for p in pit["lwc_profile (%)"]]
-        lwc = [p["LWC (%)"] for p in pit["lwc_profile (%)"]]
-    
-        ax_lwc = ax.twiny()
-        ax_lwc.plot(lwc,z_lwc,color="royalblue",linewidth=2,linestyle="--",label='LWC (%)')
-        ax_lwc.set_xlabel("LWC (%)")
-        ax_lwc.set_xlim(0,3)
-        ax_lwc.invert_xaxis()
-        
-        if plot_temp == True:
-            ax_lwc.spines["top"].set_position(("axes", 1.12))
-            ax_lwc.xaxis.set_label_position("top")
-            ax_lwc.xaxis.set_ticks_position("top")
-    
-    info_lines = []
-    
-    if date is not None:
-        info_lines.append(f"Date: {date}   |   ")
-        
-    if location:
-        info_lines.append(f"Location: {location}\n")
-    
-    if weather:
-        info_lines.append(f"Weather: {weather}   |   ")
-    
-    if air_temperature is not None:
-        info_lines.append(f"Air temperature: {np.round(air_temperature,2)} °C")
-    
-    info_text = "".join(info_lines)
-
-    fig.legend(bbox_to_anchor=(0.99, 0.89),)
-    fig.suptitle(
-        title,
-        fontweight="bold",
-        y=0.98,
-    )
-    fig.text(
-        0.5,
-        0.91,
-        info_text,
-        ha="center",
-        va="center",
-        bbox=dict(
-            boxstyle="round,pad=0.35",
-            fc="#f5f5f5",
-            ec="black",
-            linewidth=0.6,
-        ),
-    )
+@st.cache_resource(show_spinner=False)
+def start_warm_up():
+    """Import matplotlib and render a first figure in the background, once per server process.
 
+    Called on every run, it only starts the thread for the first session,
+    whose page is painted without waiting for it.
+    """
+    def warm_up():
+        from utilities.plotting import warm_up
+        warm_up()
 
-    plt.tight_layout(rect=[0, 0, 1, 0.91])
-    return fig
\ No newline at end of file
+    thread = threading.Thread(target=warm_up, name="glacio-log-warm-up", daemon=True)
+    thread.start()
+    return thread
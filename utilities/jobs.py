@@ -0,0 +1,135 @@
+"""
+Background jobs: saves, figure exports and batch renders, off the page's thread.
+
+    job = submit(("save", content_key(pit)), save_or_update_snowpit, path, pit, queue=(str(path), pit_id))
+    job.finished, job.done, job.total, job.result()
+
+Jobs run on a bounded pool of JOB_WORKERS threads. Submitting a job under
+the key of one still running returns that job instead of starting another,
+so a double click or a rerun never writes or renders the same thing twice
+at once. Jobs given the same `queue`, such as the saves of one pit, run one
+after the other in the order they were submitted, so the last edit is
+written last. With `total`, the function also gets
+`progress(done, total=None)` to report how many of its steps are finished.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from utilities.storage import atomic_write
+
+# Figures wait on the render pool and saves on the disk, a few are enough
+JOB_WORKERS = 4
+# Seconds between two looks of a page at a running job
+JOB_POLL_INTERVAL = 0.5
+
+
+class Job:
+    """A function running in the background; `done` of `total` steps are finished so far."""
+
+    def __init__(self, key, label="", total=None):
+        self.key = key
+        self.label = label
+        self.total = total or 1
+        self.done = 0
+        self._future = None
+
+    def _progress(self, done, total=None):
+        if total is not None:
+            self.total = total
+        self.done = done
+
+    @property
+    def finished(self):
+        return self._future.done()
+
+    @property
+    def error(self):
+        """Exception raised by the job, None while it runs or if it succeeded."""
+        return self._future.exception() if self._future.done() else None
+
+    def result(self, timeout=None):
+        """Value returned by the job, raises its error if it failed."""
+        return self._future.result(timeout)
+
+
+_job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="glacio-log-job")
+_running = {}
+# Last job submitted to each queue
+_queues = {}
+_running_lock = threading.Lock()
+
+def _forget(key, queue, job):
+    with _running_lock:
+        if queue is None and _running.get(key) is job:
+            del _running[key]
+        if queue is not None and _queues.get(queue) is job:
+            del _queues[queue]
+
+def _run(future, fn, args, kwargs):
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        result = fn(*args, **kwargs)
+    except BaseException as e:
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+
+def submit(key, fn, *args, label="", total=None, queue=None, **kwargs):
+    """Run `fn(*args, **kwargs)` in the background, returns its Job.
+
+    If a job submitted under `key` is still running, that job is returned
+    and nothing new is started. With a `queue`, the job starts once the
+    last one submitted to that queue has ended, and is only shared with
+    that last one.
+    """
+    with _running_lock:
+        previous = _queues.get(queue) if queue is not None else None
+        job = previous if queue is not None else _running.get(key)
+        if job is not None and job.key == key and not job.finished:
+            return job
+        job = Job(key, label, total)
+        if total is not None:
+            kwargs["progress"] = job._progress
+        job._future = Future()
+        if queue is None:
+            _running[key] = job
+        else:
+            _queues[queue] = job
+    job._future.add_done_callback(lambda _: _forget(key, queue, job))
+
+    def start(_=None):
+        _job_pool.submit(_run, job._future, fn, args, kwargs)
+
+    if previous is None:
+        start()
+    else:
+        # Called right away if the previous job has ended meanwhile
+        previous._future.add_done_callback(start)
+    return job
+
+def content_key(obj):
+    """Short digest of a JSON-like object, to key jobs on what they write."""
+    payload = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def write_file(out_path: Path, make, *args, **kwargs):
+    """Write the bytes returned by `make(*args, **kwargs)` to `out_path`, returns the path."""
+    out_path = Path(out_path)
+    data = make(*args, **kwargs)
+    atomic_write(out_path, lambda f: f.write(data), mode="wb")
+    return out_path
+
+def process_pool(workers=None):
+    """Pool of `workers` processes for the batch tools (default: one per CPU).
+
+    Workers are spawned, never forked: batches are also started from job
+    threads, and forking a process with running threads can copy locks that
+    are held.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
@@ -0,0 +1,448 @@
+"""
+Compact in-memory snow pit.
+
+A stored pit is a dict of lists of dicts; a Snowpit keeps the same data in
+a few NumPy arrays: layer depths and densities as float32, grain and
+hardness as uint8 codes, profiles as (z, value) pairs.
+
+    pit = Snowpit.from_dict(stored)
+    pit.bottom, pit.grain_codes, pit.temperature_z
+    pit.to_dict() == stored  # True
+
+The conversion is lossless: values typed in the field have at most six
+significant digits, which float32 keeps exactly; an array falls back to
+float64 when one of its values has more (e.g. converted temperatures), integers
+stay integers, and anything that is not a number or a known category
+(missing fields, typos of imported files, extra keys) is kept aside and
+written back as it was.
+"""
+
+import numpy as np
+
+from utilities.constants import HARDNESS_MAP, IACS_GRAINS
+
+NO_CODE = 255  # missing grain or hardness
+OTHER_CODE = 254  # unknown grain or hardness, kept aside
+
+GRAIN_CODES = {grain: code for code, grain in enumerate(IACS_GRAINS)}
+HARDNESS_CODES = dict(HARDNESS_MAP)
+
+# table -> (pit key, numeric fields, categorical fields with their codes)
+TABLES = {
+    "layers": (
+        "layers",
+        ["bottom (cm)", "top (cm)", "density (g cm⁻³)"],
+        {"grain (IACS)": GRAIN_CODES, "snow hardness": HARDNESS_CODES},
+    ),
+    "temperature": ("temperature_profile (K)", ["z (cm)", "temperature (K)"], {}),
+    "lwc": ("lwc_profile (%)", ["z (cm)", "LWC (%)"], {}),
+}
+# Field order of the records written back
+RECORD_FIELDS = {
+    "layers": ["bottom (cm)", "top (cm)", "grain (IACS)", "density (g cm⁻³)", "snow hardness"],
+    "temperature": ["z (cm)", "temperature (K)"],
+    "lwc": ["z (cm)", "LWC (%)"],
+}
+SCALARS = {"id": "id", "Date": "date", "SD (cm)": "SD", "Air_T (K)": "air_T"}
+# Key order of the pits written by the app
+_TOP_LEVEL = list(SCALARS) + [key for key, _, _ in TABLES.values()]
+
+
+class _Missing:
+    """Marks a key absent from the stored pit."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "MISSING"
+
+    def __bool__(self):
+        return False
+
+    def __reduce__(self):
+        return "MISSING"
+
+MISSING = _Missing()
+
+# ============================================================
+# %% Conversion helpers
+# ============================================================
+
+FLOAT32_DIGITS = 6  # significant digits any float32 holds exactly
+
+def _round_digits(values: np.ndarray, digits=FLOAT32_DIGITS):
+    """`values` rounded to `digits` significant digits, NaN where out of the exact range."""
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.floor(np.log10(np.where(values == 0, 1, np.abs(values))))
+    shift = (digits - 1) - magnitude
+    ok = np.abs(shift) <= 22  # exact powers of ten
+    scale = 10.0 ** np.where(ok, np.abs(shift), 0)
+    # Multiplying or dividing by an exact power of ten, the result is the
+    # float nearest to the rounded decimal
+    rounded = np.where(
+        shift >= 0, np.round(values * scale) / scale, np.round(values / scale) * scale
+    )
+    return np.where(ok, rounded, np.nan)
+
+def _survives_float32(values: np.ndarray):
+    """True where the value is a decimal short enough to be restored from float32."""
+    return (_round_digits(values) == values) | np.isnan(values)
+
+def _compact(arrays):
+    """float32 copies of the arrays whose every value survives float32, the others as they are."""
+    if all(a.size == 0 for a in arrays):
+        return [a.astype(np.float32) for a in arrays]
+    same = _survives_float32(np.concatenate([a.ravel() for a in arrays]))
+    if same.all():
+        return [a.astype(np.float32) for a in arrays]
+    out, start = [], 0
+    for a in arrays:
+        out.append(a.astype(np.float32) if same[start:start + a.size].all() else a)
+        start += a.size
+    return out
+
+def _exact_rows(arrays):
+    """Rows of Python floats (None for NaN) of each array, as they were before packing."""
+    sizes = [a.size for a in arrays]
+    flat = np.concatenate([a.ravel().astype(np.float64) for a in arrays])
+    packed = np.concatenate([np.full(a.size, a.dtype == np.float32) for a in arrays])
+    if packed.any():
+        flat = np.where(packed, _round_digits(flat), flat)
+    values = [None if v != v else v for v in flat.tolist()]
+    out, start = [], 0
+    for a, size in zip(arrays, sizes):
+        width = a.shape[1]
+        out.append([values[i:i + width] for i in range(start, start + size, width)])
+        start += size
+    return out
+
+def _pack_numbers(table, records, fields, exact):
+    rows = [[record.get(field, MISSING) for field in fields] for record in records]
+    if {type(v) for row in rows for v in row} <= {float}:
+        out = np.array(rows, dtype=np.float64).reshape(len(rows), len(fields))
+        if not np.isnan(out).any():
+            return out
+
+    out = np.full((len(records), len(fields)), np.nan)
+    for j, field in enumerate(fields):
+        n_int = n_float = 0
+        for i, row in enumerate(rows):
+            v = row[j]
+            t = type(v)
+            if t is float and v == v:
+                out[i, j] = v
+                n_float += 1
+            elif t is int:
+                out[i, j] = v
+                n_int += 1
+            elif v is not None:
+                exact[(table, i, field)] = v
+        if n_int and not n_float:
+            exact[("int", table, field)] = True
+        elif n_int:
+            # Integers among floats are kept as they were
+            for i, row in enumerate(rows):
+                if type(row[j]) is int:
+                    exact[(table, i, field)] = row[j]
+    return out
+
+def _pack_codes(table, records, categories, exact):
+    out = np.full((len(records), len(categories)), NO_CODE, dtype=np.uint8)
+    for j, (field, codes) in enumerate(categories.items()):
+        for i, record in enumerate(records):
+            v = record.get(field, MISSING)
+            code = codes.get(v) if type(v) is str else None
+            if code is not None:
+                out[i, j] = code
+            elif v is not None:
+                out[i, j] = OTHER_CODE
+                exact[(table, i, field)] = v
+    return out
+
+# ============================================================
+# %% Snowpit
+# ============================================================
+
+class Snowpit:
+    """One snow pit with array-backed layers and profiles (see module docstring).
+
+    `layers` is an (n, 3) float array of bottom, top and density, `codes`
+    an (n, 2) uint8 array of grain and hardness codes, `temperature` and
+    `lwc` (n, 2) arrays of depth and value. Arrays are shared: do not
+    mutate them.
+    """
+
+    __slots__ = ("id", "date", "SD", "air_T", "layers", "codes", "temperature", "lwc", "_exact")
+
+    def __init__(self, id, date, SD, air_T, layers, codes, temperature, lwc, exact=None):
+        self.id = id
+        self.date = date
+        self.SD = SD
+        self.air_T = air_T
+        self.layers = layers
+        self.codes = codes
+        self.temperature = temperature
+        self.lwc = lwc
+        self._exact = exact or None
+
+    @classmethod
+    def from_dict(cls, pit: dict):
+        exact = {}
+        arrays = {}
+        for table, (key, numeric, categories) in TABLES.items():
+            records = pit.get(key, MISSING)
+            if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                exact[(table, None, None)] = records
+                records = []
+            fields = RECORD_FIELDS[table]
+            for i, record in enumerate(records):
+                if list(record) == fields:
+                    continue
+                extra = {k: v for k, v in record.items() if k not in fields}
+                if extra or list(record) != [f for f in fields if f in record]:
+                    exact[(table, i, None)] = list(record)
+                    if extra:
+                        exact[(table, i, "extra")] = extra
+            arrays[table] = _pack_numbers(table, records, numeric, exact)
+            if categories:
+                arrays["codes"] = _pack_codes(table, records, categories, exact)
+        arrays.update(zip(TABLES, _compact([arrays[table] for table in TABLES])))
+
+        for key in pit:
+            if key not in _TOP_LEVEL:
+                exact[("extra", key)] = pit[key]
+        if list(pit) != [k for k in _TOP_LEVEL if k in pit] + [k for k in pit if k not in _TOP_LEVEL]:
+            exact[("order",)] = list(pit)
+
+        return cls(
+            *(pit.get(key, MISSING) for key in SCALARS),
+            arrays["layers"],
+            arrays["codes"],
+            arrays["temperature"],
+            arrays["lwc"],
+            exact,
+        )
+
+    @classmethod
+    def coerce(cls, pit):
+        """`pit` itself if already a Snowpit, else converted from its stored dict."""
+        return pit if isinstance(pit, cls) else cls.from_dict(pit)
+
+    # ------------------------------------------------------------
+    # Columns
+    # ------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.layers)
+
+    @property
+    def bottom(self):
+        return self.layers[:, 0]
+
+    @property
+    def top(self):
+        return self.layers[:, 1]
+
+    @property
+    def density(self):
+        return self.layers[:, 2]
+
+    @property
+    def grain_codes(self):
+        return self.codes[:, 0]
+
+    @property
+    def hardness_codes(self):
+        return self.codes[:, 1]
+
+    @property
+    def temperature_z(self):
+        return self.temperature[:, 0]
+
+    @property
+    def temperature_K(self):
+        return self.temperature[:, 1]
+
+    @property
+    def lwc_z(self):
+        return self.lwc[:, 0]
+
+    @property
+    def lwc_values(self):
+        return self.lwc[:, 1]
+
+    def numbers(self, table):
+        """Numeric fields of one table as float64, exactly as stored (NaN where not a number)."""
+        values = getattr(self, table)
+        if values.dtype == np.float32:
+            return _round_digits(values)
+        return values
+
+    def _rows(self):
+        """{table: rows of exact numbers} of the numeric fields."""
+        rows = dict(zip(TABLES, _exact_rows([getattr(self, table) for table in TABLES])))
+        for key in (self._exact or {}):
+            if key[0] == "int":
+                _, table, field = key
+                j = TABLES[table][1].index(field)
+                for row in rows[table]:
+                    if row[j] is not None:
+                        row[j] = int(row[j])
+        return rows
+
+    def columns(self, table, rows=None):
+        """{field: list of exact values as stored (numbers, category names, None, ...)} of one table."""
+        _, numeric, categories = TABLES[table]
+        rows = self._rows()[table] if rows is None else rows
+        columns = {field: [row[j] for row in rows] for j, field in enumerate(numeric)}
+        for j, (field, codes) in enumerate(categories.items()):
+            names = {code: name for name, code in codes.items()}
+            columns[field] = [names.get(code) for code in self.codes[:, j].tolist()]
+        for key, value in (self._exact or {}).items():
+            if key[0] == table and key[2] in columns:
+                columns[key[2]][key[1]] = value
+        return columns
+
+    def values(self, table, field):
+        """Exact values of one field as stored."""
+        return self.columns(table)[field]
+
+    def records(self, table, rows=None):
+        """List of dicts of one table, as stored."""
+        exact = self._exact or {}
+        if (table, None, None) in exact:
+            return exact[(table, None, None)]
+        fields = RECORD_FIELDS[table]
+        columns = self.columns(table, rows)
+        records = [dict(zip(fields, values)) for values in zip(*(columns[f] for f in fields))]
+        if exact:
+            for i, record in enumerate(records):
+                for field in [f for f, v in record.items() if v is MISSING]:
+                    del record[field]
+                record.update(exact.get((table, i, "extra"), {}))
+                order = exact.get((table, i, None))
+                if order is not None:
+                    records[i] = {k: record[k] for k in order}
+        return records
+
+    # ------------------------------------------------------------
+    # JSON schema
+    # ------------------------------------------------------------
+
+    def to_dict(self):
+        """The pit in the stored JSON schema, equal to the dict it was built from."""
+        exact = self._exact or {}
+        pit = {}
+        for key, attr in SCALARS.items():
+            value = getattr(self, attr)
+            if value is not MISSING:
+                pit[key] = value
+        rows = self._rows()
+        for table, (key, _, _) in TABLES.items():
+            records = self.records(table, rows[table])
+            if records is not MISSING:
+                pit[key] = records
+        for k, value in exact.items():
+            if k[0] == "extra":
+                pit[k[1]] = value
+        order = exact.get(("order",))
+        if order is not None:
+            pit = {k: pit[k] for k in order}
+        return pit
+
+    def __eq__(self, other):
+        if not isinstance(other, Snowpit):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (
+            f"Snowpit(id={self.id!r}, date={self.date!r}, SD={self.SD!r}, "
+            f"{len(self.layers)} layers, {len(self.temperature)} temperature points, "
+            f"{len(self.lwc)} LWC points)"
+        )
+
+# ============================================================
+# %% Many pits
+# ============================================================
+
+def stack_columns(pits, table):
+    """Columns of one table over many Snowpit objects, and the number of rows of each pit.
+
+    Numbers are float64 exactly as stored (int64 when every value was an
+    integer), categories are names; a column holding anything else (e.g.
+    typos) is an object column of the stored values. Null values are None
+    and absent fields NaN, as in an object DataFrame built from the records.
+    """
+    _, numeric, categories = TABLES[table]
+    arrays = [getattr(pit, table) for pit in pits]
+    sizes = np.array([len(a) for a in arrays], dtype=np.int64)
+    starts = np.cumsum(sizes) - sizes
+
+    values = np.concatenate([a.astype(np.float64) for a in arrays]) if arrays else np.empty((0, len(numeric)))
+    packed = np.repeat(np.array([a.dtype == np.float32 for a in arrays], dtype=bool), sizes)
+    if packed.any():
+        values[packed] = _round_digits(values[packed])
+    columns = {field: values[:, j] for j, field in enumerate(numeric)}
+
+    if categories:
+        codes = np.concatenate([pit.codes for pit in pits]) if pits else np.empty((0, len(categories)), np.uint8)
+        for j, (field, mapping) in enumerate(categories.items()):
+            names = np.full(256, None, dtype=object)
+            for name, code in mapping.items():
+                names[code] = name
+            columns[field] = names[codes[:, j]]
+
+    exceptions = [(p, key, v) for p, pit in enumerate(pits) for key, v in (pit._exact or {}).items()]
+    ints = {field: 0 for field in numeric}
+    for p, key, v in exceptions:
+        if key[0] == "int" and key[1] == table:
+            ints[key[2]] += 1
+    for field, n in ints.items():
+        column = columns[field]
+        if n and n == np.count_nonzero(sizes) and not np.isnan(column).any():
+            columns[field] = column.astype(np.int64)
+
+    patches, absent = {}, {}
+    for p, key, v in exceptions:
+        if key[0] == table and key[2] in columns:
+            if v is MISSING:
+                absent.setdefault(key[2], []).append(starts[p] + key[1])
+            else:
+                patches.setdefault(key[2], []).append((starts[p] + key[1], v))
+    for field in numeric:
+        column = columns[field]
+        if column.dtype == np.float64 and field not in patches:
+            # NaN that is neither absent nor kept aside was stored as None
+            null = np.isnan(column)
+            null[absent.get(field, [])] = False
+            if null.any():
+                patches[field] = []
+    for field, items in patches.items():
+        column = columns[field]
+        if column.dtype != object:
+            null = np.isnan(column) if column.dtype == np.float64 else None
+            column = columns[field] = column.astype(object)
+            if null is not None:
+                column[null] = None
+        for i, v in items:
+            column[i] = v
+    for field, rows in absent.items():
+        # Absent fields are NaN, as in a frame built from the records
+        if columns[field].dtype == object:
+            columns[field][rows] = np.nan
+    return columns, sizes
+
+def held_fields(pits, table):
+    """{field: True for each pit where some row holds the field} of one table."""
+    _, numeric, categories = TABLES[table]
+    sizes = np.array([len(getattr(pit, table)) for pit in pits], dtype=np.int64)
+    absent = {field: np.zeros(len(pits), dtype=np.int64) for field in [*numeric, *categories]}
+    for p, pit in enumerate(pits):
+        for key, v in (pit._exact or {}).items():
+            if key[0] == table and v is MISSING and key[2] in absent:
+                absent[key[2]][p] += 1
+    return {field: counts < sizes for field, counts in absent.items()}
+
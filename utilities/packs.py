@@ -0,0 +1,364 @@
+"""
+Memory-mapped season packs, for queries over archives larger than RAM.
+
+The layers and profile points of one site and season are packed into
+fixed-width structured arrays saved as .npy files next to clean_data:
+
+    {site}/{season}/pack/manifest.json
+    {site}/{season}/pack/{pits,layers,temperature,lwc}-{version}.npy
+
+`pits` is the offset index (one row per pit, in date order) pointing into
+the three record tables. Packs are opened with np.load(mmap_mode="r"), so
+a query only pages in the columns and chunks it reads:
+
+    FC_DH = [GRAIN_CODES["FC"], GRAIN_CODES["DH"]]
+    thick = query(base_dir, "layers",
+                  lambda L: np.isin(L["grain"], FC_DH) & (L["top"] - L["bottom"] > 2),
+                  seasons=["2025-2026"])
+
+A pack is rebuilt day by day: only the days written since the last build
+are parsed again, the others are copied from the previous version. Each
+build writes a new version and the manifest is switched last, so open
+packs keep reading the version they mapped. A save only marks the pack of
+its season stale: it is rebuilt by a background job, or by the next
+open_pack that finds it behind.
+"""
+
+import itertools
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from utilities.cache import file_signature
+from utilities.constants import IACS_GRAINS, SNOW_HARDNESS
+from utilities.jobs import submit
+from utilities.model import HARDNESS_CODES, Snowpit
+from utilities.storage import (
+    add_write_listener,
+    atomic_write_json,
+    file_lock,
+    list_days,
+    load_snowpit_models,
+    open_store,
+)
+from utilities.tree import DATA_TEMPLATE, find_data_dirs
+
+PACK_DIR = "pack"
+MANIFEST = "manifest.json"
+PACK_FORMAT = 1
+
+TABLES = ["layers", "temperature", "lwc"]
+
+LAYER_DTYPE = np.dtype([
+    ("pit", "<u4"),
+    ("bottom", "<f4"),
+    ("top", "<f4"),
+    ("density", "<f4"),
+    ("grain", "u1"),
+    ("hardness", "u1"),
+])
+PROFILE_DTYPE = np.dtype([("pit", "<u4"), ("z", "<f4"), ("value", "<f4")])
+RECORD_DTYPES = {"layers": LAYER_DTYPE, "temperature": PROFILE_DTYPE, "lwc": PROFILE_DTYPE}
+
+ID_BYTES = 64
+
+PIT_DTYPE = np.dtype(
+    [
+        ("date", "<M8[D]"),
+        ("id", f"S{ID_BYTES}"),
+        ("SD", "<f4"),
+        ("air_T", "<f4"),
+    ]
+    + [(f"{table}_start", "<u8") for table in TABLES]
+    + [(f"{table}_count", "<u4") for table in TABLES]
+)
+
+# Rows read at once by query()
+CHUNK_ROWS = 1 << 20
+
+# ============================================================
+# %% Packing
+# ============================================================
+
+def _pack_dir(data_dir: Path):
+    return Path(data_dir).parent / PACK_DIR
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _pack_day(day, models):
+    """(pit rows, {table: record rows}) of one day, pit numbers local to the day."""
+    pits = np.zeros(len(models), dtype=PIT_DTYPE)
+    pits["date"] = np.datetime64(day, "D")
+    pits["id"] = [str(pit.id).encode()[:ID_BYTES] for pit in models]
+    pits["SD"] = [_number(pit.SD) for pit in models]
+    pits["air_T"] = [_number(pit.air_T) for pit in models]
+
+    records = {}
+    for table in TABLES:
+        arrays = [pit.numbers(table) for pit in models]
+        counts = np.array([len(a) for a in arrays], dtype=np.int64)
+        rows = np.zeros(counts.sum(), dtype=RECORD_DTYPES[table])
+        rows["pit"] = np.repeat(np.arange(len(models)), counts)
+        values = np.concatenate(arrays) if arrays else np.empty((0, 3))
+        if table == "layers":
+            rows["bottom"], rows["top"], rows["density"] = values[:, 0], values[:, 1], values[:, 2]
+            rows["grain"], rows["hardness"] = (
+                np.concatenate([pit.codes for pit in models]).T if models else ([], [])
+            )
+        else:
+            rows["z"], rows["value"] = values[:, 0], values[:, 1]
+        pits[f"{table}_count"] = counts
+        records[table] = rows
+    return pits, records
+
+def _day_of(path: Path):
+    return Path(path).stem[len("snowpits_"):]
+
+def _signature(path: Path):
+    return list(file_signature(open_store(path).backing_path))
+
+def _read_manifest(pack_dir: Path):
+    try:
+        with open(pack_dir / MANIFEST) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return manifest if manifest.get("format") == PACK_FORMAT else None
+
+def _load_version(pack_dir: Path, version):
+    return {
+        name: np.load(pack_dir / f"{name}-{version}.npy", mmap_mode="r")
+        for name in ["pits"] + TABLES
+    }
+
+def _write_version(pack_dir: Path, version, segments):
+    """Write the pits and record tables of `segments` (pits, records) in order, without holding them all."""
+    n_pits = sum(len(pits) for pits, _ in segments)
+    out = {
+        "pits": np.lib.format.open_memmap(pack_dir / f"pits-{version}.npy", "w+", PIT_DTYPE, (n_pits,))
+    }
+    for table in TABLES:
+        n = sum(len(records[table]) for _, records in segments)
+        out[table] = np.lib.format.open_memmap(
+            pack_dir / f"{table}-{version}.npy", "w+", RECORD_DTYPES[table], (n,)
+        )
+
+    pit_start = 0
+    starts = dict.fromkeys(TABLES, 0)
+    for pits, records in segments:
+        pits = np.array(pits)
+        for table in TABLES:
+            rows = np.array(records[table])
+            counts = pits[f"{table}_count"].astype(np.int64)
+            # Pit numbers and offsets of the segment, shifted to their place in the pack
+            rows["pit"] = np.repeat(np.arange(pit_start, pit_start + len(pits)), counts)
+            pits[f"{table}_start"] = starts[table] + np.cumsum(counts) - counts
+            out[table][starts[table]:starts[table] + len(rows)] = rows
+            starts[table] += len(rows)
+        out["pits"][pit_start:pit_start + len(pits)] = pits
+        pit_start += len(pits)
+
+    for array in out.values():
+        array.flush()
+    del out
+
+def _segment_of(old, day):
+    """(pits, records) of one day in an existing pack version."""
+    pits = old["pits"]
+    dates = pits["date"]
+    lo, hi = np.searchsorted(dates, np.datetime64(day, "D"), side="left"), \
+        np.searchsorted(dates, np.datetime64(day, "D"), side="right")
+    day_pits = pits[lo:hi]
+    records = {}
+    for table in TABLES:
+        if hi > lo:
+            start = int(day_pits[0][f"{table}_start"])
+            stop = start + int(day_pits[f"{table}_count"].sum())
+        else:
+            start = stop = 0
+        records[table] = old[table][start:stop]
+    return day_pits, records
+
+def build_pack(data_dir: Path, fresh_days=None):
+    """Bring the pack of a clean_data folder up to date, returns its manifest.
+
+    Days whose backing file is unchanged since the last build are copied
+    from it; the others are parsed again. `fresh_days` maps days to their
+    pits when the caller already has them (e.g. right after a write).
+    """
+    data_dir = Path(data_dir)
+    pack_dir = _pack_dir(data_dir)
+    pack_dir.mkdir(parents=True, exist_ok=True)
+    fresh_days = fresh_days or {}
+
+    with file_lock(pack_dir / MANIFEST):
+        manifest = _read_manifest(pack_dir)
+        old_days = manifest["days"] if manifest else {}
+        old = _load_version(pack_dir, manifest["version"]) if manifest else None
+
+        paths = {_day_of(p): p for p in list_days(data_dir)}
+        # Days sharing a file just written (one database per season) are up to date
+        written = {open_store(paths[day]).backing_path for day in fresh_days if day in paths}
+        days = {}
+        segments = []
+        changed = set(old_days) - set(paths)
+        for day in sorted(paths):
+            signature = _signature(paths[day])
+            days[day] = signature
+            unchanged = old_days.get(day) == signature or (
+                day in old_days and open_store(paths[day]).backing_path in written
+            )
+            if day not in fresh_days and old is not None and unchanged:
+                segments.append(_segment_of(old, day))
+                continue
+            changed.add(day)
+            models = fresh_days.get(day)
+            models = load_snowpit_models(paths[day]) if models is None else list(map(Snowpit.coerce, models))
+            segments.append(_pack_day(day, models))
+
+        if manifest is not None and not changed:
+            return manifest
+
+        version = manifest["version"] + 1 if manifest else 1
+        _write_version(pack_dir, version, segments)
+        del old, segments
+        new_manifest = {"format": PACK_FORMAT, "version": version, "days": days}
+        atomic_write_json(pack_dir / MANIFEST, new_manifest, indent=1)
+
+        # Older versions may still be mapped by readers (and cannot be removed on Windows)
+        for stale in pack_dir.glob("*-*.npy"):
+            if stale.stem.rsplit("-", 1)[1] != str(version):
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+        return new_manifest
+
+# Folders whose pack is stale and has a rebuild waiting to start
+_pending = set()
+_pending_lock = threading.Lock()
+_builds = itertools.count()
+
+def _rebuild(data_dir: Path):
+    with _pending_lock:
+        _pending.discard(data_dir)
+    return build_pack(data_dir)
+
+def _update_packs(path: Path, snowpits: list):
+    """Write listener: mark the pack of the folder stale and rebuild it in the background.
+
+    Writes arriving before the rebuild starts share it; one arriving during
+    the rebuild queues another after it.
+    """
+    data_dir = Path(path).parent
+    if not (_pack_dir(data_dir) / MANIFEST).exists():
+        return
+    with _pending_lock:
+        if data_dir in _pending:
+            return
+        _pending.add(data_dir)
+    submit(
+        ("pack", str(data_dir), next(_builds)), _rebuild, data_dir,
+        label="Updating the season pack", queue=("pack", str(data_dir)),
+    )
+
+add_write_listener(_update_packs)
+
+# ============================================================
+# %% Reading
+# ============================================================
+
+_GRAIN_NAMES = np.full(256, None, dtype=object)
+_GRAIN_NAMES[:len(IACS_GRAINS)] = IACS_GRAINS
+_HARDNESS_NAMES = np.full(256, None, dtype=object)
+for _name, _code in HARDNESS_CODES.items():
+    _HARDNESS_NAMES[_code] = _name
+
+def _frame(site, season, pits, table, index, rows):
+    """Tidy DataFrame of the rows `index` of a record table, columns as in utilities.tables."""
+    import pandas as pd
+
+    owners = pits[rows["pit"]]
+    data = {
+        "site": pd.Categorical([site] * len(rows)),
+        "season": pd.Categorical([season] * len(rows)),
+        "date": owners["date"].astype("datetime64[s]"),
+        "id": np.char.decode(owners["id"]).astype(object),
+    }
+    if table == "layers":
+        hardness = rows["hardness"]
+        data["layer"] = (index - owners["layers_start"]).astype(np.int16)
+        data["bottom (cm)"] = rows["bottom"].astype(np.float64)
+        data["top (cm)"] = rows["top"].astype(np.float64)
+        data["grain (IACS)"] = pd.Categorical(_GRAIN_NAMES[rows["grain"]], categories=IACS_GRAINS)
+        data["density (g cm⁻³)"] = rows["density"].astype(np.float64)
+        data["snow hardness"] = pd.Categorical(
+            _HARDNESS_NAMES[hardness], categories=SNOW_HARDNESS, ordered=True
+        )
+        data["hardness code"] = pd.arrays.IntegerArray(
+            hardness.astype(np.int8), _HARDNESS_NAMES[hardness] == None  # noqa: E711
+        )
+    else:
+        data["z (cm)"] = rows["z"].astype(np.float64)
+        data["temperature (K)" if table == "temperature" else "LWC (%)"] = rows["value"].astype(np.float64)
+    return pd.DataFrame(data)
+
+class SeasonPack:
+    """Memory-mapped pack of one site and season (see module docstring)."""
+
+    def __init__(self, site, season, pack_dir: Path, manifest: dict):
+        self.site = site
+        self.season = season
+        self.version = manifest["version"]
+        arrays = _load_version(pack_dir, self.version)
+        self.pits = arrays["pits"]
+        self.layers = arrays["layers"]
+        self.temperature = arrays["temperature"]
+        self.lwc = arrays["lwc"]
+
+    def scan(self, table, where, chunk_rows=CHUNK_ROWS):
+        """(row numbers, rows) of `table` for which `where(chunk)` is True, read chunk by chunk."""
+        records = getattr(self, table)
+        index, rows = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=records.dtype)]
+        for start in range(0, len(records), chunk_rows):
+            chunk = records[start:start + chunk_rows]
+            hits = np.flatnonzero(where(chunk))
+            index.append(start + hits)
+            rows.append(np.asarray(chunk[hits]))
+        return np.concatenate(index), np.concatenate(rows)
+
+    def frame(self, table, index, rows):
+        """Tidy DataFrame of rows returned by scan()."""
+        return _frame(self.site, self.season, self.pits, table, index, rows)
+
+def open_pack(base_dir: Path, site, season, refresh=True):
+    """SeasonPack of a site and season, built or brought up to date first unless `refresh` is False."""
+    data_dir = Path(base_dir) / DATA_TEMPLATE.format(site=site, season=season)
+    pack_dir = _pack_dir(data_dir)
+    manifest = build_pack(data_dir) if refresh else _read_manifest(pack_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No pack in {pack_dir}")
+    return SeasonPack(site, season, pack_dir, manifest)
+
+def query(base_dir: Path, table, where, sites=None, seasons=None, refresh=True, chunk_rows=CHUNK_ROWS):
+    """Tidy DataFrame of the rows of `table` matching `where(chunk)` in the packs of some sites and seasons.
+
+    `where` gets a chunk of the structured records (fields of LAYER_DTYPE or
+    PROFILE_DTYPE) and returns a boolean mask.
+    """
+    import pandas as pd
+
+    frames = [
+        _frame("", "", np.zeros(0, dtype=PIT_DTYPE), table,
+               np.empty(0, dtype=np.int64), np.zeros(0, dtype=RECORD_DTYPES[table]))
+    ]
+    for site, season, _ in find_data_dirs(base_dir, sites, seasons):
+        pack = open_pack(base_dir, site, season, refresh)
+        frames.append(pack.frame(table, *pack.scan(table, where, chunk_rows)))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,498 @@
+"""
+Stratigraphy figures.
+
+Kept apart from utilities.functions so that matplotlib is only imported
+by the pages that plot, or in the background by the warm-up started with
+the first session.
+
+Figures are standalone `Figure` objects on an Agg canvas, styled per call:
+nothing here touches pyplot or the global rcParams, so sessions can render
+at the same time. Encoding runs on a bounded pool of RENDER_WORKERS threads,
+and sessions asking for the same figure at once share a single render.
+
+    python -m utilities.plotting    # build matplotlib's font cache ahead of time
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")  # figures are only encoded, and may be rendered off the main thread
+import matplotlib.dates as mdates
+import matplotlib.image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+
+from utilities.cache import BytesCache
+from utilities.constants import IACS_GRAINS, HARDNESS_MAP, GRAIN_COLORS, IACS_SYMBOLS
+from utilities.model import Snowpit
+from utilities.seasonal import NO_SNOW
+from utilities.units import K_to_unit_array
+
+# Text sizes, given to every figure rather than set in the shared rcParams
+FONT_SIZE = 11
+TITLE_SIZE = 14
+LABEL_SIZE = 12
+TICK_SIZE = 10
+LEGEND_SIZE = 10
+
+# ============================================================
+# %% Plot functions 
+# ============================================================     
+
+def _new_figure(**kwargs):
+    """Standalone figure on its own Agg canvas, outside pyplot's figure manager."""
+    fig = Figure(**kwargs)
+    FigureCanvasAgg(fig)
+    return fig
+
+def _style_axes(ax):
+    ax.title.set_fontsize(TITLE_SIZE)
+    ax.xaxis.label.set_fontsize(LABEL_SIZE)
+    ax.yaxis.label.set_fontsize(LABEL_SIZE)
+    ax.tick_params(labelsize=TICK_SIZE)
+    return ax
+
+PREVIEW_DPI = 80
+PREVIEW_MAX_GRID_LINES = 60
+
+def _preview_grid_step(n_cm):
+    """Smallest 1-2-5 step (cm) keeping the minor grid under PREVIEW_MAX_GRID_LINES lines."""
+    for step in (1, 2, 5, 10, 20, 50, 100):
+        if n_cm / step <= PREVIEW_MAX_GRID_LINES:
+            return step
+    return 100
+
+def plot_snowpit_grid_mapped(
+    pit,
+    plot_temp,
+    plot_lwc,
+    hardness_categories=HARDNESS_MAP,
+    grain_colors=GRAIN_COLORS,
+    title="Snow pit profile",
+    location=None,
+    weather=None,
+    date=None,
+    air_temperature=None,
+    preview=False,
+):
+    """Stratigraphy figure of one snow pit.
+
+    `preview` renders a light figure for the browser: low dpi and a minor
+    grid decimated to about PREVIEW_MAX_GRID_LINES lines per axis. Exports
+    keep the default full-resolution, 1 cm grid figure.
+    """
+    pit = Snowpit.coerce(pit)
+    layers = pit.columns("layers")
+    layers = list(zip(
+        layers["bottom (cm)"], layers["top (cm)"], layers["snow hardness"],
+        layers["grain (IACS)"], layers["density (g cm\u207b\u00b3)"],
+    ))
+
+    SD = int(pit.SD)
+    grid_cols = SD
+
+    hardness_categories = list(hardness_categories)
+    n_hardness = len(hardness_categories)
+    
+    step = grid_cols // n_hardness
+    hardness_positions = [(i + 1) * step for i in range(n_hardness)]
+    
+    hardness_lookup = dict(zip(hardness_categories, hardness_positions))
+    
+    fig_height = max(6, SD / 6)
+    fig = _new_figure(figsize=(8, fig_height), dpi=PREVIEW_DPI if preview else 300)
+    ax = _style_axes(fig.add_subplot(111))
+
+    # All layer boxes in one collection instead of one barh call per layer
+    boxes = []
+    box_colors = []
+    for bottom, top, h_label, grain, _ in layers:
+        bottom = float(bottom)
+        top = float(top)
+        hardness_value = hardness_lookup[h_label]
+        boxes.append([(0, bottom), (hardness_value, bottom), (hardness_value, top), (0, top)])
+        box_colors.append(grain_colors.get(grain, "grey"))
+
+    ax.add_collection(
+        PolyCollection(
+            boxes,
+            facecolors=box_colors,
+            edgecolors="black",
+            linewidths=0.6,
+        )
+    )
+
+    for bottom, top, h_label, grain, density in layers:
+        bottom = float(bottom)
+        top = float(top)
+        height = top - bottom
+
+        hardness_value = hardness_lookup[h_label]
+
+        grain_symbol = IACS_SYMBOLS.get(grain, "")
+
+        y_center = bottom + height / 2
+        label_text = f"Grain: {grain} - [{grain_symbol}]\nDensity: {density} g cm⁻³"
+        
+        if height < 5:
+            y_center = bottom + height / 2
+            
+            # Vertical offset of the annotation
+            if bottom == 0:
+                y_arrow = bottom + height / 3
+                y_text = top + 1.0
+                va = "bottom"
+            else:
+                y_arrow = bottom + 2 * height / 3
+                y_text = bottom - 1.0
+                va = "top"
+            
+            ax.annotate(
+                label_text,
+                xy=(hardness_value, y_arrow),
+                xytext=(hardness_value + step * 0.1, y_text),
+                ha="left",
+                va=va,
+                fontsize=8,
+                arrowprops=dict(
+                    arrowstyle="-",
+                    linewidth=0.8,
+                ),
+                bbox=dict(
+                    boxstyle="round,pad=0.2",
+                    fc="white",
+                    ec="black",
+                    linewidth=0.5,
+                ),
+            )
+        else:
+            ax.text(
+                hardness_value / 2,
+                y_center,
+                label_text,
+                ha="center",
+                va="center",
+                fontsize=8,
+                clip_on=True,
+            )
+    
+    ax.set_ylim(0, SD)
+    ax.yaxis.tick_right()
+    ax.yaxis.set_label_position("right")
+    ax.set_ylabel("Depth (cm)")
+
+    ax.set_xlim(0, max(hardness_positions) + 1)
+    ax.set_xlabel("Snow hardness")
+    ax.invert_xaxis()
+
+    ax.set_xticks(hardness_positions)
+    ax.set_xticklabels(hardness_categories)
+
+    minor_step = _preview_grid_step(max(grid_cols, SD)) if preview else 1
+    ax.set_xticks(np.arange(0, grid_cols + 1, minor_step), minor=True)
+    ax.set_yticks(np.arange(0, SD + 1, minor_step), minor=True)
+
+    ax.grid(which="minor", axis="both", linewidth=0.3, alpha=0.35)
+    ax.grid(which="major", axis="both", linewidth=0.6, alpha=0.5)
+
+    if plot_temp:
+        # Snow profile plus the air temperature at the surface, converted at once
+        temp_profile = pit.columns("temperature")
+        z = temp_profile["z (cm)"] + [SD]
+        T = K_to_unit_array(temp_profile["temperature (K)"] + [pit.air_T], "°C")
+
+        ax_top = _style_axes(ax.twiny())
+        ax_top.plot(T, z, color="darkred", linewidth=2, label='Temperature (°C)')
+        ax_top.set_xlim(0,-30)
+        ax_top.invert_xaxis()
+        ax_top.set_xlabel("Temperature (°C)")
+    
+    if plot_lwc:
+        lwc_profile = pit.columns("lwc")
+        z_lwc = lwc_profile["z (cm)"]
+        lwc = lwc_profile["LWC (%)"]
+    
+        ax_lwc = _style_axes(ax.twiny())
+        ax_lwc.plot(lwc,z_lwc,color="royalblue",linewidth=2,linestyle="--",label='LWC (%)')
+        ax_lwc.set_xlabel("LWC (%)")
+        ax_lwc.set_xlim(0,3)
+        ax_lwc.invert_xaxis()
+        
+        if plot_temp == True:
+            ax_lwc.spines["top"].set_position(("axes", 1.12))
+            ax_lwc.xaxis.set_label_position("top")
+            ax_lwc.xaxis.set_ticks_position("top")
+    
+    info_lines = []
+    
+    if date is not None:
+        info_lines.append(f"Date: {date}   |   ")
+        
+    if location:
+        info_lines.append(f"Location: {location}\n")
+    
+    if weather:
+        info_lines.append(f"Weather: {weather}   |   ")
+    
+    if air_temperature is not None:
+        info_lines.append(f"Air temperature: {np.round(air_temperature,2)} °C")
+    
+    info_text = "".join(info_lines)
+
+    fig.legend(bbox_to_anchor=(0.99, 0.89), fontsize=LEGEND_SIZE)
+    fig.suptitle(
+        title,
+        fontweight="bold",
+        fontsize=TITLE_SIZE,
+        y=0.98,
+    )
+    fig.text(
+        0.5,
+        0.91,
+        info_text,
+        ha="center",
+        va="center",
+        fontsize=FONT_SIZE,
+        bbox=dict(
+            boxstyle="round,pad=0.35",
+            fc="#f5f5f5",
+            ec="black",
+            linewidth=0.6,
+        ),
+    )
+
+
+    fig.tight_layout(rect=[0, 0, 1, 0.91])
+    return fig
+
+# Encoded figures shared across reruns and sessions, bounded in bytes
+_render_cache = BytesCache(max_bytes=128 * 1024 * 1024)
+
+# Renders running at once, across all sessions
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+_render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="glacio-log-render")
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def encode_figure(fig, fmt, dpi):
+    """PNG, SVG or PDF bytes of a figure, cropped to its content."""
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi, bbox_inches="tight")
+    return buf.getvalue()
+
+def _render_on_pool(key, render):
+    """`render()` run on the render pool; callers asking for the same `key` meanwhile wait for the same run."""
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        first = future is None
+        if first:
+            future = _in_flight[key] = _render_pool.submit(render)
+    if first:
+        future.add_done_callback(lambda _: _forget(key))
+    return future.result()
+
+def _forget(key):
+    with _in_flight_lock:
+        _in_flight.pop(key, None)
+
+def render_cached(key, render):
+    """Blob of `key` from the render cache, else from `render()` run on the render pool."""
+    return _render_cache.get(key, lambda: _render_on_pool(key, render))
+
+def snowpit_fingerprint(pit, **options):
+    """Content hash of a pit (Snowpit or stored dict) and of the options it is rendered with."""
+    if isinstance(pit, Snowpit):
+        pit = pit.to_dict()
+    payload = json.dumps({"pit": pit, "options": options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def render_snowpit_image(
+    pit,
+    plot_temp,
+    plot_lwc,
+    title="Snow pit profile",
+    location=None,
+    weather=None,
+    date=None,
+    air_temperature=None,
+    fmt="png",
+    dpi=300,
+    preview=False,
+):
+    """Encoded stratigraphy of `pit`, rendered once per pit content and plot options.
+
+    With `preview`, the light browser figure is encoded at PREVIEW_DPI.
+    """
+    if preview:
+        dpi = PREVIEW_DPI
+    options = dict(
+        plot_temp=plot_temp,
+        plot_lwc=plot_lwc,
+        title=title,
+        location=location,
+        weather=weather,
+        date=date,
+        air_temperature=air_temperature,
+        preview=preview,
+    )
+
+    def render():
+        return encode_figure(plot_snowpit_grid_mapped(pit, **options), fmt, dpi)
+
+    key = snowpit_fingerprint(pit, fmt=fmt, dpi=dpi, **options)
+    return render_cached(key, render)
+
+def plot_season_stratigraphy(
+    daily,
+    plot_temp,
+    plot_lwc,
+    grain_colors=GRAIN_COLORS,
+    title="Seasonal snow pit profile",
+    preview=False,
+):
+    """Time-depth stratigraphy of a season from `SeasonGrid.daily()`.
+
+    Each field is drawn as a single image over the daily grid; temperature
+    and LWC get their own panel below the grain types.
+    """
+    days, z = daily["days"], daily["z"]
+    dz = z[1] - z[0] if z.size > 1 else 1.0
+    extent = [
+        mdates.date2num(days[0]) - 0.5,
+        mdates.date2num(days[-1]) + 0.5,
+        0,
+        z[-1] + dz / 2 if z.size else 1,
+    ]
+
+    panels = ["grain"] + (["temperature"] if plot_temp else []) + (["lwc"] if plot_lwc else [])
+    fig = _new_figure(figsize=(11, 3.2 * len(panels) + 1), dpi=PREVIEW_DPI if preview else 300)
+    axes = fig.subplots(len(panels), 1, sharex=True, squeeze=False)[:, 0]
+    for ax in axes:
+        _style_axes(ax)
+    image_options = dict(origin="lower", aspect="auto", interpolation="nearest", extent=extent)
+
+    # --- Grain types, cells above the snow surface left blank ---
+    ax = axes[0]
+    cmap = ListedColormap([grain_colors.get(g, "grey") for g in IACS_GRAINS])
+    cmap.set_bad(alpha=0)
+    grain = np.ma.masked_equal(daily["grain"].T, NO_SNOW)
+    im = ax.imshow(grain, cmap=cmap, vmin=-0.5, vmax=len(IACS_GRAINS) - 0.5, **image_options)
+    # Discrete colorbar as legend, so every panel keeps the same width
+    colorbar = fig.colorbar(im, ax=ax, ticks=range(len(IACS_GRAINS)), pad=0.01)
+    _style_axes(colorbar.ax)
+    colorbar.ax.set_yticklabels(IACS_GRAINS, fontsize=8)
+    colorbar.set_label("Grain (IACS)")
+
+    # Pit dates along the top edge
+    ax.plot(
+        mdates.date2num(daily["pit_days"]),
+        np.full(daily["pit_days"].size, extent[3]),
+        linestyle="none", marker="v", color="black", markersize=4, clip_on=False,
+    )
+    ax.set_ylabel("Depth (cm)")
+
+    # --- Interpolated profiles ---
+    for ax, panel in zip(axes[1:], panels[1:]):
+        if panel == "temperature":
+            field = K_to_unit_array(daily["temperature"].T, "°C")
+            im = ax.imshow(np.ma.masked_invalid(field), cmap="Blues_r", vmin=-30, vmax=0, **image_options)
+            label = "Temperature (°C)"
+        else:
+            im = ax.imshow(np.ma.masked_invalid(daily["lwc"].T), cmap="Blues", vmin=0, vmax=3, **image_options)
+            label = "LWC (%)"
+        _style_axes(fig.colorbar(im, ax=ax, label=label, pad=0.01).ax)
+        ax.set_ylabel("Depth (cm)")
+
+    for ax in axes:
+        ax.set_ylim(extent[2], extent[3])
+        ax.grid(which="major", axis="both", linewidth=0.6, alpha=0.5)
+    axes[-1].xaxis_date()
+    axes[-1].xaxis.set_major_locator(mdates.AutoDateLocator())
+    axes[-1].xaxis.set_major_formatter(mdates.ConciseDateFormatter(axes[-1].xaxis.get_major_locator()))
+    axes[-1].set_xlim(extent[0], extent[1])
+
+    fig.suptitle(title, fontweight="bold", fontsize=TITLE_SIZE)
+    fig.tight_layout()
+    return fig
+
+def render_season_image(grid, plot_temp, plot_lwc, title="Seasonal snow pit profile", fmt="png", dpi=300, preview=False):
+    """Encoded season stratigraphy, rendered once per version of the grid and options."""
+    if preview:
+        dpi = PREVIEW_DPI
+    options = dict(plot_temp=plot_temp, plot_lwc=plot_lwc, title=title, preview=preview)
+
+    def render():
+        return encode_figure(plot_season_stratigraphy(grid.daily(), **options), fmt, dpi)
+
+    key = ("season", str(grid.data_dir), grid.dz, grid.version, fmt, dpi, *options.items())
+    return render_cached(key, render)
+
+# ============================================================
+# %% Atlas pages
+# ============================================================
+
+A4_PORTRAIT = (8.27, 11.69)
+SUMMARY_COLUMNS = ["Site", "Season", "Pits", "First", "Last", "Mean SD (cm)", "Max SD (cm)"]
+
+def plot_atlas_summary(rows, title="Snow pit atlas"):
+    """First page of an atlas: one row of SUMMARY_COLUMNS per site and season."""
+    fig = _new_figure(figsize=A4_PORTRAIT)
+    ax = fig.add_subplot(111)
+    ax.axis("off")
+    n = sum(row[2] for row in rows)
+    first = min((row[3] for row in rows), default="")
+    last = max((row[4] for row in rows), default="")
+    fig.suptitle(title, fontweight="bold", fontsize=TITLE_SIZE, y=0.95)
+    fig.text(0.5, 0.91, f"{n} snow pits from {first} to {last}", ha="center", fontsize=FONT_SIZE)
+    if rows:
+        table = ax.table(
+            cellText=[[str(v) for v in row] for row in rows],
+            colLabels=SUMMARY_COLUMNS,
+            loc="upper center",
+            cellLoc="center",
+        )
+        table.auto_set_font_size(False)
+        table.set_fontsize(TICK_SIZE)
+        table.auto_set_column_width(range(len(SUMMARY_COLUMNS)))
+        table.scale(1, 1.4)
+    return fig
+
+def image_page(png, dpi):
+    """Figure holding an encoded image at its size for `dpi`, to place a raster page in a PDF."""
+    image = matplotlib.image.imread(io.BytesIO(png), format="png")
+    height, width = image.shape[:2]
+    fig = _new_figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    fig.figimage(image, resize=False)
+    return fig
+
+# ============================================================
+# %% Warm-up
+# ============================================================
+
+def warm_up():
+    """Load the fonts and the style by rendering a small figure, returns the time taken (s).
+
+    Runs next to the sessions' renders, like any other figure of this module.
+    """
+    start = time.perf_counter()
+    fig = _new_figure(figsize=(2, 2), dpi=PREVIEW_DPI)
+    ax = fig.add_subplot(111)
+    ax.plot([0, 1], [0, 1])
+    ax.set_title("Glacio-Log", fontweight="bold")
+    ax.text(0.5, 0.5, "".join(IACS_SYMBOLS.values()))
+    fig.savefig(io.BytesIO(), format="png")
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"matplotlib ready in {warm_up():.2f} s", file=sys.stderr)
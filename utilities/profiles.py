@@ -0,0 +1,45 @@
+"""
+Depth grids of the temperature and LWC tables of the Create pages.
+
+    table = resample_profile(previous_table, profile_depths(SD, step), "LWC (%)")
+
+When the snow depth, the vertical range or the unit changes, the values
+already measured are kept: every measured point stays at its own depth,
+merged with the depths of the new grid, which are left empty to fill in.
+Nothing is interpolated, so the table only ever holds measured values.
+"""
+
+import numpy as np
+import pandas as pd
+
+Z_COLUMN = "z (cm)"
+
+def profile_depths(SD, step):
+    """Depths from 0 to SD (excluded) every `step` cm, none while either is unset."""
+    if not SD or step is None or not np.isfinite(step) or step <= 0:
+        return np.empty(0)
+    return np.arange(0, SD, step, dtype=float)
+
+def measured_points(table):
+    """(depths, values) of the rows of a profile table holding a value at a known depth."""
+    if table is None or len(table) == 0 or Z_COLUMN not in table.columns or len(table.columns) < 2:
+        return np.empty(0), np.empty(0)
+    z = pd.to_numeric(table[Z_COLUMN], errors="coerce").to_numpy(dtype=float)
+    value_column = next(c for c in table.columns if c != Z_COLUMN)
+    values = pd.to_numeric(table[value_column], errors="coerce").to_numpy(dtype=float)
+    keep = np.isfinite(z) & np.isfinite(values)
+    return z[keep], values[keep]
+
+def resample_profile(table, depths, name_col, convert=None):
+    """Profile table on `depths` plus the depths already measured in `table`.
+
+    `convert` maps the measured values to the unit of `name_col` when it
+    changed. A depth measured twice keeps its last value.
+    """
+    z_measured, values = measured_points(table)
+    if convert is not None and len(values):
+        values = np.asarray(convert(values), dtype=float)
+    z = np.union1d(depths, z_measured)
+    column = np.full(len(z), np.nan)
+    column[np.searchsorted(z, z_measured)] = values
+    return pd.DataFrame({Z_COLUMN: z, name_col: column})
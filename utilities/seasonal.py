@@ -0,0 +1,257 @@
+"""
+Season-long stratigraphy of a site.
+
+Every pit of a site and season is rasterized once into a fixed depth grid
+(one column per pit): grain type codes, and temperature and LWC profiles
+interpolated along depth. The grid is kept in memory and only the columns
+of a day written by the app, or changed on disk, are rebuilt. Daily fields
+for plotting are then gathered from these columns in a few array
+operations.
+"""
+
+import threading
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from utilities.cache import file_signature
+from utilities.constants import IACS_GRAINS
+from utilities.model import GRAIN_CODES, Snowpit
+from utilities.storage import add_write_listener, list_days, load_snowpit_models, open_store
+
+NO_SNOW = 255  # grain code of the cells above the snow surface
+
+DEFAULT_DZ = 1.0  # depth resolution of the grid (cm)
+
+# ============================================================
+# %% Pit rasterization
+# ============================================================
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _grain_column(pit: Snowpit, z):
+    """Grain code of the layer holding each depth `z`, NO_SNOW outside every layer."""
+    codes = np.full(z.size, NO_SNOW, dtype=np.uint8)
+    if not len(pit):
+        return codes
+    bottom, top, _ = pit.numbers("layers").T
+    grain = pit.grain_codes
+    # Missing or unknown grains are drawn as not measured
+    grain = np.where(grain < len(IACS_GRAINS), grain, GRAIN_CODES["Not measured"]).astype(np.uint8)
+    keep = np.flatnonzero(bottom < top)
+    keep = keep[np.argsort(bottom[keep], kind="stable")]
+    i = np.searchsorted(bottom[keep], z, side="right") - 1
+    inside = (i >= 0) & (z < top[keep][np.clip(i, 0, None)])
+    codes[inside] = grain[keep][i[inside]]
+    return codes
+
+def _profile_column(z_points, values, z, SD):
+    """Profile linearly interpolated at depths `z`, NaN above SD and outside the measures."""
+    ok = ~np.isnan(z_points) & ~np.isnan(values)
+    z_points, values = z_points[ok], values[ok]
+    column = np.full(z.size, np.nan, dtype=np.float32)
+    if z_points.size == 0:
+        return column
+    order = np.argsort(z_points, kind="stable")
+    z_points, values = z_points[order], values[order]
+    inside = (z >= z_points[0]) & (z <= z_points[-1]) & (z <= SD)
+    column[inside] = np.interp(z[inside], z_points, values)
+    return column
+
+def rasterize_snowpit(pit, z: np.ndarray):
+    """(grain codes, temperature (K), LWC (%)) columns of one pit (Snowpit or stored dict) on depths `z`."""
+    pit = Snowpit.coerce(pit)
+    SD = _number(pit.SD or 0)
+
+    # The air temperature closes the profile at the surface, as in the single plot
+    temp = pit.numbers("temperature")
+    z_temp = np.append(temp[:, 0], SD)
+    T = np.append(temp[:, 1], _number(pit.air_T) if len(temp) else np.nan)
+    lwc = pit.numbers("lwc")
+    return (
+        _grain_column(pit, z),
+        _profile_column(z_temp, T, z, SD),
+        _profile_column(lwc[:, 0], lwc[:, 1], z, SD),
+    )
+
+# ============================================================
+# %% Season grid
+# ============================================================
+
+def _day_of(path: Path):
+    return date.fromisoformat(Path(path).stem[len("snowpits_"):])
+
+class SeasonGrid:
+    """Rasterized pits of one clean_data folder, rebuilt day by day.
+
+    Columns grow with the deepest pit seen; `version` changes whenever a
+    column does, so renderings can be cached on it.
+    """
+
+    def __init__(self, data_dir: Path, dz=DEFAULT_DZ):
+        self.data_dir = Path(data_dir)
+        self.dz = dz
+        self.version = 0
+        self._days = {}  # day -> list of (pit id, SD, codes, temperature, lwc)
+        self._signatures = {}  # day -> signature of its backing file
+        self._stacked = None
+        self._lock = threading.RLock()
+
+    def _depths(self, SD):
+        n = int(np.ceil(max(SD, 0) / self.dz))
+        return (np.arange(n) + 0.5) * self.dz
+
+    def _rasterize_day(self, snowpits):
+        columns = []
+        for pit in map(Snowpit.coerce, snowpits):
+            SD = _number(pit.SD or 0)
+            columns.append((pit.id, SD, *rasterize_snowpit(pit, self._depths(SD))))
+        return columns
+
+    def update_day(self, path: Path, snowpits: list):
+        """Replace the columns of one day (called with the full day after each write)."""
+        day = _day_of(path)
+        backing = open_store(path).backing_path
+        with self._lock:
+            if snowpits:
+                self._days[day] = self._rasterize_day(snowpits)
+            else:
+                self._days.pop(day, None)
+            # Days sharing the written file (one database per season) are up to date too
+            signature = file_signature(backing)
+            for other in list(self._signatures):
+                if self._backing(other) == backing:
+                    self._signatures[other] = signature
+            self._signatures[day] = signature
+            self._changed()
+
+    def _backing(self, day):
+        return open_store(self.data_dir / f"snowpits_{day}.json").backing_path
+
+    def refresh(self):
+        """Rebuild the columns of the days added, removed or changed on disk since last time."""
+        with self._lock:
+            paths = {_day_of(p): p for p in list_days(self.data_dir)}
+            changed = False
+            for day in set(self._days) - set(paths):
+                del self._days[day]
+                self._signatures.pop(day, None)
+                changed = True
+            for day, path in paths.items():
+                signature = file_signature(open_store(path).backing_path)
+                if self._signatures.get(day) == signature:
+                    continue
+                snowpits = load_snowpit_models(path)
+                if snowpits:
+                    self._days[day] = self._rasterize_day(snowpits)
+                else:
+                    self._days.pop(day, None)
+                self._signatures[day] = signature
+                changed = True
+            if changed:
+                self._changed()
+        return self
+
+    def _changed(self):
+        self.version += 1
+        self._stacked = None
+
+    def columns(self):
+        """One row per pit in date then file order.
+
+        Returns a dict with `dates` (datetime64[D]), `ids`, `SD`, `z` (cell
+        centers, cm) and the `grain` (uint8), `temperature` (K) and `lwc` (%)
+        arrays of shape (pits, depths).
+        """
+        with self._lock:
+            if self._stacked is not None:
+                return self._stacked
+            entries = [(day, col) for day in sorted(self._days) for col in self._days[day]]
+            SD = np.array([col[1] for _, col in entries], dtype=float)
+            z = self._depths(SD.max() if SD.size else 0)
+            n = len(entries)
+            grain = np.full((n, z.size), NO_SNOW, dtype=np.uint8)
+            temperature = np.full((n, z.size), np.nan, dtype=np.float32)
+            lwc = np.full((n, z.size), np.nan, dtype=np.float32)
+            for i, (_, (_, _, codes, T, L)) in enumerate(entries):
+                grain[i, :codes.size] = codes
+                temperature[i, :T.size] = T
+                lwc[i, :L.size] = L
+            self._stacked = {
+                "dates": np.array([day for day, _ in entries], dtype="datetime64[D]"),
+                "ids": [col[0] for _, col in entries],
+                "SD": SD,
+                "z": z,
+                "grain": grain,
+                "temperature": temperature,
+                "lwc": lwc,
+            }
+            return self._stacked
+
+    def daily(self):
+        """Fields on a daily axis from the first to the last pit of the season.
+
+        Several pits of the same day are represented by the last one. Grain
+        types hold until the next pit; temperature and LWC are linearly
+        interpolated in time between consecutive pits (NaN where either one
+        has no value). Arrays are (days, depths).
+        """
+        cols = self.columns()
+        dates = cols["dates"]
+        if dates.size == 0:
+            return None
+        # Last pit of each day
+        last = np.flatnonzero(np.append(dates[1:] != dates[:-1], True))
+        pit_days = dates[last]
+        days = np.arange(pit_days[0], pit_days[-1] + 1)
+
+        before = np.searchsorted(pit_days, days, side="right") - 1
+        after = np.minimum(before + 1, pit_days.size - 1)
+        span = (pit_days[after] - pit_days[before]).astype(float)
+        w = np.divide(
+            (days - pit_days[before]).astype(float), span,
+            out=np.zeros(days.size), where=span > 0,
+        )[:, None].astype(np.float32)
+
+        def blend(field):
+            field = field[last]
+            return (1 - w) * field[before] + w * field[after]
+
+        return {
+            "days": days,
+            "z": cols["z"],
+            "pit_days": pit_days,
+            "grain": cols["grain"][last][before],
+            "temperature": blend(cols["temperature"]),
+            "lwc": blend(cols["lwc"]),
+        }
+
+# ============================================================
+# %% Grids of the server
+# ============================================================
+
+_grids = {}
+_grids_lock = threading.Lock()
+
+def season_grid(base_dir: Path, site, season, dz=DEFAULT_DZ):
+    """Up-to-date grid of a site and season, built once per server process."""
+    data_dir = Path(base_dir) / site / season / "clean_data"
+    key = (str(data_dir), dz)
+    with _grids_lock:
+        grid = _grids.get(key)
+        if grid is None:
+            grid = _grids[key] = SeasonGrid(data_dir, dz)
+    return grid.refresh()
+
+def _update_grids(path: Path, snowpits: list):
+    with _grids_lock:
+        grids = [g for g in _grids.values() if g.data_dir == Path(path).parent]
+    for grid in grids:
+        grid.update_day(path, snowpits)
+
+add_write_listener(_update_grids)
@@ -0,0 +1,1167 @@
+"""
+Snow pit storage backends.
+
+A day of snow pits is always addressed by its historical path
+`{site}/{season}/clean_data/snowpits_{date}.json`; the backend decides how
+the pits behind that path are actually stored. With the `json` backend
+the day file of a site may be compact or gzip / xz compressed, see
+`set_site_compression`; every reader accepts all of them.
+"""
+
+import gzip
+import json
+import logging
+import lzma
+import os
+import secrets
+import sqlite3
+import stat
+import threading
+import time
+import zipfile
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from utilities.cache import FileCache
+from utilities.constants import COMPRESSION_FORMATS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_log = logging.getLogger(__name__)
+
+SQLITE_DB_NAME = "snowpits.sqlite"
+# PRAGMA user_version of the database layout, older databases are migrated on open
+SQLITE_SCHEMA_VERSION = 1
+SEASON_ARCHIVE = "season.zip"
+ARCHIVE_INDEX = "index.json"
+LOCK_TIMEOUT = 30.0
+
+# A JSON Lines log is compacted once it holds more superseded records than
+# this, and more than it holds live pits
+COMPACT_MIN_RECORDS = 64
+
+# Per site settings, in the site folder so they follow the data
+SITE_SETTINGS = "storage.json"
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "lzma": ".xz"}
+JSON_SUFFIXES = (".json", ".json.gz", ".json.xz")
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+
+# ============================================================
+# %% Locking and atomic writes
+# ============================================================
+
+@contextmanager
+def file_lock(path: Path, timeout=LOCK_TIMEOUT, shared=False):
+    """Exclusive inter-process lock on `path`, held through a sidecar `.lock` file.
+
+    A `shared` lock only excludes the exclusive ones (on Windows, where
+    msvcrt has no shared lock, it is exclusive too).
+    """
+    lock_path = Path(path).with_name(Path(path).name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    with open(lock_path, "a+b") as lock_file:
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Could not lock {path} within {timeout} s")
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _create_temp(path: Path):
+    """New temp file next to `path`, with the mode a plain open() would give it (0o666 less the umask)."""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp_name = str(path.with_name(f".{path.name}.{secrets.token_hex(6)}.tmp"))
+        try:
+            return os.open(tmp_name, flags, 0o666), tmp_name
+        except FileExistsError:
+            continue
+
+def atomic_write(path: Path, write, mode="w"):
+    """Call `write(f)` on a temp file next to `path`, fsync it, then rename it over `path`.
+
+    Readers see either the old or the new file, never a truncated one. The
+    file keeps the mode of the one it replaces, a new file gets the mode of
+    a plain open() (mkstemp would make it private).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = _create_temp(path)
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_name, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def atomic_write_json(path: Path, obj, **dump_kwargs):
+    """Atomically write `obj` as JSON to `path` (see `atomic_write`)."""
+    atomic_write(path, lambda f: json.dump(obj, f, **dump_kwargs))
+
+# ============================================================
+# %% Compression
+# ============================================================
+
+def load_json(f):
+    """JSON document of a binary file object, gzip or xz compressed or not (told by its first bytes)."""
+    data = f.read()
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    elif data[:6] == XZ_MAGIC:
+        data = lzma.decompress(data)
+    return json.loads(data)
+
+def read_json_file(path: Path):
+    with open(path, "rb") as f:
+        return load_json(f)
+
+def write_json_file(path: Path, obj, compression="none"):
+    """Atomically write `obj` to `path`: indented ("none"), compact, or compact and compressed."""
+    if compression == "none":
+        atomic_write_json(path, obj, indent=2)
+        return
+    data = json.dumps(obj, separators=(",", ":")).encode()
+    if compression == "gzip":
+        data = gzip.compress(data, compresslevel=6, mtime=0)
+    elif compression == "lzma":
+        data = lzma.compress(data)
+    atomic_write(path, lambda f: f.write(data), mode="wb")
+
+def _compression_of_name(name):
+    return next((c for c, suffix in COMPRESSED_SUFFIXES.items() if name.endswith(suffix)), "none")
+
+def _day_file_variants(path: Path):
+    """The day file itself and its compressed versions."""
+    path = Path(path)
+    return [path] + [path.with_name(path.name + suffix) for suffix in COMPRESSED_SUFFIXES.values()]
+
+def day_file(path: Path):
+    """File holding the day at `path` (compressed or not), None if there is none.
+
+    Should a crash leave two versions, the last written one wins.
+    """
+    found = []
+    for variant in _day_file_variants(path):
+        try:
+            found.append((variant.stat().st_mtime_ns, variant))
+        except FileNotFoundError:
+            pass
+    return max(found)[1] if found else None
+
+def _day_names(data_dir: Path):
+    """Names of the days with a day file in `data_dir`, compressed or not."""
+    names = set()
+    for p in Path(data_dir).glob("snowpits_*.json*"):
+        name = p.name
+        compression = _compression_of_name(name)
+        if compression != "none":
+            name = name[:-len(COMPRESSED_SUFFIXES[compression])]
+        if name.endswith(".json"):
+            names.add(name)
+    return names
+
+def _read_settings(settings_path: Path):
+    if not Path(settings_path).exists():
+        return {}
+    with open(settings_path) as f:
+        return json.load(f)
+
+_settings_cache = FileCache(maxsize=64)
+
+def site_compression(site_dir: Path):
+    """Compression of the day files of a site ("none" unless set)."""
+    return _settings_cache.load(Path(site_dir) / SITE_SETTINGS, _read_settings).get("compression", "none")
+
+def set_site_compression(site_dir: Path, compression):
+    """Store the day files of a site with `compression`; existing files follow on their next write
+    (or right away with `recompress_site`)."""
+    if compression not in COMPRESSION_FORMATS:
+        raise ValueError(f"Unknown compression: {compression}")
+    settings_path = Path(site_dir) / SITE_SETTINGS
+    settings = dict(_read_settings(settings_path), compression=compression)
+    atomic_write_json(settings_path, settings, indent=2)
+    _settings_cache.invalidate(settings_path)
+
+def _compression_of_day(path: Path):
+    path = Path(path)
+    # {site}/{season}/clean_data/snowpits_{date}.json
+    return site_compression(path.parents[2]) if len(path.parents) > 3 else "none"
+
+# ============================================================
+# %% Group commit
+# ============================================================
+
+class _Op:
+    """One pending upsert, patch or delete, completed by whichever writer commits its batch."""
+
+    __slots__ = ("kind", "arg", "result", "error", "done")
+
+    def __init__(self, kind, arg):
+        self.kind = kind
+        self.arg = arg
+        self.result = None
+        self.error = None
+        self.done = False
+
+
+_pending = {}
+_path_locks = {}
+_pending_guard = threading.Lock()
+_write_listeners = []
+
+def add_write_listener(listener):
+    """Call `listener(path, snowpits)` with the full day after every committed write."""
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+def _notify_write(path, snowpits):
+    # The write is committed: a failing listener (an index lagging behind)
+    # must neither fail the save nor keep the next listeners from running
+    for listener in _write_listeners:
+        try:
+            listener(Path(path), snowpits)
+        except Exception:
+            _log.exception("Write listener %r failed on %s", listener, path)
+
+def _commit(store, *ops: _Op):
+    """Queue `ops` for `store` and make sure they are committed before returning their results.
+
+    Concurrent writers of the same day queue their operations; the first one
+    to get the lock applies the whole queue in a single locked read-merge-write,
+    so nobody's pit is lost and N writers cost one rewrite instead of N.
+    """
+    key = (store.name, str(store.path.resolve()))
+    with _pending_guard:
+        _pending.setdefault(key, []).extend(ops)
+        path_lock = _path_locks.setdefault(key, threading.Lock())
+
+    with path_lock:
+        # Queued together, the ops are always committed in the same batch
+        if not ops[0].done:
+            with _pending_guard:
+                batch = _pending.pop(key, [])
+            try:
+                with _open_season(store.path.parent):
+                    snowpits = store._apply_batch(batch)
+            except BaseException as e:
+                snowpits = None
+                for o in batch:
+                    o.error = e
+            for o in batch:
+                o.done = True
+            _day_cache.invalidate(store.path)
+            _model_cache.invalidate(store.path)
+            if snowpits is not None:
+                _notify_write(store.path, snowpits)
+
+    for op in ops:
+        if op.error is not None:
+            raise op.error
+    return [op.result for op in ops]
+
+# ============================================================
+# %% Backends
+# ============================================================
+
+class JSONStore:
+    """Historical layout: one JSON list per day file, compressed as set for the site."""
+
+    name = "json"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def exists(self):
+        return day_file(self.path) is not None
+
+    @property
+    def backing_path(self):
+        return day_file(self.path) or self.path
+
+    @staticmethod
+    def list_days(data_dir: Path):
+        return [Path(data_dir) / day for day in sorted(_day_names(data_dir))]
+
+    def load(self):
+        found = day_file(self.path)
+        return read_json_file(found) if found is not None else []
+
+    def get(self, snowpit_id):
+        return next((sp for sp in self.load() if sp.get("id") == snowpit_id), None)
+
+    def _apply_batch(self, ops):
+        with file_lock(self.path):
+            # Re-read under the lock so writes from other processes are merged
+            database = self.load()
+            index = {sp.get("id"): i for i, sp in enumerate(database)}
+            changed = False
+
+            for op in ops:
+                if op.kind == "upsert":
+                    snowpit_id = op.arg["id"]
+                    if snowpit_id in index:
+                        database[index[snowpit_id]] = op.arg
+                        op.result = "updated"
+                    else:
+                        index[snowpit_id] = len(database)
+                        database.append(op.arg)
+                        op.result = "created"
+                    changed = True
+                elif op.kind == "patch":
+                    snowpit_id, fields = op.arg
+                    if snowpit_id in index:
+                        i = index[snowpit_id]
+                        database[i] = {**database[i], **fields}
+                        op.result = "updated"
+                        changed = True
+                else:
+                    if op.arg in index:
+                        database = [sp for sp in database if sp.get("id") != op.arg]
+                        index = {sp.get("id"): i for i, sp in enumerate(database)}
+                        changed = True
+                    op.result = len(database)
+
+            if not changed:
+                return None
+            written = None
+            if database:
+                compression = _compression_of_day(self.path)
+                written = self.path.with_name(self.path.name + COMPRESSED_SUFFIXES.get(compression, ""))
+                write_json_file(written, database, compression)
+            for variant in _day_file_variants(self.path):
+                if variant != written and variant.exists():
+                    variant.unlink()
+        return database
+
+    def upsert(self, snowpit: dict):
+        return _commit(self, _Op("upsert", snowpit))[0]
+
+    def upsert_many(self, snowpits):
+        return _commit(self, *[_Op("upsert", sp) for sp in snowpits])
+
+    def update(self, snowpit_id, fields: dict):
+        return _commit(self, _Op("patch", (snowpit_id, fields)))[0]
+
+    def delete(self, snowpit_id):
+        return _commit(self, _Op("delete", snowpit_id))[0]
+
+
+class SQLiteStore:
+    """Indexed layout: one SQLite database per clean_data folder, one row per pit.
+
+    Upsert and delete go through the primary key on the day and the pit id,
+    so only the touched pit is serialized; as in the day files, pits of
+    different days may share an id. Day files already on disk are imported the
+    first time their day is accessed.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.day = self.path.name
+        self.db_path = self.path.parent / SQLITE_DB_NAME
+
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        con = sqlite3.connect(self.db_path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        if con.execute("PRAGMA user_version").fetchone()[0] < SQLITE_SCHEMA_VERSION:
+            self._create_schema(con)
+        return con
+
+    @staticmethod
+    def _create_schema(con):
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if con.execute("PRAGMA user_version").fetchone()[0] < SQLITE_SCHEMA_VERSION:
+                # Version 0 keyed the pits on their id alone
+                if con.execute("SELECT 1 FROM sqlite_master WHERE name='snowpits'").fetchone():
+                    con.execute("DROP INDEX IF EXISTS snowpits_day")
+                    con.execute("ALTER TABLE snowpits RENAME TO snowpits_v0")
+                con.execute(
+                    """
+                    CREATE TABLE snowpits (
+                        day TEXT NOT NULL,
+                        id TEXT NOT NULL,
+                        position INTEGER NOT NULL,
+                        payload TEXT NOT NULL,
+                        PRIMARY KEY (day, id)
+                    )
+                    """
+                )
+                con.execute("CREATE INDEX snowpits_day ON snowpits(day, position)")
+                con.execute("CREATE TABLE IF NOT EXISTS days (day TEXT PRIMARY KEY)")
+                if con.execute("SELECT 1 FROM sqlite_master WHERE name='snowpits_v0'").fetchone():
+                    con.execute(
+                        "INSERT INTO snowpits(day, id, position, payload) "
+                        "SELECT day, id, position, payload FROM snowpits_v0"
+                    )
+                    con.execute("DROP TABLE snowpits_v0")
+                con.execute(f"PRAGMA user_version={SQLITE_SCHEMA_VERSION}")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    @contextmanager
+    def _transaction(self, write=True):
+        with closing(self._connect()) as con:
+            if not write and not con.execute(
+                "SELECT 1 FROM days WHERE day=?", (self.day,)
+            ).fetchone():
+                # First access of the day: the legacy import needs the write lock
+                write = True
+            con.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                self._import_legacy(con)
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+
+    def _import_legacy(self, con):
+        """Import the JSON day file once, the first time the day is touched."""
+        if con.execute("SELECT 1 FROM days WHERE day=?", (self.day,)).fetchone():
+            return
+        legacy_file = day_file(self.path)
+        if legacy_file is not None:
+            legacy = read_json_file(legacy_file)
+            con.executemany(
+                "INSERT OR IGNORE INTO snowpits(day, id, position, payload) VALUES (?, ?, ?, ?)",
+                [(self.day, sp["id"], i, json.dumps(sp)) for i, sp in enumerate(legacy)]
+            )
+        con.execute("INSERT INTO days(day) VALUES (?)", (self.day,))
+
+    @property
+    def backing_path(self):
+        return self.db_path if self.db_path.exists() else JSONStore(self.path).backing_path
+
+    @staticmethod
+    def list_days(data_dir: Path):
+        data_dir = Path(data_dir)
+        days = _day_names(data_dir)
+        db_path = data_dir / SQLITE_DB_NAME
+        if db_path.exists():
+            with closing(sqlite3.connect(db_path, timeout=LOCK_TIMEOUT)) as con:
+                imported = {day for (day,) in con.execute("SELECT day FROM days")}
+                stored = {day for (day,) in con.execute("SELECT DISTINCT day FROM snowpits")}
+            # Imported day files that were emptied afterwards are not days anymore
+            days = (days - imported) | stored
+        return [data_dir / day for day in sorted(days)]
+
+    def exists(self):
+        if not self.db_path.exists():
+            return JSONStore(self.path).exists()
+        with self._transaction(write=False) as con:
+            return con.execute(
+                "SELECT 1 FROM snowpits WHERE day=? LIMIT 1", (self.day,)
+            ).fetchone() is not None
+
+    def load(self):
+        if not self.db_path.exists() and not JSONStore(self.path).exists():
+            return []
+        with self._transaction(write=False) as con:
+            rows = con.execute(
+                "SELECT payload FROM snowpits WHERE day=? ORDER BY position", (self.day,)
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def get(self, snowpit_id):
+        if not self.db_path.exists() and not JSONStore(self.path).exists():
+            return None
+        with self._transaction(write=False) as con:
+            row = con.execute(
+                "SELECT payload FROM snowpits WHERE id=? AND day=?", (snowpit_id, self.day)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _upsert(self, con, snowpit):
+        payload = json.dumps(snowpit)
+        if con.execute(
+            "UPDATE snowpits SET payload=? WHERE day=? AND id=?", (payload, self.day, snowpit["id"])
+        ).rowcount:
+            return "updated"
+
+        # New pit for this day: append at the end
+        (position,) = con.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM snowpits WHERE day=?", (self.day,)
+        ).fetchone()
+        con.execute(
+            "INSERT INTO snowpits(day, id, position, payload) VALUES (?, ?, ?, ?)",
+            (self.day, snowpit["id"], position, payload)
+        )
+        return "created"
+
+    def _patch(self, con, snowpit_id, fields):
+        row = con.execute(
+            "SELECT payload FROM snowpits WHERE id=? AND day=?", (snowpit_id, self.day)
+        ).fetchone()
+        if row is None:
+            return None
+        payload = json.dumps({**json.loads(row[0]), **fields})
+        con.execute("UPDATE snowpits SET payload=? WHERE day=? AND id=?", (payload, self.day, snowpit_id))
+        return "updated"
+
+    def _delete(self, con, snowpit_id):
+        con.execute("DELETE FROM snowpits WHERE id=? AND day=?", (snowpit_id, self.day))
+        (remaining,) = con.execute(
+            "SELECT COUNT(*) FROM snowpits WHERE day=?", (self.day,)
+        ).fetchone()
+        return remaining
+
+    def _apply_batch(self, ops):
+        with self._transaction() as con:
+            for op in ops:
+                if op.kind == "upsert":
+                    op.result = self._upsert(con, op.arg)
+                elif op.kind == "patch":
+                    op.result = self._patch(con, *op.arg)
+                else:
+                    op.result = self._delete(con, op.arg)
+            if not _write_listeners:
+                return None
+            rows = con.execute(
+                "SELECT payload FROM snowpits WHERE day=? ORDER BY position", (self.day,)
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def upsert(self, snowpit: dict):
+        return _commit(self, _Op("upsert", snowpit))[0]
+
+    def upsert_many(self, snowpits):
+        return _commit(self, *[_Op("upsert", sp) for sp in snowpits])
+
+    def update(self, snowpit_id, fields: dict):
+        return _commit(self, _Op("patch", (snowpit_id, fields)))[0]
+
+    def delete(self, snowpit_id):
+        return _commit(self, _Op("delete", snowpit_id))[0]
+
+
+def _log_line(record):
+    return json.dumps(record) + "\n"
+
+def _replay_log(log_path: Path):
+    """(pits by id, number of records, end of the last complete line) of a log.
+
+    The log is read line by line; a partial last line, left by a writer
+    that crashed mid-append, is ignored (and cut by the next write).
+    """
+    pits, n, end = {}, 0, 0
+    with open(log_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            record = json.loads(line)
+            if "put" in record:
+                pits[record["put"].get("id")] = record["put"]
+            elif "patch" in record:
+                snowpit_id = record["patch"]
+                if snowpit_id in pits:
+                    pits[snowpit_id] = {**pits[snowpit_id], **record["fields"]}
+            else:
+                pits.pop(record["delete"], None)
+            n += 1
+            end += len(line)
+    return pits, n, end
+
+# Replayed logs, so appending to a day does not read it again
+_log_cache = FileCache(maxsize=256)
+_compacting = set()
+_compacting_guard = threading.Lock()
+
+
+class JSONLStore:
+    """Append-only layout: one JSON Lines log per day, next to the historical day file.
+
+    An upsert appends `{"put": pit}`, an update of some fields
+    `{"patch": id, "fields": {...}}`, a delete a `{"delete": id}` tombstone,
+    and readers keep the latest record of each id, so a write costs the size
+    of the pit rather than of the day. Logs are compacted in a background
+    thread once mostly superseded, or on demand with `compact()`. The
+    historical day file is copied into the log on the first write of its day.
+    """
+
+    name = "jsonl"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix(".jsonl")
+
+    @property
+    def backing_path(self):
+        return self.log_path if self.log_path.exists() else JSONStore(self.path).backing_path
+
+    @staticmethod
+    def list_days(data_dir: Path):
+        data_dir = Path(data_dir)
+        days = _day_names(data_dir)
+        for log_path in data_dir.glob("snowpits_*.jsonl"):
+            # An empty log is a day emptied by deletes
+            if log_path.stat().st_size:
+                days.add(log_path.with_suffix(".json").name)
+            else:
+                days.discard(log_path.with_suffix(".json").name)
+        return [data_dir / day for day in sorted(days)]
+
+    def _state(self):
+        return _log_cache.load(self.log_path, _replay_log)
+
+    def _pits(self):
+        if self.log_path.exists():
+            return self._state()[0]
+        return {sp.get("id"): sp for sp in JSONStore(self.path).load()}
+
+    def exists(self):
+        if self.log_path.exists():
+            return bool(self._state()[0])
+        return JSONStore(self.path).exists()
+
+    def load(self):
+        return list(self._pits().values())
+
+    def get(self, snowpit_id):
+        return self._pits().get(snowpit_id)
+
+    def _rewrite(self, pits):
+        """Replace the log by one record per live pit, an empty log if none."""
+        atomic_write(self.log_path, lambda f: f.writelines(_log_line({"put": sp}) for sp in pits.values()))
+        _log_cache.load(self.log_path, lambda _: (pits, len(pits), self.log_path.stat().st_size))
+
+    def _apply_batch(self, ops):
+        with file_lock(self.path):
+            legacy = not self.log_path.exists()
+            if legacy:
+                pits, n, end = self._pits(), 0, 0
+            else:
+                pits, n, end = self._state()
+                pits = dict(pits)
+
+            lines = []
+            for op in ops:
+                if op.kind == "upsert":
+                    snowpit_id = op.arg["id"]
+                    op.result = "updated" if snowpit_id in pits else "created"
+                    pits[snowpit_id] = op.arg
+                    lines.append(_log_line({"put": op.arg}))
+                elif op.kind == "patch":
+                    snowpit_id, fields = op.arg
+                    if snowpit_id in pits:
+                        pits[snowpit_id] = {**pits[snowpit_id], **fields}
+                        lines.append(_log_line({"patch": snowpit_id, "fields": fields}))
+                        op.result = "updated"
+                else:
+                    if op.arg in pits:
+                        del pits[op.arg]
+                        lines.append(_log_line({"delete": op.arg}))
+                    op.result = len(pits)
+
+            if not lines:
+                return None
+            if legacy or not pits:
+                self._rewrite(pits)
+            else:
+                data = "".join(lines).encode()
+                with open(self.log_path, "r+b") as f:
+                    f.truncate(end)  # drops a torn last line, if any
+                    f.seek(end)
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                n += len(lines)
+                _log_cache.load(self.log_path, lambda _: (pits, n, end + len(data)))
+                if n - len(pits) > max(COMPACT_MIN_RECORDS, len(pits)):
+                    self._compact_in_background()
+        return list(pits.values())
+
+    def compact(self):
+        """Rewrite the log without its superseded records, returns whether it changed."""
+        with _open_season(self.path.parent), file_lock(self.path):
+            if not self.log_path.exists():
+                return False
+            pits, n, end = self._state()
+            if n == len(pits) and end == self.log_path.stat().st_size:
+                return False
+            self._rewrite(dict(pits))
+        return True
+
+    def _compact_in_background(self):
+        key = str(self.path.resolve())
+        with _compacting_guard:
+            if key in _compacting:
+                return
+            _compacting.add(key)
+
+        def run():
+            try:
+                self.compact()
+            except (OSError, TimeoutError):
+                pass  # retried after a later write
+            finally:
+                with _compacting_guard:
+                    _compacting.discard(key)
+
+        threading.Thread(target=run, name=f"compact {self.path.name}", daemon=True).start()
+
+    def upsert(self, snowpit: dict):
+        return _commit(self, _Op("upsert", snowpit))[0]
+
+    def upsert_many(self, snowpits):
+        return _commit(self, *[_Op("upsert", sp) for sp in snowpits])
+
+    def update(self, snowpit_id, fields: dict):
+        return _commit(self, _Op("patch", (snowpit_id, fields)))[0]
+
+    def delete(self, snowpit_id):
+        return _commit(self, _Op("delete", snowpit_id))[0]
+
+
+class SealedSeasonError(PermissionError):
+    """Write to a day of a season sealed into its archive."""
+
+
+class MixedStorageError(ValueError):
+    """A clean_data folder holds the files of several backends."""
+
+
+class SeasonArchive:
+    """A sealed season: one zip holding a compressed JSON member per day and an index.
+
+    The index maps every pit id to its day, so a pit is read by id or by
+    date without scanning the season.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._zip = zipfile.ZipFile(self.path)
+        self._lock = threading.Lock()
+        self.index = json.loads(self._read(ARCHIVE_INDEX))
+
+    def _read(self, name):
+        # Reopened if closed meanwhile (evicted while a reader still held it)
+        with self._lock:
+            if self._zip is None:
+                self._zip = zipfile.ZipFile(self.path)
+            return self._zip.read(name)
+
+    @property
+    def days(self):
+        return self.index["days"]
+
+    def load_day(self, day):
+        if day not in self.index["days"]:
+            return []
+        return json.loads(self._read(day))
+
+    def find(self, snowpit_id):
+        """(day, pit) of a pit id, None if it is not in the season."""
+        day = self.index["pits"].get(snowpit_id)
+        if day is None:
+            return None
+        return day, next(sp for sp in self.load_day(day) if sp.get("id") == snowpit_id)
+
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+
+
+# Opened archives, their index parsed once per version, closed once dropped
+_archive_cache = FileCache(maxsize=32, on_evict=SeasonArchive.close)
+
+def open_archive(data_dir: Path):
+    """SeasonArchive of a clean_data folder, None if the season is not sealed."""
+    archive_path = Path(data_dir) / SEASON_ARCHIVE
+    if not archive_path.exists():
+        return None
+    return _archive_cache.load(archive_path, SeasonArchive)
+
+
+class ArchiveStore:
+    """Read-only store of a day of a sealed season, whatever the selected backend."""
+
+    name = "archive"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.archive_path = self.path.parent / SEASON_ARCHIVE
+
+    @property
+    def backing_path(self):
+        return self.archive_path
+
+    @staticmethod
+    def list_days(data_dir: Path):
+        return [Path(data_dir) / day for day in open_archive(data_dir).days]
+
+    def _archive(self):
+        return _archive_cache.load(self.archive_path, SeasonArchive)
+
+    def exists(self):
+        return self.path.name in self._archive().days
+
+    def load(self):
+        return self._archive().load_day(self.path.name)
+
+    def get(self, snowpit_id):
+        found = self._archive().find(snowpit_id)
+        return found[1] if found is not None and found[0] == self.path.name else None
+
+    def _read_only(self):
+        season = self.path.parent.parent.name
+        raise SealedSeasonError(f"Season {season} is sealed: unseal it to change {self.path.name}")
+
+    def upsert(self, snowpit: dict):
+        self._read_only()
+
+    def upsert_many(self, snowpits):
+        self._read_only()
+
+    def update(self, snowpit_id, fields: dict):
+        self._read_only()
+
+    def delete(self, snowpit_id):
+        self._read_only()
+
+
+STORAGE_BACKENDS = {
+    JSONStore.name: JSONStore,
+    SQLiteStore.name: SQLiteStore,
+    JSONLStore.name: JSONLStore,
+}
+
+_storage_backend = JSONStore.name
+
+def set_storage_backend(name):
+    """Select the backend of the clean_data folders not held by another one yet.
+
+    A folder keeps the backend it is stored with, see `folder_backend`, so
+    processes selecting different backends still share one version of a day.
+    """
+    global _storage_backend
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    _storage_backend = name
+
+def get_storage_backend():
+    return _storage_backend
+
+def _sealed(data_dir: Path):
+    return (Path(data_dir) / SEASON_ARCHIVE).exists()
+
+# clean_data folders this thread is sealing or unsealing
+_sealing = threading.local()
+
+@contextmanager
+def _open_season(data_dir: Path):
+    """Hold the seal lock of a folder shared while writing to it, the season being open.
+
+    Sealing and unsealing hold it exclusively from their first read to their
+    last delete, so a write lands before or after them, never in between.
+    """
+    data_dir = Path(data_dir).resolve()
+    if data_dir in getattr(_sealing, "dirs", ()):
+        # The days written back by this thread's unseal
+        yield
+        return
+    with file_lock(data_dir / SEASON_ARCHIVE, shared=True):
+        if _sealed(data_dir):
+            raise SealedSeasonError(f"Season {data_dir.parent.name} is sealed: unseal it to change it")
+        yield
+
+@contextmanager
+def _sealing_season(data_dir: Path):
+    """Exclusive seal lock of a folder, for a seal or an unseal."""
+    data_dir = Path(data_dir).resolve()
+    with file_lock(data_dir / SEASON_ARCHIVE):
+        _sealing.dirs = getattr(_sealing, "dirs", frozenset()) | {data_dir}
+        try:
+            yield
+        finally:
+            _sealing.dirs -= {data_dir}
+
+# Whether a clean_data folder holds day logs, per version of its listing
+_folder_logs_cache = FileCache(maxsize=256)
+
+def _has_day_logs(data_dir: Path):
+    return _folder_logs_cache.load(data_dir, lambda d: next(Path(d).glob("snowpits_*.jsonl"), None) is not None)
+
+def stored_backends(data_dir: Path):
+    """Backends other than `json` with files in a clean_data folder."""
+    data_dir = Path(data_dir)
+    found = []
+    if (data_dir / SQLITE_DB_NAME).exists():
+        found.append(SQLiteStore.name)
+    if _has_day_logs(data_dir):
+        found.append(JSONLStore.name)
+    return found
+
+def folder_backend(data_dir: Path):
+    """Backend of a clean_data folder: the one its pits are stored with, else the selected one.
+
+    The day files of `json` are read by every backend, a database or a day
+    log only by its own.
+    """
+    found = stored_backends(data_dir)
+    return found[0] if found else _storage_backend
+
+def open_store(path: Path, backend=None):
+    """Store of the day at `path`: the archive for a sealed season, else its folder's backend."""
+    data_dir = Path(path).parent
+    if _sealed(data_dir):
+        return ArchiveStore(path)
+    return STORAGE_BACKENDS[backend or folder_backend(data_dir)](path)
+
+# ============================================================
+# %% Snow pit access
+# ============================================================
+
+# Parsed days shared across Streamlit reruns and sessions
+_day_cache = FileCache(maxsize=256)
+
+def _cached_day(path: Path):
+    store = open_store(path)
+
+    def load(_):
+        snowpits = store.load()
+        return snowpits, {sp.get("id"): sp for sp in snowpits}
+
+    return _day_cache.load(store.path, load, stat_path=store.backing_path, tag=store.name)
+
+def snowpits_exist(path: Path):
+    return open_store(path).exists()
+
+def load_snowpits(path: Path):
+    """Snow pits of a day, parsed once per version of the file (do not mutate)."""
+    return _cached_day(path)[0]
+
+# Array-backed pits, several times smaller than the dicts: season-scale
+# readers use these and leave the dict cache to the pages
+_model_cache = FileCache(maxsize=2048)
+
+def load_snowpit_models(path: Path):
+    """Snow pits of a day as Snowpit objects, converted once per version of the file."""
+    from utilities.model import Snowpit  # NumPy, kept off the import of this module
+
+    store = open_store(path)
+    return _model_cache.load(
+        store.path,
+        lambda _: [Snowpit.from_dict(sp) for sp in store.load()],
+        stat_path=store.backing_path,
+        tag=store.name,
+    )
+
+def get_snowpit(path: Path, snowpit_id):
+    return _cached_day(path)[1].get(snowpit_id)
+
+def forget_day(path: Path):
+    """Drop the parsed copies of a day, for a file changed without its size or time changing."""
+    path = open_store(path).path
+    _day_cache.invalidate(path)
+    _model_cache.invalidate(path)
+
+def list_days(data_dir: Path):
+    """Day paths holding snow pits in a clean_data folder, whatever the backend."""
+    if _sealed(data_dir):
+        return ArchiveStore.list_days(data_dir)
+    return STORAGE_BACKENDS[folder_backend(data_dir)].list_days(data_dir)
+
+def save_or_update_snowpit(save_path: Path, new_snowpit: dict):
+    return open_store(save_path).upsert(new_snowpit)
+
+def save_snowpits(save_path: Path, snowpits: list):
+    """Upsert several pits of one day in a single write, returns "created" or "updated" for each."""
+    if not snowpits:
+        return []
+    return open_store(save_path).upsert_many(snowpits)
+
+def update_snowpit_fields(path: Path, snowpit_id, fields: dict):
+    """Replace some fields of a stored pit, returns "updated" or None if the pit is not stored.
+
+    Only `fields` are sent to the store: the JSON Lines log appends them
+    alone instead of the whole pit.
+    """
+    if not fields:
+        return "updated" if get_snowpit(path, snowpit_id) is not None else None
+    return open_store(path).update(snowpit_id, fields)
+
+def remove_snowpit(path: Path, snowpit_id):
+    """Remove one snow pit, returns the number of pits left for that day."""
+    return open_store(path).delete(snowpit_id)
+
+def compact_days(data_dir: Path):
+    """Compact the JSON Lines logs of a clean_data folder, returns the number rewritten."""
+    return sum(JSONLStore(path).compact() for path in JSONLStore.list_days(data_dir))
+
+# ============================================================
+# %% JSON import / export
+# ============================================================
+
+def export_snowpits_json(path: Path, out_path: Path = None):
+    """Write the day in the historical JSON layout (defaults to the day path itself).
+
+    An `out_path` ending in .gz or .xz is written compact and compressed.
+    """
+    out_path = Path(out_path or path)
+    write_json_file(out_path, load_snowpits(path), _compression_of_name(out_path.name))
+    return out_path
+
+def import_snowpits_json(json_path: Path, path: Path):
+    """Upsert every pit of a historical JSON day file (compressed or not) into the day at `path`."""
+    return save_snowpits(path, read_json_file(json_path))
+
+def recompress_site(site_dir: Path):
+    """Rewrite the json day files of a site not stored with its compression, returns their number."""
+    compression = site_compression(site_dir)
+    suffix = COMPRESSED_SUFFIXES.get(compression, "")
+    n = 0
+    for data_dir in sorted(Path(site_dir).glob("*/clean_data")):
+        if _sealed(data_dir):
+            continue
+        for path in JSONStore.list_days(data_dir):
+            found = day_file(path)
+            target = path.with_name(path.name + suffix)
+            # "none" and "compact" share the .json name: tell them apart by the indentation
+            if found == target and (suffix or (compression == "none") == _is_indented(found)):
+                continue
+            with _open_season(data_dir), file_lock(path):
+                write_json_file(target, read_json_file(day_file(path)), compression)
+                for variant in _day_file_variants(path):
+                    if variant != target and variant.exists():
+                        variant.unlink()
+            _day_cache.invalidate(path)
+            _model_cache.invalidate(path)
+            n += 1
+    return n
+
+def _is_indented(path: Path):
+    with open(path, "rb") as f:
+        return f.read(2) == b"[\n"
+
+# ============================================================
+# %% Sealed seasons
+# ============================================================
+
+def _day_sources(path: Path):
+    """Every json day file of the day at `path`, with its lock."""
+    sources = _day_file_variants(path)
+    return sources + [p.with_name(p.name + ".lock") for p in sources]
+
+def _backend_files(data_dir: Path, backend):
+    """Files `backend` keeps in a clean_data folder besides the json day files."""
+    if backend == SQLiteStore.name:
+        return [data_dir / name for name in (SQLITE_DB_NAME, SQLITE_DB_NAME + "-wal", SQLITE_DB_NAME + "-shm")]
+    if backend == JSONLStore.name:
+        return list(data_dir.glob("snowpits_*.jsonl"))
+    return []
+
+def seal_season(data_dir: Path):
+    """Pack every day of a clean_data folder into its read-only archive, returns the number of days.
+
+    The days are read through the backend the folder is stored with; the
+    files of that backend are removed once the archive is written and read
+    back. A folder holding both a database and day logs is refused, as
+    either would lose the changes kept in the other.
+    """
+    data_dir = Path(data_dir)
+    archive_path = data_dir / SEASON_ARCHIVE
+    with _sealing_season(data_dir):
+        if archive_path.exists():
+            return 0
+        found = stored_backends(data_dir)
+        if len(found) > 1:
+            raise MixedStorageError(
+                f"{data_dir} holds both {' and '.join(found)} snow pits, copy them into one storage before sealing"
+            )
+        backend = found[0] if found else JSONStore.name
+        days = STORAGE_BACKENDS[backend].list_days(data_dir)
+        contents = {path.name: open_store(path, backend).load() for path in days}
+        index = {
+            "format": 1,
+            "backend": backend,
+            "days": sorted(contents),
+            "pits": {sp.get("id"): day for day, pits in contents.items() for sp in pits},
+        }
+
+        def write(f):
+            with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as archive:
+                archive.writestr(ARCHIVE_INDEX, json.dumps(index))
+                for day in index["days"]:
+                    archive.writestr(day, json.dumps(contents[day], separators=(",", ":")))
+
+        atomic_write(archive_path, write, mode="wb")
+        sealed = SeasonArchive(archive_path)
+        try:
+            read_back = all(sealed.load_day(day) == pits for day, pits in contents.items())
+        finally:
+            sealed.close()
+        if not read_back:
+            archive_path.unlink()
+            raise OSError(f"Could not read back {archive_path}, the season was left as it was")
+
+        # Every backend reads the json day files, including those of days
+        # it emptied since: they all go, with the backend's own files
+        names = _day_names(data_dir) | {path.name for path in days}
+        sources = [source for name in names for source in _day_sources(data_dir / name)]
+        for source in sources + _backend_files(data_dir, backend):
+            if source.exists():
+                source.unlink()
+    _day_cache.invalidate()
+    _model_cache.invalidate()
+    return len(days)
+
+def unseal_season(data_dir: Path, backend=None):
+    """Write the days of a sealed season back, returns their number.
+
+    The days go back to the backend they were sealed from, or to `backend`.
+    """
+    data_dir = Path(data_dir)
+    with _sealing_season(data_dir):
+        archive = open_archive(data_dir)
+        if archive is None:
+            return 0
+        store = STORAGE_BACKENDS[backend or archive.index.get("backend") or _storage_backend]
+        for day in archive.days:
+            # The archive stays the reference until every day is written back
+            store(data_dir / day).upsert_many(archive.load_day(day))
+        _archive_cache.invalidate(archive.path)
+        archive.path.unlink()
+    return len(archive.days)
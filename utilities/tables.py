@@ -0,0 +1,169 @@
+"""
+Tidy tables of the pits of some sites, seasons or dates.
+
+    layers, temperature, lwc = load_tables(base_dir, sites=["Summit"], seasons=["2025-2026"])
+    layers.groupby("grain (IACS)", observed=True)["density (g cm⁻³)"].mean()
+
+One row per layer or profile point, keyed by site, season, date and pit id.
+Grain and hardness are categorical, `hardness code` is HARDNESS_MAP as a
+number. Each day file is converted to Snowpit objects once per version
+(in worker processes when many are new) and every column is then built
+from their arrays in one go.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utilities.cache import FileCache, file_signature
+from utilities.constants import HARDNESS_MAP, IACS_GRAINS, SNOW_HARDNESS
+from utilities.jobs import process_pool
+from utilities.model import Snowpit, stack_columns
+from utilities.storage import get_storage_backend, list_days, open_store, set_storage_backend
+from utilities.tree import find_data_dirs
+
+KEY_COLUMNS = ["site", "season", "date", "id"]
+
+# Fields of each table (see utilities.model)
+FIELDS = {
+    "layers": ["bottom (cm)", "top (cm)", "grain (IACS)", "density (g cm⁻³)", "snow hardness"],
+    "temperature": ["z (cm)", "temperature (K)"],
+    "lwc": ["z (cm)", "LWC (%)"],
+}
+
+GRAIN_DTYPE = pd.CategoricalDtype(IACS_GRAINS)
+HARDNESS_DTYPE = pd.CategoricalDtype(SNOW_HARDNESS, ordered=True)
+_HARDNESS_CODES = np.array([HARDNESS_MAP[h] for h in SNOW_HARDNESS], dtype=np.int8)
+
+# Fewer new days than this are converted in-process, a pool costs more
+PARALLEL_MIN_DAYS = 32
+DAYS_PER_TASK = 16
+
+# ============================================================
+# %% Day files
+# ============================================================
+
+def _load_days(paths, backend):
+    """Worker: Snowpit objects of each day file."""
+    set_storage_backend(backend)
+    return [[Snowpit.from_dict(sp) for sp in open_store(path).load()] for path in paths]
+
+# Snowpit objects of each day, shared across Streamlit sessions
+_day_models = FileCache(maxsize=2048)
+
+def _models_of_days(paths, backend, workers=None):
+    """Snowpit objects of each day file, new ones in a process pool when there are many."""
+    stores = [open_store(path) for path in paths]
+    days = [_day_models.get(s.path, stat_path=s.backing_path, tag=s.name) for s in stores]
+    todo = [i for i, models in enumerate(days) if models is None]
+    if not todo:
+        return days
+
+    new_paths = [paths[i] for i in todo]
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(todo) < PARALLEL_MIN_DAYS:
+        new = _load_days(new_paths, backend)
+    else:
+        chunks = [new_paths[i:i + DAYS_PER_TASK] for i in range(0, len(new_paths), DAYS_PER_TASK)]
+        with process_pool(workers) as pool:
+            new = [models for chunk in pool.map(_load_days, chunks, [backend] * len(chunks)) for models in chunk]
+
+    for i, models in zip(todo, new):
+        store = stores[i]
+        days[i] = _day_models.load(store.path, lambda _: models, stat_path=store.backing_path, tag=store.name)
+    return days
+
+# ============================================================
+# %% Tables
+# ============================================================
+
+def _day_of(path: Path):
+    return date.fromisoformat(Path(path).stem[len("snowpits_"):])
+
+def find_days(base_dir: Path, sites=None, seasons=None, start=None, end=None):
+    """(site, season, day, path) of every day file, optionally between two dates (inclusive)."""
+    found = []
+    for site, season, data_dir in find_data_dirs(base_dir, sites, seasons):
+        for path in list_days(data_dir):
+            day = _day_of(path)
+            if (start is None or day >= start) and (end is None or day <= end):
+                found.append((site, season, day, path))
+    return found
+
+def _numeric(values: np.ndarray):
+    if values.dtype != object:
+        return values.astype(np.float64)
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(np.float64)
+
+def _categorical(values: np.ndarray, dtype):
+    """Values outside the categories (unknown grains, hardness) become missing."""
+    codes = dtype.categories.get_indexer(pd.Index(values, dtype=object))
+    return pd.Categorical.from_codes(codes, dtype=dtype)
+
+def _build_table(table, days, pits, pit_days):
+    columns, sizes = stack_columns(pits, table)
+    row_days = np.repeat(pit_days, sizes)
+
+    def per_day(values, dtype=object):
+        return np.array(values, dtype=dtype)[row_days]
+
+    data = {
+        "site": pd.Categorical(per_day([d[0] for d in days])),
+        "season": pd.Categorical(per_day([d[1] for d in days])),
+        "date": per_day([d[2] for d in days], "datetime64[D]").astype("datetime64[s]"),
+        "id": np.repeat(np.array([pit.id for pit in pits], dtype=object), sizes),
+    }
+    if table == "layers":
+        data["layer"] = (np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)).astype(np.int16)
+
+    for field in FIELDS[table]:
+        values = columns[field]
+        if field == "grain (IACS)":
+            data[field] = _categorical(values, GRAIN_DTYPE)
+        elif field == "snow hardness":
+            hardness = _categorical(values, HARDNESS_DTYPE)
+            codes = hardness.codes
+            data[field] = hardness
+            data["hardness code"] = pd.arrays.IntegerArray(
+                _HARDNESS_CODES[np.maximum(codes, 0)], codes < 0
+            )
+        else:
+            data[field] = _numeric(values)
+    return pd.DataFrame(data)
+
+# Last tables built, keyed on the version of every day file they hold
+_tables_cache = OrderedDict()
+_tables_lock = threading.Lock()
+TABLES_CACHE_SIZE = 8
+
+def load_tables(base_dir: Path, sites=None, seasons=None, start=None, end=None, workers=None):
+    """Layers, temperature and LWC tables of the pits of some sites, seasons and dates.
+
+    `start` and `end` are dates (inclusive), `workers` bounds the processes
+    parsing new day files. The tables are cached until one
+    of their day files changes and are shared: do not mutate them.
+    """
+    backend = get_storage_backend()
+    days = find_days(base_dir, sites, seasons, start, end)
+    stores = [open_store(path) for *_, path in days]
+    key = tuple((str(store.path), store.name, file_signature(store.backing_path)) for store in stores)
+    with _tables_lock:
+        if key in _tables_cache:
+            _tables_cache.move_to_end(key)
+            return _tables_cache[key]
+
+    day_models = _models_of_days([path for *_, path in days], backend, workers)
+    pits = [pit for models in day_models for pit in models]
+    pit_days = np.repeat(np.arange(len(days)), [len(models) for models in day_models])
+    tables = tuple(_build_table(table, days, pits, pit_days) for table in FIELDS)
+
+    with _tables_lock:
+        _tables_cache[key] = tables
+        while len(_tables_cache) > TABLES_CACHE_SIZE:
+            _tables_cache.popitem(last=False)
+    return tables
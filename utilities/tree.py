@@ -0,0 +1,72 @@
+"""
+Site / season folder tree.
+
+    {base_dir}/{site}/{season}/clean_data/snowpits_{date}.json
+    {base_dir}/{site}/{season}/plot/
+
+Seasons run from October to September and are named "2025-2026".
+"""
+
+from datetime import date
+from itertools import product
+from pathlib import Path
+
+from utilities.storage import list_days
+
+DATA_TEMPLATE = "{site}/{season}/clean_data"
+PLOT_TEMPLATE = "{site}/{season}/plot"
+
+def current_season(d):
+    y = d.year
+    return f"{y}-{y+1}" if d.month >= 10 else f"{y-1}-{y}"
+
+def create_file_tree(
+    base_dir: Path,
+    sites: list[str],
+    seasons: list[str],
+    data_template: str,
+    plot_template: str,
+):
+    for site, season in product(sites, seasons):
+        data_path = base_dir / data_template.format(
+            site=site,
+            season=season
+        )
+        plot_path = base_dir / plot_template.format(
+            site=site,
+            season=season
+        )
+
+        data_path.mkdir(parents=True, exist_ok=True)
+        plot_path.mkdir(parents=True, exist_ok=True)
+
+def day_path(base_dir: Path, site, day, season=None):
+    """Path addressing the pits of one site and date."""
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    season = season or current_season(day)
+    return Path(base_dir) / DATA_TEMPLATE.format(site=site, season=season) / f"snowpits_{day}.json"
+
+def plot_dir(base_dir: Path, site, season):
+    return Path(base_dir) / PLOT_TEMPLATE.format(site=site, season=season)
+
+def find_data_dirs(base_dir: Path, sites=None, seasons=None, data_template=DATA_TEMPLATE):
+    """(site, season, clean_data folder) of the tree, optionally restricted to some sites and seasons."""
+    base_dir = Path(base_dir)
+    pattern = data_template.format(site="*", season="*").rstrip("/")
+    found = []
+    for data_dir in sorted(base_dir.glob(pattern)):
+        site, season = data_dir.relative_to(base_dir).parts[:2]
+        if sites and site not in sites:
+            continue
+        if seasons and season not in seasons:
+            continue
+        found.append((site, season, data_dir))
+    return found
+
+def find_day_files(base_dir: Path, sites=None, seasons=None, data_template=DATA_TEMPLATE):
+    """Every day path of the tree, optionally restricted to some sites and seasons."""
+    days = []
+    for _, _, data_dir in find_data_dirs(base_dir, sites, seasons, data_template):
+        days.extend(list_days(data_dir))
+    return days
@@ -0,0 +1,71 @@
+"""
+Temperature unit conversions. Temperatures are always stored in K.
+
+The array functions take a whole Series or ndarray and keep NaN; the scalar
+ones are kept for single values (air temperature, number inputs).
+"""
+
+import numpy as np
+import pandas as pd
+
+# ============================================================
+# %% Array conversions
+# ============================================================
+
+def _is_kelvin(unit):
+    return unit == "K" or unit is None or unit == "None"
+
+def _wrap_like(values, result):
+    if isinstance(values, pd.Series):
+        return pd.Series(result, index=values.index, name=values.name)
+    return result
+
+def K_to_unit_array(values, unit):
+    """Convert temperatures in K to `unit` in one array operation (NaN stays NaN)."""
+    v = np.asarray(values, dtype=float)
+    if _is_kelvin(unit):
+        result = v
+    elif unit == "°C":
+        result = v - 273.15
+    elif unit == "°F":
+        result = (v - 273.15) * 9/5 + 32
+    else:
+        raise ValueError(f"Unknown temperature unit: {unit}")
+    return _wrap_like(values, result)
+
+def unit_to_K_array(values, unit):
+    """Convert temperatures in `unit` to K in one array operation (NaN stays NaN)."""
+    v = np.asarray(values, dtype=float)
+    if _is_kelvin(unit):
+        result = v
+    elif unit == "°C":
+        result = v + 273.15
+    elif unit == "°F":
+        result = (v - 32) * 5/9 + 273.15
+    else:
+        raise ValueError(f"Unknown temperature unit: {unit}")
+    return _wrap_like(values, result)
+
+# ============================================================
+# %% Scalar conversions
+# ============================================================
+
+def K_to_unit(v, unit):
+    if pd.isna(v):
+        return v
+    if _is_kelvin(unit):
+        return v
+    if unit == "°C":
+        return v - 273.15
+    if unit == "°F":
+        return (v - 273.15) * 9/5 + 32
+
+def unit_to_K(v, unit):
+    if pd.isna(v):
+        return v
+    if _is_kelvin(unit):
+        return v
+    if unit == "°C":
+        return v + 273.15
+    if unit == "°F":
+        return (v - 32) * 5/9 + 273.15
@@ -0,0 +1,307 @@
+"""
+Snow pit validation.
+
+Every check runs as an array operation over all layers (or profile points)
+at once, several pits being told apart by a `pit` column. Errors come back
+as a table with one row per problem: section, row, field, code, message.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utilities.constants import IACS_GRAINS, SNOW_HARDNESS
+from utilities.model import MISSING, RECORD_FIELDS, Snowpit, held_fields, stack_columns
+
+TOL = 0.0  # tolerance for total thickness check
+
+ERROR_COLUMNS = ["section", "row", "field", "code", "message"]
+
+PROFILES = {
+    "Temperature": "temperature_profile (K)",
+    "LWC": "lwc_profile (%)",
+}
+PROFILE_TABLES = {"Temperature": "temperature", "LWC": "lwc"}
+
+# ============================================================
+# %% Vectorized checks
+# ============================================================
+
+def _errors(section, pit, row, field, code, messages, stage, order):
+    return pd.DataFrame({
+        "pit": np.asarray(pit, dtype=np.int64),
+        "section": section,
+        "row": list(row),
+        "field": field,
+        "code": code,
+        "message": list(messages),
+        "_stage": stage,
+        "_order": np.asarray(order, dtype=np.int64),
+    })
+
+def _column(df: pd.DataFrame, name):
+    if name in df:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def _float_like(raw: pd.Series, values: np.ndarray):
+    """Values accepted by float(): numbers, numeric strings and NaN, but not None."""
+    if pd.api.types.is_numeric_dtype(raw):
+        return np.ones(len(raw), dtype=bool)
+    nan_floats = np.fromiter((type(v) is float for v in raw), dtype=bool, count=len(raw))
+    return ~np.isnan(values) | nan_floats
+
+def _layer_errors(layers: pd.DataFrame, SD: np.ndarray, held=None):
+    """Row checks, thickness sum and overlaps of every layer of every pit.
+
+    `held` maps each field to whether each pit holds it, by default every
+    pit holds every column.
+    """
+    out = []
+    n_pits = len(SD)
+    pit = layers["pit"].to_numpy()
+    row = layers["row"].to_numpy()
+    position = np.arange(len(layers))
+    top = pd.to_numeric(_column(layers, "top (cm)"), errors="coerce").to_numpy(dtype=float)
+    bottom = pd.to_numeric(_column(layers, "bottom (cm)"), errors="coerce").to_numpy(dtype=float)
+    grain = _column(layers, "grain (IACS)")
+    hardness = _column(layers, "snow hardness")
+    sd = SD[pit]
+
+    # --- 1. Row by row checks, on numeric rows only ---
+    # NaN is a float like any other, only values float() rejects are invalid
+    numeric = (
+        _float_like(_column(layers, "top (cm)"), top)
+        & _float_like(_column(layers, "bottom (cm)"), bottom)
+    )
+    checks = [
+        (~numeric, "top (cm)", "invalid_numeric",
+         lambda i: f"Layer {row[i]}: invalid numeric values"),
+        (numeric & (top <= bottom), "top (cm)", "top_le_bottom",
+         lambda i: f"Layer {row[i]}: top ({top[i]}) <= bottom ({bottom[i]})"),
+        (numeric & (top > sd), "top (cm)", "top_above_sd",
+         lambda i: f"Layer {row[i]}: top ({top[i]}) > SD ({sd[i]})"),
+        (numeric & (bottom < 0), "bottom (cm)", "bottom_below_zero",
+         lambda i: f"Layer {row[i]}: bottom ({bottom[i]}) < 0"),
+        (numeric & ~grain.isin(IACS_GRAINS).to_numpy(), "grain (IACS)", "invalid_grain",
+         lambda i: f"Layer {row[i]}: invalid grain ({grain.iloc[i]})"),
+        (numeric & ~hardness.isin(SNOW_HARDNESS).to_numpy(), "snow hardness", "invalid_hardness",
+         lambda i: f"Layer {row[i]}: invalid snow hardness ({hardness.iloc[i]})"),
+    ]
+    for rank, (mask, field, code, message) in enumerate(checks):
+        idx = np.flatnonzero(mask)
+        if idx.size:
+            out.append(_errors(
+                "layers", pit[idx], row[idx], field, code, map(message, idx),
+                0, position[idx] * len(checks) + rank,
+            ))
+
+    # --- 2. Total thickness against SD, for pits with at least one complete row ---
+    thickness = np.bincount(pit[numeric], weights=(top - bottom)[numeric], minlength=n_pits)
+    # A row is complete when every field its pit holds is filled in
+    if held is None:
+        held = {c: np.ones(n_pits, dtype=bool) for c in layers.columns if c not in ("pit", "row")}
+    complete = np.ones(len(layers), dtype=bool)
+    for field, by_pit in held.items():
+        if field in layers:
+            complete &= layers[field].notna().to_numpy() | ~by_pit[pit]
+    has_rows = np.bincount(pit[complete], minlength=n_pits) > 0
+    bad = np.flatnonzero(has_rows & (np.abs(thickness - SD) > TOL))
+    if bad.size:
+        out.append(_errors(
+            "layers", bad, [None] * bad.size, "thickness", "thickness_sum",
+            (f"Layer thickness sum ({thickness[p]:.1f} cm) ≠ SD ({SD[p]} cm)" for p in bad),
+            1, np.zeros(bad.size),
+        ))
+
+    # --- 3. Overlaps, comparing each layer with the previous one sorted by bottom ---
+    idx = np.flatnonzero(numeric & ~np.isnan(top) & ~np.isnan(bottom))
+    idx = idx[np.lexsort((top[idx], bottom[idx], pit[idx]))]
+    same_pit = pit[idx][1:] == pit[idx][:-1]
+    overlap = idx[1:][same_pit & (bottom[idx][1:] < top[idx][:-1])]
+    if overlap.size:
+        out.append(_errors(
+            "layers", pit[overlap], row[overlap], "bottom (cm)", "overlap",
+            (f"Layer {row[i]}: overlap detected with previous layer" for i in overlap),
+            2, position[overlap],
+        ))
+    return out
+
+def _profile_errors(name, stage, profile: pd.DataFrame, SD: np.ndarray):
+    """Depth bounds and duplicated depths of every point of one profile kind."""
+    if profile.empty or "z (cm)" not in profile:
+        return []
+    pit = profile["pit"].to_numpy()
+    row = profile["row"].to_numpy()
+    position = np.arange(len(profile))
+    z = pd.to_numeric(profile["z (cm)"], errors="coerce").to_numpy(dtype=float)
+
+    checks = [
+        (z < 0, "z_below_zero", f"{name}: z < 0"),
+        (z > SD[pit], "z_above_sd", f"{name}: z > SD"),
+        (pd.DataFrame({"pit": pit, "z": z}).duplicated().to_numpy(), "duplicated_depth",
+         f"{name}: duplicated depths"),
+    ]
+    out = []
+    for rank, (mask, code, message) in enumerate(checks):
+        idx = np.flatnonzero(mask)
+        if idx.size:
+            out.append(_errors(
+                name, pit[idx], row[idx], "z (cm)", code, [message] * idx.size,
+                stage, rank * len(profile) + position[idx],
+            ))
+    return out
+
+def _depth_errors(SD: np.ndarray):
+    """Pits with no usable snow depth: every check against SD would pass silently."""
+    bad = np.flatnonzero(np.isnan(SD) | (SD < 0))
+    if not bad.size:
+        return []
+    return [_errors(
+        "general", bad, [None] * bad.size, "SD (cm)", "invalid_sd",
+        (f"Invalid snow depth ({SD[p]})" for p in bad),
+        -1, np.zeros(bad.size),
+    )]
+
+def _validate_frames(SD, layers, profiles, held=None):
+    SD = np.asarray(SD, dtype=float)
+    frames = _depth_errors(SD) + _layer_errors(layers, SD, held)
+    for stage, (name, profile) in enumerate(profiles.items(), start=3):
+        frames += _profile_errors(name, stage, profile, SD)
+    if not frames:
+        return pd.DataFrame(columns=["pit"] + ERROR_COLUMNS)
+    errors = pd.concat(frames, ignore_index=True)
+    errors = errors.sort_values(["pit", "_stage", "_order"], kind="stable")
+    return errors.drop(columns=["_stage", "_order"]).reset_index(drop=True)
+
+def _with_keys(df: pd.DataFrame, pit):
+    df = pd.DataFrame(df).copy()
+    df["row"] = df.index
+    df["pit"] = pit
+    return df.reset_index(drop=True)
+
+# ============================================================
+# %% Entry points
+# ============================================================
+
+def validate_snowpit_table(SD, layers_df, temp_df, lwc_df):
+    """Error table of one pit being edited (columns: section, row, field, code, message)."""
+    errors = _validate_frames(
+        [SD],
+        _with_keys(layers_df, 0),
+        {"Temperature": _with_keys(temp_df, 0), "LWC": _with_keys(lwc_df, 0)},
+    )
+    return errors.drop(columns="pit")
+
+def validate_snowpit(SD, layers_df, temp_df, lwc_df):
+    """Error messages of one pit, as shown by the Create and Edit pages."""
+    messages = validate_snowpit_table(SD, layers_df, temp_df, lwc_df)["message"]
+    return list(dict.fromkeys(messages))
+
+def _table_records(pit, key):
+    """Rows of one table of a stored pit, none if it is not a list of dicts (as in Snowpit)."""
+    records = pit.get(key)
+    if isinstance(records, list) and all(isinstance(r, dict) for r in records):
+        return records
+    return []
+
+def _records_frame(pits, key):
+    tables = [_table_records(pit, key) for pit in pits]
+    sizes = np.array([len(records) for records in tables], dtype=np.int64)
+    # Object columns: a null stays None instead of a NaN depending on the other pits
+    frame = pd.DataFrame([record for records in tables for record in records], dtype=object)
+    frame["row"] = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    frame["pit"] = np.repeat(np.arange(len(pits)), sizes)
+    return frame
+
+def _records_held(pits, key, fields):
+    """Same as model.held_fields, from stored dicts."""
+    tables = [_table_records(pit, key) for pit in pits]
+    return {
+        field: np.array([any(field in record for record in records) for records in tables], dtype=bool)
+        for field in fields
+    }
+
+def _columns_frame(pits, table):
+    """Same frame as _records_frame, built column-wise from Snowpit objects."""
+    columns, sizes = stack_columns(pits, table)
+    columns["row"] = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    columns["pit"] = np.repeat(np.arange(len(pits)), sizes)
+    return pd.DataFrame(columns)
+
+def validate_snowpits(pits):
+    """Validate a whole collection of pits (Snowpit objects or stored dicts) in one pass.
+
+    Returns the error table with the pit `id` in front, indexed by the
+    position of the pit in `pits`; an empty table means every pit is valid.
+    """
+    pits = list(pits)
+    if pits and all(isinstance(pit, Snowpit) for pit in pits):
+        SD = [pd.to_numeric(None if pit.SD is MISSING else pit.SD, errors="coerce") for pit in pits]
+        layers = _columns_frame(pits, "layers")
+        held = held_fields(pits, "layers")
+        profiles = {name: _columns_frame(pits, table) for name, table in PROFILE_TABLES.items()}
+        ids = [None if pit.id is MISSING else pit.id for pit in pits]
+    else:
+        pits = [pit.to_dict() if isinstance(pit, Snowpit) else pit for pit in pits]
+        SD = [pd.to_numeric(pit.get("SD (cm)"), errors="coerce") for pit in pits]
+        layers = _records_frame(pits, "layers")
+        held = _records_held(pits, "layers", RECORD_FIELDS["layers"])
+        profiles = {name: _records_frame(pits, key) for name, key in PROFILES.items()}
+        ids = [pit.get("id") for pit in pits]
+
+    errors = _validate_frames(SD, layers, profiles, held)
+    ids = np.array(ids, dtype=object)
+    errors.insert(0, "id", ids[errors["pit"].to_numpy(dtype=np.int64)] if len(errors) else [])
+    return errors.set_index("pit").rename_axis(None)
+
+# ============================================================
+# %% Repair
+# ============================================================
+
+def _to_float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+def repair_snowpit(pit: dict):
+    """Copy of a stored pit with its geometry made consistent.
+
+    Layers are clipped to [0, SD], sorted, stripped of layers hidden by the
+    ones below them and made gap-free from the ground up to SD. Profile
+    points outside [0, SD] and duplicated depths are dropped. Categorical
+    values are left untouched: an invalid grain or hardness still needs a
+    human, and so does a pit with no usable snow depth, returned as is.
+    """
+    repaired = dict(pit)
+    SD = _to_float(pit.get("SD (cm)"))
+    if not SD >= 0:
+        return repaired
+
+    layers = pit.get("layers") or []
+    bottom = np.clip([_to_float(l.get("bottom (cm)")) for l in layers], 0, SD)
+    top = np.clip([_to_float(l.get("top (cm)")) for l in layers], 0, SD)
+    idx = np.flatnonzero(top > bottom)
+    idx = idx[np.lexsort((top[idx], bottom[idx]))]
+
+    # A layer is kept only if it reaches above every layer below it
+    reached = np.concatenate([[0.0], np.maximum.accumulate(top[idx])[:-1]])
+    idx = idx[top[idx] > reached]
+
+    new_top = top[idx]
+    if new_top.size:
+        new_top[-1] = SD
+    new_bottom = np.concatenate([[0.0], new_top[:-1]])
+    repaired["layers"] = [
+        {**layers[i], "bottom (cm)": float(b), "top (cm)": float(t)}
+        for i, b, t in zip(idx, new_bottom, new_top)
+    ]
+
+    for key in PROFILES.values():
+        profile = pit.get(key) or []
+        z = np.array([_to_float(p.get("z (cm)")) for p in profile], dtype=float)
+        keep = np.flatnonzero((z >= 0) & (z <= SD))
+        # First point of each depth, sorted by depth
+        _, first = np.unique(z[keep], return_index=True)
+        repaired[key] = [{**profile[i], "z (cm)": float(z[i])} for i in keep[first]]
+    return repaired